@@ -0,0 +1,126 @@
+import asyncio
+import collections
+import contextlib
+import math
+import os
+import time
+
+import metrics
+
+# Admission control for the async server (asgi_app.py): at most max_in_flight
+# generations run at once, up to max_queue more wait briefly in FIFO order,
+# and everything beyond that is rejected at once with a Retry-After hint, so
+# a burst gets fast 503s instead of every request timing out together.
+# State belongs to one event loop; with several server workers each process
+# admits its own max_in_flight.
+
+class Overloaded(Exception):
+    """Raised instead of admitting a request; retry_after is a whole number of seconds"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f'Server is at capacity ({reason})')
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Bounded in-flight limit with a short FIFO wait queue"""
+
+    def __init__(self, max_in_flight=16, max_queue=32, queue_timeout=2.0, initial_duration=10.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        # Exponentially weighted mean of admitted request durations, for Retry-After
+        self.mean_duration = initial_duration
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected': 0, 'rejected_by_reason': {}}
+        self._waiters = collections.deque()
+
+    @classmethod
+    def from_env(cls):
+        """Build the controller from GENERATION_MAX_IN_FLIGHT / GENERATION_MAX_QUEUE / GENERATION_QUEUE_TIMEOUT"""
+        return cls(
+            max_in_flight=int(os.getenv('GENERATION_MAX_IN_FLIGHT', '16')),
+            max_queue=int(os.getenv('GENERATION_MAX_QUEUE', '32')),
+            queue_timeout=float(os.getenv('GENERATION_QUEUE_TIMEOUT', '2'))
+        )
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    def retry_after(self):
+        """Seconds until the queue ahead of a new request has likely drained"""
+        waves = (self.queue_depth + 1) / max(1, self.max_in_flight)
+        return max(1, math.ceil(waves * self.mean_duration))
+
+    def _reject(self, reason):
+        self.stats['rejected'] += 1
+        self.stats['rejected_by_reason'][reason] = self.stats['rejected_by_reason'].get(reason, 0) + 1
+        metrics.ADMISSION_REJECTIONS.labels(reason).inc()
+        raise Overloaded(reason, self.retry_after())
+
+    async def acquire(self):
+        """Take an in-flight slot, waiting up to queue_timeout in line; raises Overloaded"""
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self.stats['admitted'] += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._reject('queue_full')
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats['queued'] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                with contextlib.suppress(ValueError):
+                    self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject('queue_timeout')
+            raise
+        finally:
+            metrics.ADMISSION_WAIT_SECONDS.observe(time.monotonic() - started)
+        self.stats['admitted'] += 1
+
+    def release(self):
+        """Hand the slot to the next waiter, or free it"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @contextlib.asynccontextmanager
+    async def admit(self):
+        """async with controller.admit(): ... runs the block in a slot, or raises Overloaded"""
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release()
+            self.mean_duration += 0.2 * (time.monotonic() - started - self.mean_duration)
+
+    def snapshot(self):
+        """Current admission state, for logging and monitoring"""
+        return dict(
+            self.stats,
+            rejected_by_reason=dict(self.stats['rejected_by_reason']),
+            in_flight=self.in_flight,
+            queue_depth=self.queue_depth,
+            max_in_flight=self.max_in_flight,
+            max_queue=self.max_queue,
+            mean_duration=round(self.mean_duration, 2),
+            retry_after=self.retry_after()
+        )
+
+admission = AdmissionController.from_env()
+metrics.ADMISSION_IN_FLIGHT.set_function(lambda: admission.in_flight)
+metrics.ADMISSION_QUEUE_DEPTH.set_function(lambda: admission.queue_depth)
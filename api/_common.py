@@ -0,0 +1,32 @@
+from http.server import BaseHTTPRequestHandler
+import json
+
+# Shared core for the Vercel functions in api/ (files starting with an
+# underscore are not deployed as functions). It is imported on every cold
+# start, so it only uses the standard library; the generation modules load
+# the OpenAI SDK themselves on their first call.
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """Base handler: JSON request bodies, JSON responses and CORS preflight"""
+    
+    def read_json(self):
+        content_length = int(self.headers['Content-Length'])
+        post_data = self.rfile.read(content_length)
+        return json.loads(post_data.decode('utf-8'))
+    
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.end_headers()
+    
+    def send_json_response(self, status_code, response):
+        self.send_response(status_code)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(response).encode())
+    
+    def send_error_response(self, status_code, message):
+        self.send_json_response(status_code, {'error': message})
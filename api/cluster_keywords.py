@@ -0,0 +1,37 @@
+import os
+import sys
+
+# Add the current directory to Python path to import keyword_clustering
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api._common import JSONHandler
+from keyword_clustering import cluster_rows, parse_threshold
+from log_config import get_logger
+
+logger = get_logger('api')
+
+class handler(JSONHandler):
+    def do_POST(self):
+        try:
+            # Read the request body
+            data = self.read_json()
+            
+            if not data or not isinstance(data.get('rows'), list):
+                self.send_error_response(400, 'Rows are required')
+                return
+            
+            try:
+                threshold = parse_threshold(data.get('threshold'))
+            except ValueError as e:
+                self.send_error_response(400, str(e))
+                return
+            
+            rows = cluster_rows(data['rows'], threshold)
+            logger.info('API call', extra={'fields': {'endpoint': '/cluster_keywords', 'rows': len(data['rows']), 'clusters': len(rows)}})
+            
+            # Send success response
+            self.send_json_response(200, {'rows': rows, 'input_rows': len(data['rows']), 'clusters': len(rows)})
+            
+        except Exception as e:
+            logger.exception(f"Error in cluster_keywords: {e}")
+            self.send_error_response(500, f'Internal server error: {str(e)}')
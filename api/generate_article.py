@@ -1,32 +1,43 @@
-from http.server import BaseHTTPRequestHandler
-import json
+import contextlib
 import os
 import sys
 
 # Add the current directory to Python path to import content_with_ai
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+from api._common import JSONHandler
+from log_config import get_logger
+from request_options import parse_flag
+from result_cache import cache_mode, cache_mode_from_request
+
+logger = get_logger('api')
+
 try:
-    from content_with_ai import generate_full_article, generate_meta_title, generate_meta_description
+    from content_with_ai import generate_full_article, generate_meta_title, generate_meta_description, generate_metadata, prompt_versions, COMBINED_METADATA
+    from openai_transport import request_deadline, REQUEST_DEADLINE
 except ImportError as e:
-    print(f"Error importing content functions: {e}")
-    # Fallback functions if import fails
-    def generate_full_article(keyword, title, brief, product="Files.com"):
-        return f"# {title or f'The Complete Guide to {keyword}'}\n\n## Introduction\n\n{keyword} is an essential topic that every professional should understand."
+    logger.error(f"Error importing content functions: {e}")
+    # Fall back to the template engine if import fails
+    from fallback_templates import (
+        full_article as generate_full_article,
+        meta_title as generate_meta_title,
+        meta_description as generate_meta_description,
+        metadata as generate_metadata,
+        prompt_versions
+    )
+    
+    COMBINED_METADATA = False
     
-    def generate_meta_title(keyword, product="Files.com"):
-        return f"{keyword} - Complete Guide, Tips & Best Practices"
+    REQUEST_DEADLINE = None
     
-    def generate_meta_description(keyword, product="Files.com"):
-        return f"Learn everything about {keyword} with our comprehensive guide. Discover best practices and expert tips."
+    def request_deadline(seconds):
+        return contextlib.nullcontext()
 
-class handler(BaseHTTPRequestHandler):
+class handler(JSONHandler):
     def do_POST(self):
         try:
             # Read the request body
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
+            data = self.read_json()
             
             if not data or 'keyword' not in data:
                 self.send_error_response(400, 'Keyword is required')
@@ -34,50 +45,36 @@ class handler(BaseHTTPRequestHandler):
             
             keyword = data['keyword'].strip()
             title = data.get('title', '').strip()
-            brief = data.get('brief', '').strip()
             product = data.get('product', 'Files.com').strip()
             
             if not keyword:
                 self.send_error_response(400, 'Keyword cannot be empty')
                 return
             
-            print(f"🚀 API Call: /generate_article for keyword: '{keyword}' for product: '{product}'")
+            logger.info('API call', extra={'fields': {'endpoint': '/generate_article', 'keyword': keyword, 'product': product}})
             
             # Generate all content
-            full_article = generate_full_article(keyword, title, brief, product)
-            meta_title = generate_meta_title(keyword, product)
-            meta_description = generate_meta_description(keyword, product)
+            combined_metadata = parse_flag(data.get('combinedMetadata'), COMBINED_METADATA)
+            with cache_mode(cache_mode_from_request(data)), request_deadline(REQUEST_DEADLINE):
+                full_article = generate_full_article(keyword, title, product)
+                if combined_metadata:
+                    metadata = generate_metadata(keyword, product, fields=('meta_title', 'meta_description'))
+                    meta_title, meta_description = metadata['meta_title'], metadata['meta_description']
+                else:
+                    meta_title = generate_meta_title(keyword, product)
+                    meta_description = generate_meta_description(keyword, product)
             
-            print(f"✅ API Response: Successfully generated article for '{keyword}' for {product}")
+            logger.info('API response', extra={'fields': {'endpoint': '/generate_article', 'keyword': keyword, 'product': product}})
             
             # Send success response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
             response = {
                 'full_article': full_article,
                 'meta_title': meta_title,
-                'meta_description': meta_description
+                'meta_description': meta_description,
+                'prompt_versions': prompt_versions(combined_metadata=combined_metadata, fields=('full_article', 'meta_title', 'meta_description'))
             }
-            self.wfile.write(json.dumps(response).encode())
+            self.send_json_response(200, response)
             
         except Exception as e:
-            print(f"❌ Error in generate_article: {e}")
+            logger.exception(f"Error in generate_article: {e}")
             self.send_error_response(500, f'Internal server error: {str(e)}')
-    
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-    
-    def send_error_response(self, status_code, message):
-        self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        error_response = {'error': message}
-        self.wfile.write(json.dumps(error_response).encode())
\ No newline at end of file
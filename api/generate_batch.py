@@ -0,0 +1,68 @@
+import contextlib
+import os
+import sys
+
+# Add the current directory to Python path to import batch_generation
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api._common import JSONHandler
+from log_config import get_logger
+from request_options import parse_flag
+from result_cache import cache_mode, cache_mode_from_request
+
+logger = get_logger('api')
+
+try:
+    from batch_generation import generate_batch, preview_batch
+    from content_with_ai import COMBINED_METADATA
+    from usage_ledger import Budget
+    from openai_transport import request_deadline, REQUEST_DEADLINE
+except ImportError as e:
+    logger.error(f"Error importing batch generation: {e}")
+    generate_batch = None
+    COMBINED_METADATA = False
+    REQUEST_DEADLINE = None
+    
+    def request_deadline(seconds):
+        return contextlib.nullcontext()
+
+class handler(JSONHandler):
+    def do_POST(self):
+        try:
+            if generate_batch is None:
+                self.send_error_response(503, 'Batch generation is unavailable')
+                return
+            
+            # Read the request body
+            data = self.read_json()
+            
+            if not data or 'rows' not in data:
+                self.send_error_response(400, 'Rows are required')
+                return
+            
+            combined_metadata = parse_flag(data.get('combinedMetadata'), COMBINED_METADATA)
+            cluster = parse_flag(data.get('clusterKeywords'))
+            
+            try:
+                if parse_flag(data.get('dryRun')):
+                    # Estimate tokens, cost and duration without calling OpenAI
+                    response = preview_batch(data['rows'], data.get('concurrency'), combined_metadata, cluster)
+                else:
+                    with cache_mode(cache_mode_from_request(data)), request_deadline(REQUEST_DEADLINE):
+                        response = generate_batch(
+                            data['rows'],
+                            data.get('concurrency'),
+                            combined_metadata,
+                            cluster=cluster,
+                            budget=Budget.from_request(data.get('budget'))
+                        )
+            except ValueError as e:
+                self.send_error_response(400, str(e))
+                return
+            
+            # Send success response
+            self.send_json_response(200, response)
+            
+        except Exception as e:
+            logger.exception(f"Error in generate_batch: {e}")
+            self.send_error_response(500, f'Internal server error: {str(e)}')
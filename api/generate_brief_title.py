@@ -1,29 +1,41 @@
-from http.server import BaseHTTPRequestHandler
-import json
+import contextlib
 import os
 import sys
 
 # Add the current directory to Python path to import content_with_ai
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+from api._common import JSONHandler
+from log_config import get_logger
+from request_options import parse_flag
+from result_cache import cache_mode, cache_mode_from_request
+
+logger = get_logger('api')
+
 try:
-    from content_with_ai import generate_content_brief, generate_article_title
+    from content_with_ai import generate_content_brief, generate_article_title, generate_metadata, COMBINED_METADATA
+    from openai_transport import request_deadline, REQUEST_DEADLINE
 except ImportError as e:
-    print(f"Error importing content functions: {e}")
-    # Fallback functions if import fails
-    def generate_content_brief(keyword, product="Files.com"):
-        return f"Content brief for '{keyword}' for {product}: Create a comprehensive guide covering fundamentals, best practices, and actionable tips. Target audience: {product} users and potential customers."
+    logger.error(f"Error importing content functions: {e}")
+    # Fall back to the template engine if import fails
+    from fallback_templates import (
+        content_brief as generate_content_brief,
+        article_title as generate_article_title,
+        metadata as generate_metadata
+    )
+    
+    COMBINED_METADATA = False
+    
+    REQUEST_DEADLINE = None
     
-    def generate_article_title(keyword, product="Files.com"):
-        return f"The Complete Guide to {keyword}: Everything You Need to Know"
+    def request_deadline(seconds):
+        return contextlib.nullcontext()
 
-class handler(BaseHTTPRequestHandler):
+class handler(JSONHandler):
     def do_POST(self):
         try:
             # Read the request body
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
+            data = self.read_json()
             
             if not data or 'keyword' not in data:
                 self.send_error_response(400, 'Keyword is required')
@@ -36,41 +48,23 @@ class handler(BaseHTTPRequestHandler):
                 self.send_error_response(400, 'Keyword cannot be empty')
                 return
             
-            print(f"🚀 API Call: /generate_brief_title for keyword: '{keyword}' for product: '{product}'")
+            logger.info('API call', extra={'fields': {'endpoint': '/generate_brief_title', 'keyword': keyword, 'product': product}})
             
             # Generate content using functions
-            content_brief = generate_content_brief(keyword, product)
-            article_title = generate_article_title(keyword, product)
+            with cache_mode(cache_mode_from_request(data)), request_deadline(REQUEST_DEADLINE):
+                content_brief = generate_content_brief(keyword, product)
+                if parse_flag(data.get('combinedMetadata'), COMBINED_METADATA):
+                    # One structured call also yields the meta fields for this row
+                    response = generate_metadata(keyword, product)
+                else:
+                    response = {'article_title': generate_article_title(keyword, product)}
             
-            print(f"✅ API Response: Successfully generated brief and title for '{keyword}' for {product}")
+            logger.info('API response', extra={'fields': {'endpoint': '/generate_brief_title', 'keyword': keyword, 'product': product}})
             
             # Send success response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            response = {
-                'content_brief': content_brief,
-                'article_title': article_title
-            }
-            self.wfile.write(json.dumps(response).encode())
+            response['content_brief'] = content_brief
+            self.send_json_response(200, response)
             
         except Exception as e:
-            print(f"❌ Error in generate_brief_title: {e}")
+            logger.exception(f"Error in generate_brief_title: {e}")
             self.send_error_response(500, f'Internal server error: {str(e)}')
-    
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-    
-    def send_error_response(self, status_code, message):
-        self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        error_response = {'error': message}
-        self.wfile.write(json.dumps(error_response).encode())
\ No newline at end of file
@@ -1,35 +1,38 @@
-from http.server import BaseHTTPRequestHandler
-import json
+import contextlib
 import os
 import sys
 
 # Add the current directory to Python path to import content_with_ai
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+from api._common import JSONHandler
+from keyword_clustering import parse_variants
+from log_config import get_logger
+from request_options import parse_flag
+from result_cache import cache_mode, cache_mode_from_request
+
+logger = get_logger('api')
+
 try:
-    from content_with_ai import generate_article_title, generate_full_article, generate_meta_title, generate_meta_description
+    from content_with_ai import generate_all_content, COMBINED_METADATA
+    from openai_transport import request_deadline, REQUEST_DEADLINE
 except ImportError as e:
-    print(f"Error importing content functions: {e}")
-    # Fallback functions if import fails
-    def generate_article_title(keyword, product="Files.com"):
-        return f"The Complete Guide to {keyword}: Everything You Need to Know"
+    logger.error(f"Error importing content functions: {e}")
+    # Fall back to the template engine if import fails
+    from fallback_templates import all_content as generate_all_content
     
-    def generate_full_article(keyword, title, product="Files.com", content_length="medium"):
-        return f"# {title}\n\n## Introduction\n\n{keyword} is an essential topic that every professional should understand."
+    COMBINED_METADATA = False
     
-    def generate_meta_title(keyword, product="Files.com"):
-        return f"{keyword} - Complete Guide, Tips & Best Practices"
+    REQUEST_DEADLINE = None
     
-    def generate_meta_description(keyword, product="Files.com"):
-        return f"Learn everything about {keyword} with our comprehensive guide. Discover best practices and expert tips."
+    def request_deadline(seconds):
+        return contextlib.nullcontext()
 
-class handler(BaseHTTPRequestHandler):
+class handler(JSONHandler):
     def do_POST(self):
         try:
             # Read the request body
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
+            data = self.read_json()
             
             if not data or 'keyword' not in data:
                 self.send_error_response(400, 'Keyword is required')
@@ -38,50 +41,29 @@ class handler(BaseHTTPRequestHandler):
             keyword = data['keyword'].strip()
             product = data.get('product', 'Files.com').strip()
             content_length = data.get('contentLength', 'medium').strip()
+            combined_metadata = parse_flag(data.get('combinedMetadata'), COMBINED_METADATA)
             
             if not keyword:
                 self.send_error_response(400, 'Keyword cannot be empty')
                 return
             
-            print(f"🚀 API Call: /generate_content for keyword: '{keyword}' for product: '{product}' with length: '{content_length}'")
+            try:
+                variants = parse_variants(data)
+            except ValueError as e:
+                self.send_error_response(400, str(e))
+                return
             
-            # Generate all content in one step
-            article_title = generate_article_title(keyword, product)
-            full_article = generate_full_article(keyword, article_title, product, content_length)
-            meta_title = generate_meta_title(keyword, product)
-            meta_description = generate_meta_description(keyword, product)
+            logger.info('API call', extra={'fields': {'endpoint': '/generate_content', 'keyword': keyword, 'product': product, 'content_length': content_length}})
             
-            print(f"✅ API Response: Successfully generated all content for '{keyword}' for {product}")
+            # Generate all content in one step (meta calls run alongside title -> article)
+            with cache_mode(cache_mode_from_request(data)), request_deadline(REQUEST_DEADLINE):
+                response = generate_all_content(keyword, product, content_length, combined_metadata, variants)
             
-            # Send success response
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
+            logger.info('API response', extra={'fields': {'endpoint': '/generate_content', 'keyword': keyword, 'product': product}})
             
-            response = {
-                'article_title': article_title,
-                'full_article': full_article,
-                'meta_title': meta_title,
-                'meta_description': meta_description
-            }
-            self.wfile.write(json.dumps(response).encode())
+            # Send success response
+            self.send_json_response(200, response)
             
         except Exception as e:
-            print(f"❌ Error in generate_content: {e}")
+            logger.exception(f"Error in generate_content: {e}")
             self.send_error_response(500, f'Internal server error: {str(e)}')
-    
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
-    
-    def send_error_response(self, status_code, message):
-        self.send_response(status_code)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        error_response = {'error': message}
-        self.wfile.write(json.dumps(error_response).encode())
\ No newline at end of file
@@ -1,18 +1,12 @@
-from http.server import BaseHTTPRequestHandler
-import json
+import os
+import sys
 
-class handler(BaseHTTPRequestHandler):
+# Add the current directory to Python path to import the shared handler
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api._common import JSONHandler
+
+class handler(JSONHandler):
     def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
         response = {'status': 'healthy', 'message': 'Server is running'}
-        self.wfile.write(json.dumps(response).encode())
-    
-    def do_OPTIONS(self):
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
\ No newline at end of file
+        self.send_json_response(200, response)
@@ -0,0 +1,80 @@
+from urllib.parse import urlparse, parse_qs
+import contextlib
+import os
+import sys
+
+# Add the current directory to Python path to import job_worker
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api._common import JSONHandler
+from log_config import get_logger
+
+logger = get_logger('api')
+
+try:
+    from job_queue import jobs as job_queue, JOB_SUCCEEDED, JOB_FAILED, PATH_REQUIRED
+    from job_worker import submit_job, advance_job, job_status, JOB_DRIVE_ON_POLL
+    from openai_transport import request_deadline, REQUEST_DEADLINE
+except ImportError as e:
+    logger.error(f"Error importing job queue: {e}")
+    job_queue = None
+    REQUEST_DEADLINE = None
+    
+    def request_deadline(seconds):
+        return contextlib.nullcontext()
+
+if job_queue is not None and job_queue.path is None:
+    # Refuse jobs instead of queueing them in this instance's own /tmp
+    logger.error(PATH_REQUIRED)
+
+class handler(JSONHandler):
+    def do_POST(self):
+        try:
+            if job_queue is None or job_queue.path is None:
+                self.send_error_response(503, 'Job queue is unavailable' if job_queue is None else PATH_REQUIRED)
+                return
+            
+            # Read the request body
+            data = self.read_json()
+            
+            try:
+                job_id = submit_job(data or {})
+            except ValueError as e:
+                self.send_error_response(400, str(e))
+                return
+            
+            logger.info('API call', extra={'fields': {'endpoint': '/jobs', 'job_id': job_id, 'keyword': data['keyword'].strip()}})
+            self.send_json_response(202, job_status(job_queue.get(job_id)))
+        
+        except Exception as e:
+            logger.exception(f"Error in jobs: {e}")
+            self.send_error_response(500, f'Internal server error: {str(e)}')
+    
+    def do_GET(self):
+        try:
+            if job_queue is None or job_queue.path is None:
+                self.send_error_response(503, 'Job queue is unavailable' if job_queue is None else PATH_REQUIRED)
+                return
+            
+            # /api/jobs/<id> is rewritten to /api/jobs?id=<id> (see vercel.json)
+            job_id = (parse_qs(urlparse(self.path).query).get('id') or [''])[0]
+            if not job_id:
+                self.send_error_response(400, 'Job id is required')
+                return
+            
+            job = job_queue.get(job_id)
+            if job is None:
+                self.send_error_response(404, 'Job not found')
+                return
+            
+            if JOB_DRIVE_ON_POLL and job['status'] not in (JOB_SUCCEEDED, JOB_FAILED):
+                # Run the next stage within this invocation; if the platform
+                # kills it, the lease expires and a later poll resumes the job
+                with request_deadline(REQUEST_DEADLINE):
+                    job = advance_job(job_id)
+            
+            self.send_json_response(200, job_status(job))
+        
+        except Exception as e:
+            logger.exception(f"Error in jobs: {e}")
+            self.send_error_response(500, f'Internal server error: {str(e)}')
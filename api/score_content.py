@@ -0,0 +1,41 @@
+import os
+import sys
+
+# Add the current directory to Python path to import seo_scoring
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from api._common import JSONHandler
+from seo_scoring import score_articles, summarize, parse_min_score, MAX_SCORE_ITEMS
+from log_config import get_logger
+
+logger = get_logger('api')
+
+class handler(JSONHandler):
+    def do_POST(self):
+        try:
+            # Read the request body
+            data = self.read_json()
+            
+            if not data or not isinstance(data.get('items'), list):
+                self.send_error_response(400, 'Items are required')
+                return
+            if len(data['items']) > MAX_SCORE_ITEMS:
+                self.send_error_response(400, f'At most {MAX_SCORE_ITEMS} items can be scored at once')
+                return
+            
+            try:
+                min_score = parse_min_score(data.get('minScore'))
+            except ValueError as e:
+                self.send_error_response(400, str(e))
+                return
+            
+            scores = score_articles(data['items'], min_score)
+            summary = summarize(scores)
+            logger.info('API call', extra={'fields': {'endpoint': '/score_content', 'items': summary['items'], 'failed': summary['failed']}})
+            
+            # Send success response
+            self.send_json_response(200, dict(summary, scores=scores))
+            
+        except Exception as e:
+            logger.exception(f"Error in score_content: {e}")
+            self.send_error_response(500, f'Internal server error: {str(e)}')
@@ -0,0 +1,123 @@
+import re
+
+# Post-processing for generated articles: removes the word-count debugging text
+# the model sometimes echoes from its prompt ("(500 words)", "(target: EXACTLY
+# 800-1200 words)", "EXACTLY", "📊 Generated article word count: ..."), in a
+# single pass over the text with one precompiled pattern. Only those artifacts
+# are removed; ordinary parentheses and prose are left alone.
+
+_HSPACE = r'[^\S\n]'
+_NUMBER = r'\d[\d,]{0,9}'
+_WORD_COUNT = rf'(?:~|about{_HSPACE}+|approx\.?{_HSPACE}*)?{_NUMBER}(?:{_HSPACE}*[-–]{_HSPACE}*{_NUMBER})?\+?{_HSPACE}*words?'
+
+# Every alternative starts with a literal character so that the regex engine
+# can skip ahead between candidates; whitespace in front of an artifact is
+# trimmed by the caller (see _removal_start) rather than by the pattern
+_ARTIFACTS = re.compile('|'.join([
+    # Echoed logging line, including its line break
+    r'📊 Generated article word count:[^\n]*\n?',
+    # "(500 words)", "(target: EXACTLY 800-1200 words)", "(target: 500 words)"
+    rf'\({_HSPACE}*(?:[Tt]arget:{_HSPACE}*)?(?:EXACTLY{_HSPACE}*)?{_WORD_COUNT}{_HSPACE}*\)',
+    # Bare "Target: 500 words" and "This section contains 250 words"
+    rf'Target:{_HSPACE}*(?:EXACTLY{_HSPACE}*)?{_WORD_COUNT}',
+    rf'target:{_HSPACE}*(?:EXACTLY{_HSPACE}*)?{_WORD_COUNT}',
+    rf'This section contains{_HSPACE}+{_NUMBER}{_HSPACE}*words?\.?',
+    # Prompt wording leaking into the prose ("EXACTLY 3-4 main sections");
+    # keeps the space in front of it and only matches as a whole word
+    rf'EXACTLY{_HSPACE}+',
+    # Empty parentheses
+    rf'\({_HSPACE}*\)'
+]))
+_WORD_CHARACTER = re.compile(r'\w')
+
+# Longest text a pattern above can span, apart from the echoed logging line
+# (which is held back until its newline arrives)
+_MAX_ARTIFACT_LENGTH = 96
+_LOG_MARKER = '📊'
+
+def _is_horizontal_space(character):
+    return character != '\n' and character.isspace()
+
+def _removal_start(text, position, match):
+    """Where the text removed for `match` starts, or None if it is not an artifact.
+
+    Artifacts take the spaces in front of them (back to `position`, the end of
+    the previous removal) with them, except EXACTLY, which must start a word.
+    """
+    start = match.start()
+    if text[start] == 'E':
+        return None if start and _WORD_CHARACTER.match(text, start - 1) else start
+    while start > position and _is_horizontal_space(text[start - 1]):
+        start -= 1
+    return start
+
+def sanitize_article(text):
+    """Remove word-count artifacts from a complete article in one pass"""
+    output = []
+    position = 0
+    for match in _ARTIFACTS.finditer(text):
+        start = _removal_start(text, position, match)
+        if start is None:
+            continue
+        output.append(text[position:start])
+        position = match.end()
+    if not output:
+        return text
+    output.append(text[position:])
+    return ''.join(output)
+
+class StreamingSanitizer:
+    """Incremental sanitize_article for streamed chunks.
+
+    feed() returns the text that is safe to emit so far, holding back only a
+    short tail that could still turn out to be part of an artifact; flush()
+    returns the rest. The concatenated output equals sanitize_article() of the
+    concatenated input.
+    """
+
+    def __init__(self):
+        # Pending text, prefixed by the last already-emitted character so that
+        # word boundaries at the cut point are evaluated as in a single pass
+        self._text = ''
+        self._start = 0
+
+    def _emit(self, text, end, final=False):
+        output = []
+        position = self._start
+        for match in _ARTIFACTS.finditer(text, self._start):
+            if match.end() > end:
+                # Could still grow with the next chunk; keep it pending
+                end = min(end, match.start())
+                break
+            start = _removal_start(text, position, match)
+            if start is None:
+                continue
+            output.append(text[position:start])
+            position = match.end()
+        end = max(end, position)
+        if not final:
+            # Trailing spaces would be removed along with an artifact that follows them
+            while end > position and _is_horizontal_space(text[end - 1]):
+                end -= 1
+        output.append(text[position:end])
+        self._text = text[end - 1:] if end > 0 else text
+        self._start = 1 if end > 0 else 0
+        return ''.join(output)
+
+    def feed(self, chunk):
+        text = self._text + chunk
+        limit = len(text) - _MAX_ARTIFACT_LENGTH
+        # A logging line extends to its newline, so keep its whole line back
+        line_start = max(text.rfind('\n', self._start, max(limit, self._start)) + 1, self._start)
+        if _LOG_MARKER in text[line_start:]:
+            limit = min(limit, line_start)
+        if limit <= self._start:
+            self._text = text
+            return ''
+        return self._emit(text, limit)
+
+    def flush(self):
+        text = self._text
+        output = self._emit(text, len(text), final=True)
+        self._text, self._start = '', 0
+        return output
@@ -0,0 +1,602 @@
+import asyncio
+import contextlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import metrics
+from admission import admission, Overloaded
+from keyword_clustering import cluster_rows, parse_threshold, parse_variants
+from log_config import get_logger
+from request_options import parse_flag
+from result_cache import cache_mode, cache_mode_from_request
+from seo_scoring import score_articles, summarize, parse_min_score, MAX_SCORE_ITEMS
+
+# Production entry point: the routes of vercel_app.py as a plain ASGI app with
+# async handlers, served by uvicorn (`python asgi_app.py` or
+# `uvicorn asgi_app:app --workers 4`). Generation routes go through admission
+# control (admission.py): when every slot is busy and the short wait queue is
+# full, or a request waits too long, it gets a 503 with Retry-After at once.
+# Blocking work (the brief, batches, clustering, scoring, the job queue and
+# the streamed article) runs in a thread pool sized for the admission limit.
+
+logger = get_logger('asgi')
+
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+    (b'access-control-allow-headers', b'Content-Type')
+]
+
+# Status recorded (not sent) for requests whose client left before the response
+CLIENT_CLOSED_REQUEST = 499
+
+# Admitted requests can each hold a thread (a streamed article holds one for
+# its whole duration), plus headroom for the unadmitted routes
+THREAD_POOL_SIZE = int(os.getenv('ASGI_THREAD_POOL_SIZE', str(admission.max_in_flight * 2 + 8)))
+
+try:
+    from content_with_ai import (
+        generate_content_brief_async,
+        generate_article_title_async,
+        generate_full_article_async,
+        generate_meta_title_async,
+        generate_meta_description_async,
+        generate_metadata_async,
+        generate_all_content_async,
+        stream_all_content,
+        prompt_versions,
+        COMBINED_METADATA
+    )
+    from openai_transport import request_deadline, REQUEST_DEADLINE
+except ImportError as e:
+    logger.error(f"Error importing content functions: {e}")
+    # Fall back to the template engine if import fails
+    import fallback_templates
+    from fallback_templates import prompt_versions, stream_all_content
+
+    def _async(generate):
+        async def wrapper(*args, **kwargs):
+            return generate(*args, **kwargs)
+        return wrapper
+
+    generate_content_brief_async = _async(fallback_templates.content_brief)
+    generate_article_title_async = _async(fallback_templates.article_title)
+    generate_full_article_async = _async(fallback_templates.full_article)
+    generate_meta_title_async = _async(fallback_templates.meta_title)
+    generate_meta_description_async = _async(fallback_templates.meta_description)
+    generate_metadata_async = _async(fallback_templates.metadata)
+    generate_all_content_async = _async(fallback_templates.all_content)
+
+    COMBINED_METADATA = False
+
+    REQUEST_DEADLINE = None
+
+    def request_deadline(seconds):
+        return contextlib.nullcontext()
+
+try:
+    from batch_generation import generate_batch, preview_batch
+    from usage_ledger import ledger as usage_ledger, Budget
+except ImportError as e:
+    logger.error(f"Error importing batch generation: {e}")
+    generate_batch = None
+
+try:
+    from job_queue import jobs as job_queue
+    from job_worker import submit_job, job_status, start_worker_threads
+except ImportError as e:
+    logger.error(f"Error importing job queue: {e}")
+    job_queue = None
+
+try:
+    from hedging import hedger
+    from openai_transport import pool_stats
+    from rate_limiter import limiter as rate_limiter
+    from single_flight import single_flight
+except ImportError as e:
+    logger.error(f"Error importing transport stats: {e}")
+    pool_stats = None
+
+class Request:
+    def __init__(self, scope, receive, params):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        self.params = params
+        self.receive = receive
+        self.body = b''
+
+    async def read(self):
+        chunks = []
+        while True:
+            message = await self.receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        self.body = b''.join(chunks)
+
+    async def json(self):
+        """The JSON body, or None when it is missing or malformed"""
+        try:
+            return json.loads(self.body.decode('utf-8')) if self.body else None
+        except ValueError:
+            return None
+
+class Response:
+    def __init__(self, body=b'', status=200, content_type='application/json', headers=()):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.headers = list(headers)
+
+class StreamingResponse(Response):
+    """Body produced by an async iterator of str chunks"""
+
+    def __init__(self, chunks, content_type='text/event-stream', headers=()):
+        super().__init__(b'', 200, content_type, headers)
+        self.chunks = chunks
+
+def jsonify(payload, status=200, headers=()):
+    return Response(json.dumps(payload).encode(), status, headers=headers)
+
+def error(message, status):
+    return jsonify({'error': message}, status)
+
+def overloaded(e):
+    return jsonify({'error': str(e), 'reason': e.reason, 'retry_after': e.retry_after}, 503, [(b'retry-after', str(e.retry_after).encode())])
+
+ROUTES = []
+
+def route(path, methods, admitted=False):
+    """Register a handler for a Flask-style path (e.g. /api/jobs/<job_id>)"""
+    pattern = re.compile('^' + re.sub(r'<(\w+)>', r'(?P<\1>[^/]+)', path) + '$')
+
+    def decorate(handler):
+        ROUTES.append((path, pattern, set(methods), admitted, handler))
+        return handler
+    return decorate
+
+def match(path):
+    for template, pattern, methods, admitted, handler in ROUTES:
+        found = pattern.match(path)
+        if found:
+            return template, found.groupdict(), methods, admitted, handler
+    return None
+
+async def in_thread(iterator):
+    """Iterate a blocking iterator without blocking the event loop"""
+    done = object()
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        # Closing runs the generator's cleanup (e.g. stop streaming from OpenAI)
+        await asyncio.to_thread(iterator.close)
+
+@route('/api/health', ['GET'])
+async def health(request):
+    """Health check endpoint"""
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Server is running'
+    })
+
+@route('/api/transport_stats', ['GET'])
+async def transport_stats(request):
+    """OpenAI connection pool, retry, rate limiter, coalescing, hedging and admission statistics"""
+    if pool_stats is None:
+        return error('Transport statistics are unavailable', 503)
+
+    return jsonify({
+        'pool': pool_stats(),
+        'rate_limiter': rate_limiter.snapshot(),
+        'coalescing': single_flight.snapshot(),
+        'hedging': hedger.snapshot(),
+        'admission': admission.snapshot(),
+        'usage': usage_ledger.snapshot() if generate_batch is not None else None
+    })
+
+@route('/api/metrics', ['GET'])
+async def prometheus_metrics(request):
+    """Metrics of this process in the Prometheus text format"""
+    return Response(metrics.REGISTRY.render().encode(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@route('/api/generate_content', ['POST'], admitted=True)
+async def generate_content(request):
+    """Generate all content in one step"""
+    try:
+        data = await request.json()
+
+        if not data or 'keyword' not in data:
+            return error('Keyword is required', 400)
+
+        keyword = data['keyword'].strip()
+        product = data.get('product', 'Files.com').strip()
+        content_length = data.get('contentLength', 'medium').strip()
+        combined_metadata = parse_flag(data.get('combinedMetadata'), COMBINED_METADATA)
+
+        if not keyword:
+            return error('Keyword cannot be empty', 400)
+
+        try:
+            variants = parse_variants(data)
+        except ValueError as e:
+            return error(str(e), 400)
+
+        logger.info('API call', extra={'fields': {'endpoint': '/generate_content', 'keyword': keyword, 'product': product, 'content_length': content_length}})
+
+        with cache_mode(cache_mode_from_request(data)), request_deadline(REQUEST_DEADLINE):
+            content = await generate_all_content_async(keyword, product, content_length, combined_metadata, variants)
+
+        logger.info('API response', extra={'fields': {'endpoint': '/generate_content', 'keyword': keyword, 'product': product}})
+
+        return jsonify(content)
+
+    except Exception as e:
+        logger.exception(f"Error in generate_content: {e}")
+        return error(f'Internal server error: {str(e)}', 500)
+
+@route('/api/generate_content/stream', ['GET', 'POST'], admitted=True)
+async def generate_content_stream(request):
+    """Generate all content, streaming the article and metas as Server-Sent Events"""
+    # EventSource can only send GET requests, so accept query parameters too
+    data = await request.json() if request.method == 'POST' else request.args
+
+    if not data or 'keyword' not in data:
+        return error('Keyword is required', 400)
+
+    keyword = data['keyword'].strip()
+    product = data.get('product', 'Files.com').strip()
+    content_length = data.get('contentLength', 'medium').strip()
+    mode = cache_mode_from_request(data)
+
+    if not keyword:
+        return error('Keyword cannot be empty', 400)
+
+    try:
+        variants = parse_variants(data)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    logger.info('API call', extra={'fields': {'endpoint': '/generate_content/stream', 'keyword': keyword, 'product': product, 'content_length': content_length}})
+
+    async def events():
+        # Each step runs in a worker thread with a copy of this context (cache mode included)
+        with cache_mode(mode):
+            try:
+                async for event, payload in in_thread(stream_all_content(keyword, product, content_length, variants)):
+                    yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            except Exception as e:
+                logger.exception(f"Error in generate_content_stream: {e}")
+                yield f"event: error\ndata: {json.dumps({'error': f'Internal server error: {str(e)}'})}\n\n"
+
+    return StreamingResponse(events(), headers=[(b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')])
+
+@route('/api/generate_batch', ['POST'], admitted=True)
+async def generate_batch_content(request):
+    """Generate content for many keywords with a bounded worker pool"""
+    if generate_batch is None:
+        return error('Batch generation is unavailable', 503)
+
+    try:
+        data = await request.json()
+
+        if not data or 'rows' not in data:
+            return error('Rows are required', 400)
+
+        combined_metadata = parse_flag(data.get('combinedMetadata'), COMBINED_METADATA)
+        cluster = parse_flag(data.get('clusterKeywords'))
+
+        try:
+            if parse_flag(data.get('dryRun')):
+                # Estimate tokens, cost and duration without calling OpenAI
+                return jsonify(await asyncio.to_thread(preview_batch, data['rows'], data.get('concurrency'), combined_metadata, cluster))
+
+            with cache_mode(cache_mode_from_request(data)), request_deadline(REQUEST_DEADLINE):
+                # The batch runs its own event loop with its own concurrency limit
+                batch = await asyncio.to_thread(
+                    generate_batch,
+                    data['rows'],
+                    data.get('concurrency'),
+                    combined_metadata,
+                    cluster=cluster,
+                    budget=Budget.from_request(data.get('budget'))
+                )
+        except ValueError as e:
+            return error(str(e), 400)
+
+        return jsonify(batch)
+
+    except Exception as e:
+        logger.exception(f"Error in generate_batch: {e}")
+        return error(f'Internal server error: {str(e)}', 500)
+
+@route('/api/cluster_keywords', ['POST'])
+async def cluster_keywords(request):
+    """Merge near-duplicate keyword rows into one row per cluster, with the rest as variants"""
+    try:
+        data = await request.json()
+
+        if not data or not isinstance(data.get('rows'), list):
+            return error('Rows are required', 400)
+
+        try:
+            threshold = parse_threshold(data.get('threshold'))
+        except ValueError as e:
+            return error(str(e), 400)
+
+        rows = await asyncio.to_thread(cluster_rows, data['rows'], threshold)
+        logger.info('API call', extra={'fields': {'endpoint': '/cluster_keywords', 'rows': len(data['rows']), 'clusters': len(rows)}})
+
+        return jsonify({'rows': rows, 'input_rows': len(data['rows']), 'clusters': len(rows)})
+
+    except Exception as e:
+        logger.exception(f"Error in cluster_keywords: {e}")
+        return error(f'Internal server error: {str(e)}', 500)
+
+@route('/api/score_content', ['POST'])
+async def score_content(request):
+    """SEO quality scores for a batch of generated results"""
+    try:
+        data = await request.json()
+
+        if not data or not isinstance(data.get('items'), list):
+            return error('Items are required', 400)
+        if len(data['items']) > MAX_SCORE_ITEMS:
+            return error(f'At most {MAX_SCORE_ITEMS} items can be scored at once', 400)
+
+        try:
+            min_score = parse_min_score(data.get('minScore'))
+        except ValueError as e:
+            return error(str(e), 400)
+
+        scores = await asyncio.to_thread(score_articles, data['items'], min_score)
+        summary = summarize(scores)
+        logger.info('API call', extra={'fields': {'endpoint': '/score_content', 'items': summary['items'], 'failed': summary['failed']}})
+
+        return jsonify(dict(summary, scores=scores))
+
+    except Exception as e:
+        logger.exception(f"Error in score_content: {e}")
+        return error(f'Internal server error: {str(e)}', 500)
+
+@route('/api/jobs', ['POST'])
+async def create_job(request):
+    """Queue a generate_content job and return its id"""
+    if job_queue is None:
+        return error('Job queue is unavailable', 503)
+
+    try:
+        data = await request.json()
+
+        try:
+            job_id = await asyncio.to_thread(submit_job, data or {})
+        except ValueError as e:
+            return error(str(e), 400)
+
+        # Jobs run in this process's worker threads, outside admission control;
+        # workers started with job_worker.py can pull from the same queue file
+        start_worker_threads()
+        logger.info('API call', extra={'fields': {'endpoint': '/jobs', 'job_id': job_id, 'keyword': data['keyword'].strip()}})
+
+        return jsonify(job_status(await asyncio.to_thread(job_queue.get, job_id)), 202)
+
+    except Exception as e:
+        logger.exception(f"Error in create_job: {e}")
+        return error(f'Internal server error: {str(e)}', 500)
+
+@route('/api/jobs/<job_id>', ['GET'])
+async def get_job(request):
+    """Status and (partial) results of a queued job"""
+    if job_queue is None:
+        return error('Job queue is unavailable', 503)
+
+    job = await asyncio.to_thread(job_queue.get, request.params['job_id'])
+    if job is None:
+        return error('Job not found', 404)
+
+    return jsonify(job_status(job))
+
+@route('/api/generate_article', ['POST'], admitted=True)
+async def generate_article(request):
+    """Generate article with custom title and brief"""
+    try:
+        data = await request.json()
+
+        if not data or 'keyword' not in data:
+            return error('Keyword is required', 400)
+
+        keyword = data['keyword'].strip()
+        title = data.get('title', '').strip()
+        product = data.get('product', 'Files.com').strip()
+
+        if not keyword:
+            return error('Keyword cannot be empty', 400)
+
+        logger.info('API call', extra={'fields': {'endpoint': '/generate_article', 'keyword': keyword, 'product': product}})
+
+        # The article and the metas are independent, so run them together
+        combined_metadata = parse_flag(data.get('combinedMetadata'), COMBINED_METADATA)
+        with cache_mode(cache_mode_from_request(data)), request_deadline(REQUEST_DEADLINE):
+            if combined_metadata:
+                full_article, metadata = await asyncio.gather(
+                    generate_full_article_async(keyword, title, product),
+                    generate_metadata_async(keyword, product, fields=('meta_title', 'meta_description'))
+                )
+                meta_title, meta_description = metadata['meta_title'], metadata['meta_description']
+            else:
+                full_article, meta_title, meta_description = await asyncio.gather(
+                    generate_full_article_async(keyword, title, product),
+                    generate_meta_title_async(keyword, product),
+                    generate_meta_description_async(keyword, product)
+                )
+
+        logger.info('API response', extra={'fields': {'endpoint': '/generate_article', 'keyword': keyword, 'product': product}})
+
+        return jsonify({
+            'full_article': full_article,
+            'meta_title': meta_title,
+            'meta_description': meta_description,
+            'prompt_versions': prompt_versions(combined_metadata=combined_metadata, fields=('full_article', 'meta_title', 'meta_description'))
+        })
+
+    except Exception as e:
+        logger.exception(f"Error in generate_article: {e}")
+        return error(f'Internal server error: {str(e)}', 500)
+
+@route('/api/generate_brief_title', ['POST'], admitted=True)
+async def generate_brief_title(request):
+    """Generate content brief and title"""
+    try:
+        data = await request.json()
+
+        if not data or 'keyword' not in data:
+            return error('Keyword is required', 400)
+
+        keyword = data['keyword'].strip()
+        product = data.get('product', 'Files.com').strip()
+
+        if not keyword:
+            return error('Keyword cannot be empty', 400)
+
+        logger.info('API call', extra={'fields': {'endpoint': '/generate_brief_title', 'keyword': keyword, 'product': product}})
+
+        with cache_mode(cache_mode_from_request(data)), request_deadline(REQUEST_DEADLINE):
+            if parse_flag(data.get('combinedMetadata'), COMBINED_METADATA):
+                # One structured call also yields the meta fields for this row
+                titles = generate_metadata_async(keyword, product)
+            else:
+                titles = generate_article_title_async(keyword, product)
+            content_brief, response = await asyncio.gather(generate_content_brief_async(keyword, product), titles)
+
+        if not isinstance(response, dict):
+            response = {'article_title': response}
+
+        logger.info('API response', extra={'fields': {'endpoint': '/generate_brief_title', 'keyword': keyword, 'product': product}})
+
+        response['content_brief'] = content_brief
+        return jsonify(response)
+
+    except Exception as e:
+        logger.exception(f"Error in generate_brief_title: {e}")
+        return error(f'Internal server error: {str(e)}', 500)
+
+async def _send(send, receive, response):
+    headers = [(b'content-type', response.content_type.encode())] + CORS_HEADERS[:1] + response.headers
+    await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+    if not isinstance(response, StreamingResponse):
+        await send({'type': 'http.response.body', 'body': response.body})
+        return
+
+    # Stop generating as soon as the client goes away
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        async for chunk in response.chunks:
+            if disconnected.done():
+                break
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        await response.chunks.aclose()
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def _until_disconnect(handler, request):
+    """Run the handler, cancelling it if the client goes away first; None when it did"""
+    task = asyncio.ensure_future(handler(request))
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(request.receive))
+    try:
+        await asyncio.wait({task, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        disconnected.cancel()
+    if not task.done():
+        # Coalesced generations stop once no other request is waiting for them
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+        return None
+    return task.result()
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix='asgi'))
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc()
+    found = match(scope['path'])
+    # Route templates, not raw paths, keep the label set bounded
+    endpoint = found[0] if found else 'unmatched'
+    response = None
+    try:
+        if found is None:
+            response = error('Not found', 404)
+        elif scope['method'] == 'OPTIONS':
+            response = Response(headers=CORS_HEADERS[1:])
+        elif scope['method'] not in found[2]:
+            response = error('Method not allowed', 405)
+        else:
+            template, params, methods, admitted, handler = found
+            request = Request(scope, receive, params)
+            await request.read()
+            if admitted:
+                try:
+                    async with admission.admit():
+                        # The slot is held until the response (or stream) has been sent
+                        response = await _until_disconnect(handler, request)
+                        if response is None:
+                            response = Response(status=CLIENT_CLOSED_REQUEST)
+                            logger.info('Client disconnected', extra={'fields': {'endpoint': template}})
+                            return
+                        await _send(send, receive, response)
+                        return
+                except Overloaded as e:
+                    logger.warning('Request shed', extra={'fields': {'endpoint': template, 'reason': e.reason, 'retry_after': e.retry_after}})
+                    response = overloaded(e)
+            else:
+                response = await handler(request)
+        await _send(send, receive, response)
+    finally:
+        metrics.HTTP_REQUESTS.labels(endpoint, response.status if response else 500).inc()
+        # Streaming responses are timed until the stream ends
+        metrics.HTTP_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+        metrics.HTTP_IN_FLIGHT.dec()
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 8000))
+    workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    uvicorn.run('asgi_app:app', host='0.0.0.0', port=port, workers=workers, log_level='warning')
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Offline batch generation from a keyword file.
+
+Streams rows from CSV (keyword, product, contentLength columns) or JSONL,
+generates them with content_with_ai.py at a bounded concurrency and appends
+each finished row to a JSONL (or Parquet) output. A checkpoint file records
+progress, so re-running the same command after an interruption resumes at the
+first unfinished row (rows that were in flight when a run was killed may be
+written twice; their `index` identifies them).
+
+    python batch_cli.py keywords.csv -o results.jsonl --concurrency 16
+    python batch_cli.py keywords.csv --dry-run
+    python batch_cli.py keywords.csv -o results.jsonl --max-cost 20 --on-budget-exceeded downgrade
+
+Rows that do not fit the budget are left unfinished, so re-running with a
+larger budget generates exactly those rows.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+
+from batch_generation import admission_history, generate_row, preview_row, resolve_concurrency, score_entries, PreviewTotals, MAX_CONCURRENCY
+from content_with_ai import close_async_client
+from log_config import configure_logging
+from rate_limiter import limiter as rate_limiter
+from seo_scoring import MIN_SCORE
+from usage_ledger import ledger as usage_ledger, Budget, budget_scope, ON_EXCEED_STOP, ON_EXCEED_DOWNGRADE
+
+PARQUET_COLUMNS = ('index', 'keyword', 'product', 'contentLength', 'article_title', 'meta_title', 'meta_description', 'full_article', 'prompt_versions', 'seo_score', 'seo_issues', 'content_flags', 'error')
+PARQUET_TYPES = {'index': 'int64', 'seo_score': 'float64'}
+
+class RowReader:
+    """Iterate (index, row, next_offset) from a CSV or JSONL file without loading it.
+
+    next_offset is the byte offset where the following row starts, so a run
+    can seek straight back to any row boundary.
+    """
+
+    def __init__(self, path, input_format=None):
+        self.path = path
+        self.format = input_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson', '.json')) else 'csv')
+
+    def rows(self, start_index=0, start_offset=None):
+        with open(self.path, 'rb') as binary_file:
+            fieldnames = None
+            if self.format == 'csv':
+                fieldnames = next(csv.reader([binary_file.readline().decode('utf-8-sig')]))
+            if start_offset:
+                binary_file.seek(start_offset)
+
+            index = start_index
+            if self.format == 'jsonl':
+                for line in iter(binary_file.readline, b''):
+                    if line.strip():
+                        try:
+                            row = json.loads(line)
+                        except ValueError:
+                            # Reported as an invalid row instead of stopping the run
+                            row = None
+                        yield index, row, binary_file.tell()
+                        index += 1
+                return
+
+            # csv.reader pulls one physical line at a time, so the file
+            # position after each record is that record's end
+            reader = csv.reader(line.decode('utf-8') for line in iter(binary_file.readline, b''))
+            for values in reader:
+                if not any(values):
+                    continue
+                yield index, dict(zip(fieldnames, values)), binary_file.tell()
+                index += 1
+
+    def count(self):
+        """Number of rows, from a streaming pass over the file"""
+        return sum(1 for _ in self.rows())
+
+class Checkpoint:
+    """Resume state: every row before next_index is done, plus `done` rows beyond it"""
+
+    def __init__(self, path, input_path):
+        self.path = path
+        self.input_path = input_path
+        self.next_index = 0
+        self.next_offset = None
+        self.done = set()
+        self.succeeded = 0
+        self.failed = 0
+        self.tokens = 0
+        # Rows rejected by the budget in this run; they stay unfinished
+        self.over_budget = 0
+        # Rows generated in this run that scored under SEO_SCORE_MIN
+        self.low_scores = 0
+
+    def _input_signature(self):
+        stat = os.stat(self.input_path)
+        return {'path': os.path.abspath(self.input_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self):
+        """Load saved progress; returns False if there is none"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            state = json.load(f)
+        if state['input'] != self._input_signature():
+            raise ValueError(f'{self.input_path} changed since the checkpoint was written; use --restart to start over')
+        self.next_index = state['next_index']
+        self.next_offset = state['next_offset']
+        self.done = set(state['done'])
+        self.succeeded, self.failed, self.tokens = state['succeeded'], state['failed'], state['tokens']
+        return True
+
+    def mark_done(self, index, offsets, failed):
+        """Record a finished row; offsets maps in-flight row indexes to their start offsets"""
+        self.done.add(index)
+        if failed:
+            self.failed += 1
+        else:
+            self.succeeded += 1
+        # Only advance while the start offset of the next row is known, so
+        # next_index and next_offset always describe the same row
+        while self.next_index in self.done and self.next_index + 1 in offsets:
+            self.done.discard(self.next_index)
+            self.next_index += 1
+            self.next_offset = offsets.pop(self.next_index)
+
+    def save(self):
+        # Write to a temporary file and rename, so a crash never leaves a torn checkpoint
+        state = {
+            'input': self._input_signature(),
+            'next_index': self.next_index,
+            'next_offset': self.next_offset,
+            'done': sorted(self.done),
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'tokens': self.tokens
+        }
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary, self.path)
+
+class JsonlWriter:
+    def __init__(self, path, append):
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, entry):
+        """Append one row; returns True when everything written so far is on disk"""
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        return True
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """Writes row groups of `batch_size` rows; each run appends a new part file next to `path`"""
+
+    def __init__(self, path, append, batch_size=200):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit('Parquet output requires pyarrow (pip install pyarrow)')
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(column, getattr(pyarrow, PARQUET_TYPES.get(column, 'string'))()) for column in PARQUET_COLUMNS])
+        stem = path[:-len('.parquet')] if path.endswith('.parquet') else path
+        part = 0
+        while append and os.path.exists(f'{stem}-{part:05d}.parquet'):
+            part += 1
+        self.writer = pyarrow.parquet.ParquetWriter(f'{stem}-{part:05d}.parquet', self.schema)
+        self.batch_size = batch_size
+        self.pending = []
+
+    def write(self, entry):
+        """Buffer one row; returns True when this call flushed every buffered row to disk"""
+        result = entry.get('result') or {}
+        row = {column: entry.get(column, result.get(column)) for column in PARQUET_COLUMNS}
+        for column in ('prompt_versions', 'seo_issues', 'content_flags'):
+            if row[column] is not None:
+                row[column] = json.dumps(row[column], sort_keys=True)
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+            return True
+        return False
+
+    def flush(self):
+        if self.pending:
+            self.writer.write_table(self.pyarrow.Table.from_pylist(self.pending, schema=self.schema))
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+class Progress:
+    """Single-line rows/s, tokens/s and ETA display on stderr"""
+
+    def __init__(self, total, already_done, interval=1.0):
+        self.total = total
+        self.already_done = already_done
+        self.interval = interval
+        self.started = time.monotonic()
+        self.tokens_at_start = rate_limiter.snapshot()['tokens_used']
+        self.last_shown = self.started
+
+    def tokens_used(self):
+        """Tokens reported by OpenAI since this run started"""
+        return rate_limiter.snapshot()['tokens_used'] - self.tokens_at_start
+
+    def show(self, checkpoint, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_shown < self.interval:
+            return
+        self.last_shown = now
+        elapsed = max(now - self.started, 1e-6)
+        finished = checkpoint.succeeded + checkpoint.failed
+        rows_per_second = (finished - self.already_done) / elapsed
+        tokens_per_second = self.tokens_used() / elapsed
+        remaining = max(self.total - finished, 0) if self.total is not None else None
+        if remaining is None or rows_per_second <= 0:
+            eta = '--'
+        else:
+            minutes, seconds = divmod(int(remaining / rows_per_second), 60)
+            hours, minutes = divmod(minutes, 60)
+            eta = f'{hours}h{minutes:02d}m' if hours else f'{minutes}m{seconds:02d}s'
+        total = f'/{self.total}' if self.total is not None else ''
+        sys.stderr.write(
+            f"\r🚀 {finished}{total} rows ({checkpoint.failed} failed) | {rows_per_second:.2f} rows/s | "
+            f"{tokens_per_second:,.0f} tokens/s | ETA {eta}   "
+        )
+        sys.stderr.flush()
+
+async def run(reader, writer, checkpoint, concurrency, defaults, combined_metadata, progress):
+    rows = asyncio.Queue(maxsize=concurrency * 2)
+    # Start offsets of rows read but not yet passed by the checkpoint
+    offsets = {}
+    tokens_before_run = checkpoint.tokens
+    history = await admission_history()
+
+    async def produce():
+        # Rows already finished in an earlier run are skipped by index
+        start_offset = checkpoint.next_offset
+        offsets[checkpoint.next_index] = start_offset
+        for index, row, next_offset in reader.rows(checkpoint.next_index, start_offset):
+            offsets[index + 1] = next_offset
+            if index in checkpoint.done:
+                continue
+            await rows.put((index, _row_defaults(row, defaults)))
+        for _ in range(concurrency):
+            await rows.put(None)
+
+    # Finished rows are scored in batches of one row per worker, so a crash
+    # loses no more finished rows than were in flight anyway
+    finished = []
+
+    def flush():
+        for entry in score_entries(finished):
+            durable = writer.write(entry)
+            if entry.get('seo_score') is not None and entry['seo_score'] < MIN_SCORE:
+                checkpoint.low_scores += 1
+            checkpoint.tokens = tokens_before_run + progress.tokens_used()
+            checkpoint.mark_done(entry['index'], offsets, 'error' in entry)
+            # Never record a row as done before its output is on disk
+            if durable:
+                checkpoint.save()
+        finished.clear()
+        progress.show(checkpoint)
+
+    async def work():
+        while True:
+            item = await rows.get()
+            if item is None:
+                return
+            index, row = item
+            entry = await generate_row(index, row, combined_metadata, history)
+            if entry.get('budget_exceeded'):
+                checkpoint.over_budget += 1
+                continue
+            finished.append(entry)
+            if len(finished) >= concurrency:
+                flush()
+
+    try:
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    finally:
+        # Rows that finished before an interrupt are still written
+        flush()
+        # asyncio.run closes this loop next, so close the client's connections with it
+        await close_async_client()
+
+def _row_defaults(row, defaults):
+    if isinstance(row, dict):
+        return dict(defaults, **{key: value for key, value in row.items() if value not in (None, '')})
+    return row
+
+def dry_run(reader, concurrency, defaults, combined_metadata):
+    """Print the estimated tokens, cost and duration of generating every row"""
+    history = usage_ledger.averages()
+    totals = PreviewTotals()
+    for index, row, _ in reader.rows():
+        totals.add(preview_row(index, _row_defaults(row, defaults), combined_metadata, history))
+    summary = totals.summary(concurrency)
+    minutes, seconds = divmod(int(summary['estimated_seconds']), 60)
+    hours, minutes = divmod(minutes, 60)
+    print(f"🧮 {summary['rows']} rows ({summary['invalid_rows']} invalid), {summary['calls']} OpenAI calls")
+    print(f"🧮 Tokens: {summary['prompt_tokens']:,} prompt + {summary['completion_tokens']:,} completion = {summary['total_tokens']:,}")
+    print(f"💵 Estimated cost: ${summary['cost']:,.4f}")
+    for product, totals in summary['by_product'].items():
+        print(f"   {product}: {totals['rows']} rows, {totals['total_tokens']:,} tokens, ${totals['cost']:,.4f}")
+    print(f"⏱️  Estimated duration at concurrency {concurrency}: {hours}h{minutes:02d}m{seconds:02d}s")
+    return summary
+
+def _product_budget(value):
+    product, _, cost = value.rpartition('=')
+    try:
+        return product, float(cost)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected PRODUCT=USD')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate SEO content for every row of a CSV/JSONL keyword file')
+    parser.add_argument('input', help='CSV with keyword[, product, contentLength] columns, or JSONL with the same keys')
+    parser.add_argument('-o', '--output', help='output file (.jsonl, or .parquet with pyarrow installed)')
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'), help='defaults to the input file extension')
+    parser.add_argument('--output-format', choices=('jsonl', 'parquet'), help='defaults to the output file extension')
+    parser.add_argument('--concurrency', type=int, default=None, help=f'rows in flight (max {MAX_CONCURRENCY})')
+    parser.add_argument('--product', default='Files.com', help='product for rows without one')
+    parser.add_argument('--content-length', default='medium', help='contentLength for rows without one')
+    parser.add_argument('--combined-metadata', action='store_true', help='generate title and metas with one JSON-mode call')
+    parser.add_argument('--checkpoint', help='checkpoint file (defaults to OUTPUT.checkpoint.json)')
+    parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint and overwrite the output')
+    parser.add_argument('--no-count', action='store_true', help='skip the counting pass (no ETA)')
+    parser.add_argument('--quiet', action='store_true', help='only log warnings and errors (same as LOG_LEVEL=WARNING)')
+    parser.add_argument('--dry-run', action='store_true', help='only estimate tokens, cost and duration; no OpenAI calls')
+    parser.add_argument('--max-tokens', type=int, help='token budget for this run')
+    parser.add_argument('--max-cost', type=float, help='USD budget for this run')
+    parser.add_argument('--product-budget', type=_product_budget, action='append', default=[], metavar='PRODUCT=USD', help='USD budget for one product (repeatable)')
+    parser.add_argument('--on-budget-exceeded', choices=(ON_EXCEED_STOP, ON_EXCEED_DOWNGRADE), default=ON_EXCEED_STOP,
+                        help='skip rows that do not fit the budget, or try shorter content lengths first')
+    args = parser.parse_args(argv)
+    if args.quiet:
+        configure_logging(level='WARNING')
+
+    reader = RowReader(args.input, args.input_format)
+    defaults = {'product': args.product, 'contentLength': args.content_length}
+    if args.dry_run:
+        dry_run(reader, resolve_concurrency(args.concurrency), defaults, args.combined_metadata)
+        return 0
+    if not args.output:
+        parser.error('the following arguments are required: -o/--output')
+    output_format = args.output_format or ('parquet' if args.output.endswith('.parquet') else 'jsonl')
+    concurrency = resolve_concurrency(args.concurrency)
+
+    checkpoint = Checkpoint(args.checkpoint or f'{args.output}.checkpoint.json', args.input)
+    try:
+        resuming = not args.restart and checkpoint.load()
+    except ValueError as e:
+        parser.error(str(e))
+    already_done = checkpoint.succeeded + checkpoint.failed
+
+    total = None if args.no_count else reader.count()
+    if resuming:
+        print(f"🔁 Resuming {args.input} at row {checkpoint.next_index} ({already_done} rows already done)", file=sys.stderr)
+    print(f"🚀 Generating {total if total is not None else 'all'} rows from {args.input} with concurrency {concurrency} -> {args.output}", file=sys.stderr)
+
+    writer = (ParquetWriter if output_format == 'parquet' else JsonlWriter)(args.output, append=resuming)
+    progress = Progress(total, already_done)
+    budget = Budget(args.max_tokens, args.max_cost, dict(args.product_budget), args.on_budget_exceeded)
+    try:
+        with budget_scope(budget):
+            asyncio.run(run(reader, writer, checkpoint, concurrency, defaults, args.combined_metadata, progress))
+    except KeyboardInterrupt:
+        print(f"\n⏸️  Interrupted; re-run the same command to resume at row {checkpoint.next_index}", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+        checkpoint.save()
+
+    progress.show(checkpoint, force=True)
+    usage = budget.snapshot()
+    print(f"\n✅ Done: {checkpoint.succeeded} succeeded, {checkpoint.failed} failed, {checkpoint.tokens:,} tokens (${usage['spent_cost']:,.4f} this run)", file=sys.stderr)
+    if checkpoint.low_scores:
+        print(f"📏 {checkpoint.low_scores} rows scored under {MIN_SCORE:g}; `python seo_scoring.py {args.output} --regenerate regenerate.jsonl` lists them for a re-run", file=sys.stderr)
+    if checkpoint.over_budget:
+        print(f"⛔ {checkpoint.over_budget} rows did not fit the budget; re-run with a larger budget to generate them", file=sys.stderr)
+        return 3
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+import asyncio
+import os
+
+from content_index import content_index
+from content_with_ai import generate_all_content_async, preview_content, run_sync
+from keyword_clustering import cluster_rows, parse_variants
+from log_config import get_logger
+from rate_limiter import limiter as rate_limiter
+from seo_scoring import score_articles
+from usage_ledger import ledger as usage_ledger, Budget, BudgetExceeded, budget_scope, current_budget
+
+# Bulk generation: runs many {keyword, product, contentLength} rows through a
+# bounded pool of workers inside one process, reusing content_with_ai.py.
+
+logger = get_logger('batch')
+
+DEFAULT_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
+MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '32'))
+MAX_BATCH_ROWS = int(os.getenv('BATCH_MAX_ROWS', '500'))
+
+CONTENT_LENGTHS = ('short', 'medium', 'long', 'comprehensive')
+
+def resolve_concurrency(requested=None):
+    """Clamp a requested concurrency to 1..MAX_CONCURRENCY, defaulting to DEFAULT_CONCURRENCY"""
+    if requested is None:
+        requested = DEFAULT_CONCURRENCY
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        raise ValueError('concurrency must be an integer')
+    return max(1, min(requested, MAX_CONCURRENCY))
+
+def parse_row(row):
+    """Validate one batch row and return (keyword, product, content_length)"""
+    if not isinstance(row, dict):
+        raise ValueError('Row must be an object')
+    keyword = row.get('keyword')
+    if not isinstance(keyword, str) or not keyword.strip():
+        raise ValueError('Keyword is required')
+    product = (row.get('product') or 'Files.com').strip()
+    content_length = (row.get('contentLength') or 'medium').strip()
+    if content_length not in CONTENT_LENGTHS:
+        raise ValueError(f"contentLength must be one of: {', '.join(CONTENT_LENGTHS)}")
+    return keyword.strip(), product, content_length
+
+def _validate_rows(rows):
+    if not isinstance(rows, list):
+        raise ValueError('rows must be a list')
+    if not rows:
+        raise ValueError('rows cannot be empty')
+    if len(rows) > MAX_BATCH_ROWS:
+        raise ValueError(f'A batch can contain at most {MAX_BATCH_ROWS} rows')
+
+async def admission_history():
+    """Usage history for estimating rows under the active budget, or None when it has no limits.
+
+    Read once per batch and passed to generate_row; the ledger query runs in a thread.
+    """
+    budget = current_budget()
+    if budget is None or not budget.limited:
+        return None
+    return await asyncio.to_thread(usage_ledger.averages)
+
+async def generate_row(index, row, combined_metadata=False, history=None):
+    """Generate one row; returns its batch entry with either `result` or `error`.
+
+    Under a budget with limits (usage_ledger.budget_scope), the row first
+    reserves its estimated usage; rows that do not fit are downgraded to a
+    shorter length or rejected with `budget_exceeded` set, depending on the
+    budget. history is admission_history(); pass it in for every row of a batch.
+    """
+    try:
+        keyword, product, content_length = parse_row(row)
+        variants = parse_variants(row)
+    except ValueError as e:
+        return {'index': index, 'keyword': row.get('keyword') if isinstance(row, dict) else None, 'error': str(e)}
+
+    budget = current_budget()
+    if budget is not None and not budget.limited:
+        # Calls still charge it; there is just nothing to reserve against
+        budget = None
+    requested_length = content_length
+    if budget is not None:
+        if history is None:
+            history = await asyncio.to_thread(usage_ledger.averages)
+        
+        def estimate(length):
+            preview = preview_content(keyword, product, length, combined_metadata, variants, history)
+            return preview['total_tokens'], preview['cost']
+        
+        try:
+            content_length, reserved_tokens, reserved_cost = await asyncio.to_thread(budget.admit, product, content_length, estimate)
+        except BudgetExceeded as e:
+            logger.warning(f"Batch row skipped: {e}", extra={'fields': {'index': index, 'keyword': keyword}})
+            return {'index': index, 'keyword': keyword, 'product': product, 'contentLength': content_length, 'error': str(e), 'budget_exceeded': True}
+        if content_length != requested_length:
+            logger.info('Batch row downgraded to fit the budget', extra={'fields': {'index': index, 'keyword': keyword, 'from': requested_length, 'to': content_length}})
+
+    try:
+        content = await generate_all_content_async(keyword, product, content_length, combined_metadata, variants)
+    except Exception as e:
+        logger.error(f"Batch row failed: {e}", extra={'fields': {'index': index, 'keyword': keyword}})
+        return {'index': index, 'keyword': keyword, 'error': f'Generation failed: {str(e)}'}
+    finally:
+        if budget is not None:
+            budget.release(product, reserved_tokens, reserved_cost)
+
+    entry = {
+        'index': index,
+        'keyword': keyword,
+        'product': product,
+        'contentLength': content_length,
+        'result': content
+    }
+    # With CONTENT_INDEX_PATH set, near-duplicates of earlier rows and template
+    # output are flagged; the check hashes the article and writes SQLite, so it
+    # runs in a thread rather than on the loop every other row is waiting on
+    flags = await asyncio.to_thread(content_index.check, keyword, product, content.get('full_article')) if content_index.enabled else None
+    if flags and flags['flags']:
+        entry['content_flags'] = flags['flags']
+        if flags['duplicate_of']:
+            entry['duplicate_of'] = flags['duplicate_of']
+    if content_length != requested_length:
+        entry['requestedContentLength'] = requested_length
+    if variants:
+        entry['variants'] = variants
+    return entry
+
+def score_entries(entries):
+    """Set seo_score and seo_issues on the generated entries, scoring them as one batch (vectorized with NumPy).
+
+    Rows under SEO_SCORE_MIN can then be regenerated selectively.
+    """
+    generated = [entry for entry in entries if 'result' in entry]
+    scores = score_articles([dict(entry['result'], keyword=entry['keyword']) for entry in generated])
+    for entry, score in zip(generated, scores):
+        entry['seo_score'], entry['seo_issues'] = score['score'], score['issues']
+    return entries
+
+async def generate_batch_async(rows, concurrency=None, combined_metadata=False):
+    """Generate content for every row with at most `concurrency` rows in flight.
+
+    Returns one entry per input row, in input order, carrying either `result`
+    (the /api/generate_content payload) or `error`.
+    """
+    concurrency = resolve_concurrency(concurrency)
+    queue = asyncio.Queue()
+    for index, row in enumerate(rows):
+        queue.put_nowait((index, row))
+    results = [None] * len(rows)
+    history = await admission_history()
+
+    async def worker():
+        while True:
+            try:
+                index, row = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results[index] = await generate_row(index, row, combined_metadata, history)
+
+    workers = min(concurrency, len(rows))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return score_entries(results)
+
+def generate_batch(rows, concurrency=None, combined_metadata=False, cluster=False, budget=None):
+    """Blocking entry point for generate_batch_async; returns the /api/generate_batch payload.
+
+    With cluster, near-duplicate keywords are merged first (keyword_clustering.py)
+    and each cluster is generated once, with its other keywords as variants.
+    Usage is charged to budget (an unlimited one if none is given) and
+    reported under `usage`.
+    """
+    _validate_rows(rows)
+    concurrency = resolve_concurrency(concurrency)
+    if cluster:
+        clustered = cluster_rows(rows)
+        logger.info('Batch clustered', extra={'fields': {'rows': len(rows), 'clusters': len(clustered)}})
+        rows = clustered
+    budget = budget or Budget()
+
+    logger.info('Batch started', extra={'fields': {'rows': len(rows), 'concurrency': concurrency}})
+    with budget_scope(budget):
+        results = run_sync(generate_batch_async(rows, concurrency, combined_metadata))
+    failed = sum(1 for result in results if 'error' in result)
+    logger.info('Batch finished', extra={'fields': {'succeeded': len(results) - failed, 'failed': failed}})
+
+    return {
+        'results': results,
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'concurrency': concurrency,
+        'usage': budget.snapshot()
+    }
+
+def preview_row(index, row, combined_metadata=False, history=None):
+    """Dry-run counterpart of generate_row: the row's estimated usage, or its validation error"""
+    try:
+        keyword, product, content_length = parse_row(row)
+        variants = parse_variants(row)
+    except ValueError as e:
+        return {'index': index, 'keyword': row.get('keyword') if isinstance(row, dict) else None, 'error': str(e)}
+    return dict(preview_content(keyword, product, content_length, combined_metadata, variants, history), index=index)
+
+class PreviewTotals:
+    """Running totals of row previews, so large files can be previewed without keeping every row"""
+
+    def __init__(self):
+        self.rows = 0
+        self.invalid = 0
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latency = 0.0
+        self.by_product = {}
+
+    def add(self, entry):
+        if 'error' in entry:
+            self.invalid += 1
+            return
+        self.rows += 1
+        self.calls += len(entry['calls'])
+        self.prompt_tokens += entry['prompt_tokens']
+        self.completion_tokens += entry['completion_tokens']
+        self.cost += entry['cost']
+        self.latency += entry['latency_seconds']
+        product = self.by_product.setdefault(entry['product'], {'rows': 0, 'total_tokens': 0, 'cost': 0.0})
+        product['rows'] += 1
+        product['total_tokens'] += entry['total_tokens']
+        product['cost'] += entry['cost']
+
+    def summary(self, concurrency):
+        """Totals plus the expected wall-clock time at this concurrency and the rate limiter's budgets"""
+        total_tokens = self.prompt_tokens + self.completion_tokens
+        seconds = max(
+            self.latency / concurrency,
+            total_tokens / rate_limiter.buckets['tokens'].capacity * 60,
+            self.calls / rate_limiter.buckets['requests'].capacity * 60
+        )
+        return {
+            'rows': self.rows,
+            'invalid_rows': self.invalid,
+            'calls': self.calls,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': total_tokens,
+            'cost': round(self.cost, 4),
+            'estimated_seconds': round(seconds, 1),
+            'concurrency': concurrency,
+            'by_product': {name: dict(totals, cost=round(totals['cost'], 4)) for name, totals in self.by_product.items()}
+        }
+
+def preview_batch(rows, concurrency=None, combined_metadata=False, cluster=False):
+    """Dry run of generate_batch: estimated tokens, cost and duration without calling OpenAI"""
+    _validate_rows(rows)
+    concurrency = resolve_concurrency(concurrency)
+    if cluster:
+        rows = cluster_rows(rows)
+    history = usage_ledger.averages()
+    totals = PreviewTotals()
+    entries = []
+    for index, row in enumerate(rows):
+        entry = preview_row(index, row, combined_metadata, history)
+        totals.add(entry)
+        entries.append(entry)
+    return dict(totals.summary(concurrency), results=entries)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Vercel functions in api/.
+
+Loads each api/*.py handler in a fresh interpreter, the way a new function
+instance does, and reports the median time to import it, the process wall
+time, peak memory, the module count and which heavy packages (the OpenAI SDK,
+httpx, pydantic, ...) were loaded. One extra run per handler under
+`python -X importtime` lists its most expensive top-level imports. The bare
+interpreter is measured too, as the floor every handler starts from.
+
+    python benchmarks/bench_cold_start.py [--handlers generate_content,health] [--repeat 7] [--top 5]
+    python benchmarks/bench_cold_start.py --save-baseline benchmarks/cold_start_baseline.json
+    python benchmarks/bench_cold_start.py --compare benchmarks/cold_start_baseline.json [--fail-on-regression 25]
+
+Baselines are only comparable on the same machine and Python version.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INTERPRETER = '(interpreter)'
+
+# Packages a handler should only load once it actually needs them
+HEAVY_MODULES = ('openai', 'httpx', 'pydantic', 'anyio', 'flask', 'pyarrow', 'numpy')
+
+MARKER = '--- handler import starts ---'
+
+# Runs in the child: load one handler file (or nothing) and report on the process
+PROBE = '''
+import importlib.util, json, sys, time
+sys.stderr.write(%(marker)r + '\\n')
+started = time.perf_counter()
+if sys.argv[1]:
+    spec = importlib.util.spec_from_file_location('cold_start_handler', sys.argv[1])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert hasattr(module, 'handler'), 'no handler class'
+elapsed = time.perf_counter() - started
+peak_rss = None
+try:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                peak_rss = int(line.split()[1]) / 1024
+except OSError:
+    pass
+print(json.dumps({
+    'import_seconds': elapsed,
+    'peak_rss_mb': peak_rss,
+    'modules': len(sys.modules),
+    'heavy': [name for name in %(heavy)r if name in sys.modules]
+}))
+''' % {'marker': MARKER, 'heavy': HEAVY_MODULES}
+
+def handler_paths():
+    """name -> path for every deployable function in api/ (underscore files are shared code)"""
+    paths = {}
+    for path in sorted(glob.glob(os.path.join(ROOT, 'api', '*.py'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if not name.startswith('_'):
+            paths[name] = path
+    return paths
+
+def _child_env():
+    # Keep the handlers' startup warnings (e.g. a missing API key) out of the report
+    return dict(os.environ, LOG_LEVEL='ERROR')
+
+def run_once(path, importtime=False):
+    """Load one handler in a fresh interpreter; returns (probe result, process seconds, stderr)"""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE, path]
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=ROOT, env=_child_env(), capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"loading {path or 'the interpreter'} failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), elapsed, result.stderr
+
+def top_imports(stderr, count):
+    """The most expensive top-level imports after the marker, as (module, cumulative ms)"""
+    lines = stderr.split(MARKER, 1)[-1].splitlines()
+    entries = []
+    for line in lines:
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = len(name) - len(name.lstrip())
+        entries.append((depth, name.strip(), int(cumulative) / 1000))
+    if not entries:
+        return []
+    top_level = min(depth for depth, _, _ in entries)
+    ranked = sorted(((name, ms) for depth, name, ms in entries if depth == top_level), key=lambda entry: -entry[1])
+    return [(name, round(ms, 1)) for name, ms in ranked[:count]]
+
+def measure(name, path, repeat, top):
+    # The first run also writes the bytecode cache, as a deployed bundle would have it
+    run_once(path)
+    runs = [run_once(path) for _ in range(repeat)]
+    _, _, stderr = run_once(path, importtime=True)
+    probes = [probe for probe, _, _ in runs]
+    return {
+        'handler': name,
+        'import_ms': round(statistics.median(probe['import_seconds'] for probe in probes) * 1000, 1),
+        'import_min_ms': round(min(probe['import_seconds'] for probe in probes) * 1000, 1),
+        'process_ms': round(statistics.median(elapsed for _, elapsed, _ in runs) * 1000, 1),
+        'peak_rss_mb': None if probes[-1]['peak_rss_mb'] is None else round(max(probe['peak_rss_mb'] for probe in probes), 1),
+        'modules': probes[-1]['modules'],
+        'heavy': probes[-1]['heavy'],
+        'top_imports': top_imports(stderr, top)
+    }
+
+def _format(value, spec):
+    return '-' if value is None else format(value, spec)
+
+HEADER = f"{'handler':<22}{'import':>9}{'min':>9}{'process':>9}{'rssMB':>8}{'mods':>6}  heavy modules"
+
+def _print_row(row):
+    print(
+        f"{row['handler']:<22}{row['import_ms']:>7.1f}ms{row['import_min_ms']:>7.1f}ms{row['process_ms']:>7.1f}ms"
+        f"{_format(row['peak_rss_mb'], '.1f'):>8}{row['modules']:>6}  {', '.join(row['heavy']) or '-'}",
+        flush=True
+    )
+    if row['top_imports']:
+        print(f"{'':<22}top imports: " + ', '.join(f'{name} {ms:.0f}ms' for name, ms in row['top_imports']))
+
+def compare(rows, baseline, tolerance):
+    """Print changes against a baseline; returns the handlers that regressed beyond tolerance (percent)"""
+    previous = {row['handler']: row for row in baseline['results']}
+    regressions = []
+    print(f"\nAgainst baseline ({baseline['environment']['platform']}, Python {baseline['environment']['python']}):")
+    print(f"{'handler':<22}{'import':>10}{'process':>10}{'rssMB':>10}  newly loaded")
+    for row in rows:
+        old = previous.get(row['handler'])
+        if old is None:
+            continue
+        changes = {}
+        for metric in ('import_ms', 'process_ms', 'peak_rss_mb'):
+            if row[metric] is not None and old.get(metric):
+                changes[metric] = (row[metric] - old[metric]) / old[metric] * 100
+        added = [name for name in row['heavy'] if name not in old.get('heavy', [])]
+        print(
+            f"{row['handler']:<22}"
+            + ''.join(f"{format(changes[metric], '+.1f') + '%' if metric in changes else '-':>10}" for metric in ('import_ms', 'process_ms', 'peak_rss_mb'))
+            + f"  {', '.join(added) or '-'}"
+        )
+        if row['handler'] != INTERPRETER and (changes.get('import_ms', 0) > tolerance or changes.get('peak_rss_mb', 0) > tolerance or added):
+            regressions.append(row['handler'])
+    return regressions
+
+def _handlers(text):
+    available = handler_paths()
+    names = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown handler(s): {', '.join(unknown)}; choose from {', '.join(available)}")
+    return names
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cold-start import time and memory of the api/*.py handlers')
+    parser.add_argument('--handlers', type=_handlers, help='comma-separated handler names (default: all)')
+    parser.add_argument('--repeat', type=int, default=7, help='fresh interpreters per handler')
+    parser.add_argument('--top', type=int, default=5, help='top-level imports to list per handler')
+    parser.add_argument('--save-baseline', metavar='FILE', help='write the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results with a saved baseline')
+    parser.add_argument('--fail-on-regression', type=float, metavar='PERCENT', help='exit 1 if import time or memory rises by more than PERCENT, or a heavy module is newly loaded')
+    args = parser.parse_args(argv)
+
+    paths = handler_paths()
+    names = args.handlers or list(paths)
+    rows = []
+    print(HEADER)
+    for name, path in [(INTERPRETER, '')] + [(name, paths[name]) for name in names]:
+        row = measure(name, path, args.repeat, args.top)
+        rows.append(row)
+        _print_row(row)
+
+    report = {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'settings': {'repeat': args.repeat},
+        'results': rows
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(rows, baseline, args.fail_on_regression or 0)
+        if args.fail_on_regression is not None and regressions:
+            print(f"\n❌ {len(regressions)} handler(s) regressed by more than {args.fail_on_regression}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of the HTTP apps against a local fake OpenAI server.
+
+Starts benchmarks/fake_openai.py and the app under test (the Flask app in
+vercel_app.py, or the api/*.py handlers) in their own processes, drives them
+over HTTP at each concurrency level and reports requests/s, latency
+percentiles, time to first byte, OpenAI tokens/s and the app's peak memory.
+
+    python benchmarks/bench_e2e.py [--target flask|handlers|both] [--concurrency 1,8,32] [--requests 64]
+    python benchmarks/bench_e2e.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_e2e.py --compare benchmarks/baseline.json [--fail-on-regression 15]
+
+The fake server's --latency, --tokens-per-second, --error-rate,
+--rate-limit-rate, --slow-rate, --slow-latency, --record and --replay
+options are passed through; the
+keyword sequence is fixed, so a cassette recorded with --record replays the
+same run. Baselines are only comparable on the same machine and settings.
+"""
+import argparse
+import http.client
+import importlib.util
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRODUCTS = ('Files.com', 'ExaVault', 'ExpanDrive')
+
+# name -> (path, streamed response)
+ENDPOINTS = {
+    'generate_content': ('/api/generate_content', False),
+    'generate_content_stream': ('/api/generate_content/stream', True),
+    'generate_article': ('/api/generate_article', False)
+}
+
+# api/*.py handlers served in handlers mode (the streaming endpoint only exists in the Flask app)
+HANDLER_ENDPOINTS = ('generate_content', 'generate_article')
+
+def serve(target):
+    """Run the app under test on free ports and print READY {endpoint path: port} once listening"""
+    sys.path.insert(0, ROOT)
+    if target == 'flask':
+        import logging
+        from werkzeug.serving import make_server
+        # Access logs would dominate the output
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        from vercel_app import app
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        print('READY ' + json.dumps({ENDPOINTS[name][0]: server.server_port for name in ENDPOINTS}), flush=True)
+        server.serve_forever()
+        return
+
+    from http.server import ThreadingHTTPServer
+    ports = {}
+    for name in HANDLER_ENDPOINTS:
+        path = ENDPOINTS[name][0]
+        spec = importlib.util.spec_from_file_location(f'api_{name}', os.path.join(ROOT, 'api', f'{name}.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        quiet_handler = type('handler', (module.handler,), {'log_message': lambda self, format, *args: None})
+        server = ThreadingHTTPServer(('127.0.0.1', 0), quiet_handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        ports[path] = server.server_address[1]
+    print('READY ' + json.dumps(ports), flush=True)
+    threading.Event().wait()
+
+def _start(command, env, ready):
+    """Start a subprocess and wait for the stdout line matching `ready`; returns (process, match)"""
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True, cwd=ROOT)
+    for line in process.stdout:
+        match = re.search(ready, line)
+        if match:
+            return process, match
+    raise RuntimeError(f"{' '.join(command)} exited before it was ready")
+
+def _fake_stats(port):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        connection.request('GET', '/v1/stats')
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+def peak_rss_mb(pid):
+    """Peak resident memory of a process in MB (Linux /proc only; None elsewhere)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class Client:
+    """One keep-alive connection per worker thread"""
+
+    def __init__(self, port):
+        self.port = port
+        self.connection = None
+
+    def request(self, path, payload, streamed):
+        """Send one request; returns (ok, latency, time to first byte)"""
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=600)
+        body = json.dumps(payload)
+        started = time.perf_counter()
+        try:
+            self.connection.request('POST', path, body, {'Content-Type': 'application/json'})
+            response = self.connection.getresponse()
+            if streamed:
+                first = response.read(1)
+                first_byte = time.perf_counter() - started
+                data = first + response.read()
+                ok = response.status == 200 and b'event: done' in data
+            else:
+                data = response.read()
+                first_byte = time.perf_counter() - started
+                ok = response.status == 200
+            if response.will_close:
+                self.connection.close()
+                self.connection = None
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            return False, time.perf_counter() - started, None
+        return ok, time.perf_counter() - started, first_byte
+
+def run_level(port, path, streamed, concurrency, count, content_length, first_index):
+    """Send `count` requests with `concurrency` in flight; returns (per-request results, elapsed)"""
+    clients = threading.local()
+    lock = threading.Lock()
+    next_index = [first_index]
+
+    def worker():
+        if not hasattr(clients, 'client'):
+            clients.client = Client(port)
+        results = []
+        while True:
+            with lock:
+                index = next_index[0]
+                if index >= first_index + count:
+                    return results
+                next_index[0] += 1
+            payload = {'keyword': f'benchmark keyword {index}', 'product': PRODUCTS[index % len(PRODUCTS)], 'contentLength': content_length}
+            results.append(clients.client.request(path, payload, streamed))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(worker) for _ in range(concurrency)]
+        results = [result for future in futures for result in future.result()]
+    return results, time.perf_counter() - started
+
+def benchmark_target(target, args, fake_port):
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY='benchmark',
+        OPENAI_BASE_URL=f'http://127.0.0.1:{fake_port}/v1',
+        CONTENT_CACHE_ENABLED='true' if args.cache else 'false',
+        USAGE_LEDGER_PATH=os.path.join(tempfile.mkdtemp(prefix='bench_e2e_'), 'usage.sqlite3'),
+        LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING')
+    )
+    # Measure the app, not the client-side rate limit (its concurrency limit still applies)
+    env.setdefault('OPENAI_RPM', '1000000')
+    env.setdefault('OPENAI_TPM', '1000000000')
+    env.pop('OPENAI_SECRET_KEY', None)
+    process, match = _start([sys.executable, os.path.abspath(__file__), '--serve', target], env, r'^READY (.*)$')
+    ports = json.loads(match.group(1))
+    endpoints = [name for name in args.endpoints if ENDPOINTS[name][0] in ports]
+
+    rows = []
+    index = 0
+    try:
+        for name in endpoints:
+            path, streamed = ENDPOINTS[name]
+            if args.warmup:
+                run_level(ports[path], path, streamed, min(args.warmup, max(args.concurrency)), args.warmup, args.content_length, index)
+                index += args.warmup
+            for concurrency in args.concurrency:
+                before = _fake_stats(fake_port)
+                results, elapsed = run_level(ports[path], path, streamed, concurrency, args.requests, args.content_length, index)
+                index += args.requests
+                after = _fake_stats(fake_port)
+                latencies = [latency for ok, latency, _ in results if ok]
+                first_bytes = [first_byte for ok, _, first_byte in results if ok and first_byte is not None]
+                row = {
+                    'target': target,
+                    'endpoint': name,
+                    'concurrency': concurrency,
+                    'requests': len(results),
+                    'errors': sum(1 for ok, _, _ in results if not ok),
+                    'requests_per_second': round(len(results) / elapsed, 2),
+                    'p50_seconds': _round(percentile(latencies, 0.50)),
+                    'p90_seconds': _round(percentile(latencies, 0.90)),
+                    'p99_seconds': _round(percentile(latencies, 0.99)),
+                    'ttfb_p50_seconds': _round(percentile(first_bytes, 0.50)),
+                    'openai_calls_per_request': round((after['requests'] - before['requests']) / max(1, len(results)), 2),
+                    'tokens_per_second': round((after['completion_tokens'] - before['completion_tokens']) / elapsed, 1),
+                    'peak_rss_mb': peak_rss_mb(process.pid)
+                }
+                rows.append(row)
+                _print_row(row)
+    finally:
+        process.terminate()
+        process.wait()
+    return rows
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+def _format(value, spec):
+    return '-' if value is None else format(value, spec)
+
+HEADER = f"{'target':<9}{'endpoint':<25}{'conc':>5}{'reqs':>6}{'err':>5}{'req/s':>9}{'p50':>8}{'p90':>8}{'p99':>8}{'ttfb50':>8}{'calls':>7}{'tok/s':>10}{'rssMB':>8}"
+
+def _print_row(row):
+    print(
+        f"{row['target']:<9}{row['endpoint']:<25}{row['concurrency']:>5}{row['requests']:>6}{row['errors']:>5}"
+        f"{row['requests_per_second']:>9.2f}{_format(row['p50_seconds'], '.3f'):>8}{_format(row['p90_seconds'], '.3f'):>8}"
+        f"{_format(row['p99_seconds'], '.3f'):>8}{_format(row['ttfb_p50_seconds'], '.3f'):>8}{row['openai_calls_per_request']:>7.2f}"
+        f"{row['tokens_per_second']:>10,.0f}{_format(row['peak_rss_mb'], '.1f'):>8}",
+        flush=True
+    )
+
+def compare(rows, baseline, tolerance):
+    """Print changes against a baseline; returns the regressions beyond tolerance (percent)"""
+    previous = {(row['target'], row['endpoint'], row['concurrency']): row for row in baseline['results']}
+    regressions = []
+    print(f"\nAgainst baseline ({baseline['environment']['platform']}, Python {baseline['environment']['python']}):")
+    print(f"{'target':<9}{'endpoint':<25}{'conc':>5}{'req/s':>10}{'p50':>10}{'p99':>10}{'rssMB':>10}")
+    for row in rows:
+        old = previous.get((row['target'], row['endpoint'], row['concurrency']))
+        if old is None:
+            continue
+        changes = {}
+        for metric in ('requests_per_second', 'p50_seconds', 'p99_seconds', 'peak_rss_mb'):
+            if row[metric] is not None and old.get(metric):
+                changes[metric] = (row[metric] - old[metric]) / old[metric] * 100
+        print(
+            f"{row['target']:<9}{row['endpoint']:<25}{row['concurrency']:>5}"
+            + ''.join(f"{_format(changes.get(metric), '+.1f') + '%':>10}" for metric in ('requests_per_second', 'p50_seconds', 'p99_seconds', 'peak_rss_mb'))
+        )
+        if changes.get('requests_per_second', 0) < -tolerance or changes.get('p99_seconds', 0) > tolerance:
+            regressions.append((row['target'], row['endpoint'], row['concurrency']))
+    return regressions
+
+def _levels(text):
+    return [int(level) for level in text.split(',') if level.strip()]
+
+def _endpoints(text):
+    names = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ENDPOINTS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown endpoint(s): {', '.join(unknown)}; choose from {', '.join(ENDPOINTS)}")
+    return names
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='End-to-end benchmark against a local fake OpenAI server')
+    parser.add_argument('--target', choices=('flask', 'handlers', 'both'), default='both')
+    parser.add_argument('--endpoints', type=_endpoints, default=['generate_content', 'generate_content_stream'], help=f"comma-separated: {', '.join(ENDPOINTS)}")
+    parser.add_argument('--concurrency', type=_levels, default=[1, 8, 32], help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=64, help='requests per level')
+    parser.add_argument('--warmup', type=int, default=4, help='unmeasured requests per endpoint')
+    parser.add_argument('--content-length', default='short')
+    parser.add_argument('--cache', action='store_true', help='keep the result cache enabled')
+    parser.add_argument('--latency', type=float, default=0.1, help='fake OpenAI seconds before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=2000, help='fake OpenAI generation speed')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='share of fake OpenAI requests that wait --slow-latency extra')
+    parser.add_argument('--slow-latency', type=float, default=2.0)
+    parser.add_argument('--record', metavar='CASSETTE', help='record real OpenAI responses (needs OPENAI_API_KEY)')
+    parser.add_argument('--replay', metavar='CASSETTE', help='replay recorded responses')
+    parser.add_argument('--save-baseline', metavar='FILE', help='write the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results with a saved baseline')
+    parser.add_argument('--fail-on-regression', type=float, metavar='PERCENT', help='exit 1 if req/s drops or p99 rises by more than PERCENT')
+    parser.add_argument('--serve', choices=('flask', 'handlers'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve)
+        return 0
+
+    fake_command = [
+        sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_openai.py'), '--port', '0',
+        '--latency', str(args.latency), '--tokens-per-second', str(args.tokens_per_second),
+        '--error-rate', str(args.error_rate), '--rate-limit-rate', str(args.rate_limit_rate),
+        '--slow-rate', str(args.slow_rate), '--slow-latency', str(args.slow_latency)
+    ]
+    if args.record:
+        fake_command += ['--record', args.record]
+    if args.replay:
+        fake_command += ['--replay', args.replay]
+    fake, match = _start(fake_command, dict(os.environ), r'http://[\d.]+:(\d+)/v1')
+    fake_port = int(match.group(1))
+
+    targets = ('flask', 'handlers') if args.target == 'both' else (args.target,)
+    rows = []
+    print(HEADER)
+    try:
+        for target in targets:
+            rows.extend(benchmark_target(target, args, fake_port))
+    finally:
+        fake.terminate()
+        fake.wait()
+
+    report = {
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'settings': {
+            'requests': args.requests, 'content_length': args.content_length, 'cache': args.cache,
+            'latency': args.latency, 'tokens_per_second': args.tokens_per_second,
+            'error_rate': args.error_rate, 'rate_limit_rate': args.rate_limit_rate,
+            'slow_rate': args.slow_rate, 'slow_latency': args.slow_latency, 'replay': bool(args.replay)
+        },
+        'results': rows
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != report['settings']:
+            print(f"\n⚠️  Baseline settings differ: {baseline['settings']}")
+        regressions = compare(rows, baseline, args.fail_on_regression or 0)
+        if args.fail_on_regression is not None and regressions:
+            print(f"\n❌ {len(regressions)} level(s) regressed by more than {args.fail_on_regression}%")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for degraded-mode (template fallback) generation.
+
+Measures fallback_templates.full_article renders per second for every content
+length against per-call section assembly, then runs a whole batch through
+batch_generation with no OpenAI key, as happens during an outage.
+
+    python benchmarks/bench_fallback.py [--renders N] [--rows N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+# Template fallback only: make sure no OpenAI client is configured
+os.environ.pop('OPENAI_API_KEY', None)
+os.environ.pop('OPENAI_SECRET_KEY', None)
+os.environ.setdefault('CONTENT_CACHE_ENABLED', 'false')
+
+# Add the repository root to Python path to import the generator modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fallback_templates
+from fallback_templates import full_article
+
+PRODUCTS = ('Files.com', 'ExaVault', 'ExpanDrive', 'Acme Storage')
+
+def assemble_per_call(keyword, title, product, content_length):
+    """Format each section and join them on every call (what the precompiled templates avoid)"""
+    fields = fallback_templates._fields(keyword, product)
+    fields['title'] = title
+    sections = ['# {title}'] + [fallback_templates._SECTIONS[name] for name in fallback_templates._LAYOUTS[content_length]]
+    return '\n\n'.join(section.format(**fields) for section in sections)
+
+def rate(render, count):
+    started = time.perf_counter()
+    for i in range(count):
+        render(f'keyword {i}', f'Title {i}', PRODUCTS[i % len(PRODUCTS)])
+    return count / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=20000, help='renders per measurement')
+    parser.add_argument('--rows', type=int, default=500, help='rows in the degraded batch')
+    args = parser.parse_args()
+
+    print(f"{'length':<14}{'words':>7}{'precompiled/s':>15}{'per-call/s':>12}{'MB/s':>8}")
+    for content_length in fallback_templates._LAYOUTS:
+        article = full_article('sftp server', 'Title', 'Files.com', content_length)
+        assert article == assemble_per_call('sftp server', 'Title', 'Files.com', content_length)
+        compiled = rate(lambda k, t, p: full_article(k, t, p, content_length), args.renders)
+        per_call = rate(lambda k, t, p: assemble_per_call(k, t, p, content_length), args.renders)
+        print(f"{content_length:<14}{len(article.split()):>7}{compiled:>15,.0f}{per_call:>12,.0f}{compiled * len(article) / 1e6:>8.1f}")
+
+    from batch_generation import generate_batch
+    rows = [{'keyword': f'keyword {i}', 'product': PRODUCTS[i % len(PRODUCTS)], 'contentLength': 'medium'} for i in range(args.rows)]
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = generate_batch(rows)
+    elapsed = time.perf_counter() - started
+    print(f"\nDegraded batch: {result['succeeded']}/{len(rows)} rows in {elapsed:.2f}s ({len(rows) / elapsed:,.0f} rows/s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for article_sanitizer over representative article sizes.
+
+Compares the single-pass sanitizer (whole article and streamed in chunks)
+with the chained str.replace / re.sub cleanup it replaced.
+
+    python benchmarks/bench_sanitizer.py [--repeat N]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+# Add the repository root to Python path to import article_sanitizer
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from article_sanitizer import sanitize_article, StreamingSanitizer
+
+SIZES = {'short': 650, 'medium': 1000, 'long': 1600, 'comprehensive': 2600}
+
+PARAGRAPH = (
+    "Secure file transfer (SFTP, FTPS and HTTPS) keeps data encrypted in transit. "
+    "Teams that automate transfers (for example, nightly partner feeds) reduce manual errors "
+    "and gain an audit trail for compliance reviews."
+)
+
+def legacy_clean(article_content):
+    """The cleanup generate_full_article used before article_sanitizer"""
+    article_content = article_content.replace("📊 Generated article word count:", "")
+    article_content = article_content.replace("words (target:", "")
+    article_content = article_content.replace("EXACTLY", "")
+    article_content = article_content.replace("words)", "")
+    article_content = article_content.replace("(target:", "")
+    article_content = article_content.replace(")", "")
+    article_content = re.sub(r'\([0-9]+\s*words?\)', '', article_content)
+    article_content = re.sub(r'This section contains [0-9]+ words?', '', article_content)
+    article_content = re.sub(r'Target: [0-9]+ words?', '', article_content)
+    article_content = re.sub(r'\s*\(\s*\)', '', article_content)
+    return article_content
+
+def make_article(words):
+    """Markdown article of roughly `words` words with a few echoed artifacts"""
+    parts = ["# The Complete Guide to SFTP Servers (EXACTLY 800-1200 words)\n"]
+    section = 0
+    while sum(len(part.split()) for part in parts) < words:
+        section += 1
+        parts.append(f"## Section {section} (250 words)\n\n{PARAGRAPH} {PARAGRAPH}\n\n- Benefit one (fast)\n- Benefit two\n\n{PARAGRAPH}\n")
+    parts.append("📊 Generated article word count: 812 words (target: EXACTLY 800-1200 words)\n")
+    return '\n'.join(parts)
+
+def stream(article, chunk_size=16):
+    sanitizer = StreamingSanitizer()
+    output = [sanitizer.feed(article[i:i + chunk_size]) for i in range(0, len(article), chunk_size)]
+    output.append(sanitizer.flush())
+    return ''.join(output)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help='iterations per measurement')
+    args = parser.parse_args()
+
+    print(f"{'length':<14}{'words':>7}{'legacy µs':>12}{'single-pass µs':>16}{'streamed µs':>14}{'speedup':>9}")
+    for name, words in SIZES.items():
+        article = make_article(words)
+        assert stream(article) == sanitize_article(article)
+        legacy = timeit.timeit(lambda: legacy_clean(article), number=args.repeat) / args.repeat * 1e6
+        single = timeit.timeit(lambda: sanitize_article(article), number=args.repeat) / args.repeat * 1e6
+        streamed = timeit.timeit(lambda: stream(article), number=args.repeat) / args.repeat * 1e6
+        print(f"{name:<14}{len(article.split()):>7}{legacy:>12.1f}{single:>16.1f}{streamed:>14.1f}{legacy / single:>8.1f}x")
+
+    article = make_article(SIZES['medium'])
+    print(f"\nClosing parens kept: legacy {legacy_clean(article).count(')')}, single-pass {sanitize_article(article).count(')')} (input {article.count(')')})")
+
+if __name__ == '__main__':
+    main()
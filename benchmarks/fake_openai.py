@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in for benchmarks.
+
+Serves POST /v1/chat/completions (plain and streamed) with configurable
+latency, generation speed, 5xx and 429 rates, a slow tail (a share of
+requests that wait extra, like upstream queueing), and GET /stats with the
+requests and tokens it has served. Synthetic completions are derived from a
+hash of the request, so the same request always gets the same text.
+
+    python benchmarks/fake_openai.py --port 18001 --latency 0.1 --tokens-per-second 2000
+    python benchmarks/fake_openai.py --record cassette.jsonl   # forward to OpenAI and save the responses
+    python benchmarks/fake_openai.py --replay cassette.jsonl   # serve the saved responses
+
+Recording forwards every request to --upstream with OPENAI_API_KEY as plain
+(non-streamed) completions; streamed requests are then served from the
+recorded text, so one cassette replays both ways. In replay mode a request
+with no recording gets a 500, which makes missing coverage visible.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the repository root to Python path to import token_counter
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from token_counter import count_message_tokens, count_tokens, TOKENS_PER_WORD
+
+VOCABULARY = (
+    'secure file transfer automation teams partners compliance encryption audit workflow storage cloud '
+    'integration access control sharing retention policy reliable scalable monitoring alerts schedule '
+    'customers data business process review example practice guide setup configure manage'
+).split()
+
+# Tokens per streamed chunk; real streams send one or two, larger chunks keep the stand-in cheap
+STREAM_CHUNK_TOKENS = 8
+
+def request_key(body):
+    """Cassette key: the parts of a request that determine its completion (not `stream`)"""
+    fields = {name: body.get(name) for name in ('model', 'messages', 'max_tokens', 'temperature', 'response_format')}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+def synthetic_content(body, key):
+    """Deterministic completion sized like a real one: articles near max_tokens, short fields for the rest"""
+    rng = random.Random(key)
+    max_tokens = body.get('max_tokens') or 256
+    if (body.get('response_format') or {}).get('type') == 'json_object':
+        if 'sections' in body['messages'][0]['content']:
+            # Article outline for the sectioned mode
+            return json.dumps({'sections': [
+                {'heading': ' '.join(rng.choice(VOCABULARY) for _ in range(4)).title(), 'points': [rng.choice(VOCABULARY), rng.choice(VOCABULARY)]}
+                for _ in range(6)
+            ]})
+        return json.dumps({
+            'article_title': 'Secure File Transfer Automation Guide',
+            'meta_title': 'File Transfer Automation Guide',
+            'meta_description': 'Learn how teams automate secure file transfer workflows with encryption, audit trails and scheduling.'
+        })
+    if max_tokens < 200:
+        return ' '.join(rng.choice(VOCABULARY) for _ in range(min(12, max_tokens // 2))).capitalize()
+    # Articles: ~90% of the token budget in H2 sections of 80-140 words
+    words = int(max_tokens * 0.9 / TOKENS_PER_WORD)
+    parts = ['# ' + ' '.join(rng.choice(VOCABULARY) for _ in range(6)).title()]
+    section = 0
+    while words > 0:
+        section += 1
+        size = min(words, rng.randint(80, 140))
+        parts.append(f"## Section {section}: {rng.choice(VOCABULARY).title()}")
+        parts.append(' '.join(rng.choice(VOCABULARY) for _ in range(size)) + '.')
+        words -= size
+    return '\n\n'.join(parts)
+
+class FakeOpenAI:
+    """Completion behaviour and counters shared by all request threads"""
+
+    def __init__(self, latency=0.1, tokens_per_second=2000.0, error_rate=0.0, rate_limit_rate=0.0, seed=0,
+                 record=None, replay=None, upstream='https://api.openai.com/v1', recorded_timing=False,
+                 slow_rate=0.0, slow_latency=2.0):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.record_path = record
+        self.upstream = upstream.rstrip('/')
+        self.recorded_timing = recorded_timing
+        self.cassette = {}
+        self.stats = {'requests': 0, 'streamed': 0, 'errors': 0, 'rate_limited': 0, 'replay_misses': 0, 'slowed': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        for path in (replay, record):
+            if path and os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self.cassette.setdefault(entry['key'], entry)
+        self.replaying = replay is not None
+
+    def _count(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+    def failure(self):
+        """(status, message) for an injected failure, or None"""
+        with self._lock:
+            draw = self._random.random()
+        if draw < self.rate_limit_rate:
+            return 429, 'Rate limit reached (injected by fake_openai)'
+        if draw < self.rate_limit_rate + self.error_rate:
+            return 500, 'Server error (injected by fake_openai)'
+        return None
+
+    def _forward(self, body):
+        request = urllib.request.Request(
+            f'{self.upstream}/chat/completions',
+            data=json.dumps(dict(body, stream=False)).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'Authorization': f"Bearer {os.environ['OPENAI_API_KEY']}"}
+        )
+        started = time.monotonic()
+        with urllib.request.urlopen(request, timeout=300) as response:
+            payload = json.loads(response.read())
+        return payload, time.monotonic() - started
+
+    def completion(self, body):
+        """(content, usage, seconds to spend generating) for a request; raises LookupError on a replay miss"""
+        key = request_key(body)
+        entry = self.cassette.get(key)
+        forwarded = entry is None and self.record_path is not None
+        if forwarded:
+            payload, latency = self._forward(body)
+            entry = {'key': key, 'request': {name: value for name, value in body.items() if name != 'stream'}, 'response': payload, 'latency': round(latency, 3)}
+            with self._lock:
+                if key not in self.cassette:
+                    self.cassette[key] = entry
+                    with open(self.record_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        if entry is None and self.replaying:
+            raise LookupError('No recorded response for this request')
+        if entry is not None:
+            content = entry['response']['choices'][0]['message']['content']
+            usage = dict(entry['response'].get('usage') or {'prompt_tokens': count_message_tokens(body['messages']), 'completion_tokens': count_tokens(content)})
+        else:
+            content = synthetic_content(body, key)
+            usage = {'prompt_tokens': count_message_tokens(body['messages']), 'completion_tokens': count_tokens(content)}
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        if forwarded:
+            # The upstream call already took its time
+            seconds = 0.0
+        elif entry is not None and self.recorded_timing:
+            seconds = entry['latency']
+        else:
+            seconds = self.latency + usage['completion_tokens'] / self.tokens_per_second
+        if self.slow_rate and not forwarded:
+            with self._lock:
+                slow = self._random.random() < self.slow_rate
+            if slow:
+                seconds += self.slow_latency
+                self._count(slowed=1)
+        return content, usage, seconds
+
+def _handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _error(self, status, message, headers=None):
+            error_type = 'requests' if status == 429 else 'server_error'
+            self._json(status, {'error': {'message': message, 'type': error_type, 'code': None}}, headers)
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/stats'):
+                with fake._lock:
+                    self._json(200, dict(fake.stats))
+            else:
+                self._error(404, 'Not found')
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._error(404, 'Not found')
+                return
+            fake._count(requests=1)
+
+            failure = fake.failure()
+            if failure:
+                status, message = failure
+                time.sleep(fake.latency)
+                fake._count(**{'rate_limited' if status == 429 else 'errors': 1})
+                self._error(status, message, {'retry-after-ms': '200'} if status == 429 else None)
+                return
+            try:
+                content, usage, seconds = fake.completion(body)
+            except LookupError as e:
+                fake._count(replay_misses=1, errors=1)
+                self._error(500, str(e))
+                return
+            except (urllib.error.URLError, OSError, KeyError) as e:
+                fake._count(errors=1)
+                self._error(502, f'Recording failed: {e}')
+                return
+            fake._count(prompt_tokens=usage['prompt_tokens'], completion_tokens=usage['completion_tokens'])
+
+            created = int(time.time())
+            model = body.get('model', 'gpt-3.5-turbo')
+            if not body.get('stream'):
+                time.sleep(seconds)
+                self._json(200, {
+                    'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                    'usage': usage
+                })
+                return
+
+            fake._count(streamed=1)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            words = content.split(' ')
+            # Chunks of ~STREAM_CHUNK_TOKENS tokens, paced so the whole stream takes `seconds`
+            step = max(1, int(STREAM_CHUNK_TOKENS / TOKENS_PER_WORD))
+            chunks = [' '.join(words[i:i + step]) + (' ' if i + step < len(words) else '') for i in range(0, len(words), step)]
+            first_token = min(fake.latency, seconds)
+            pause = (seconds - first_token) / max(1, len(chunks))
+            time.sleep(first_token)
+            try:
+                for text in chunks:
+                    event = {
+                        'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                        'choices': [{'index': 0, 'delta': {'content': text}, 'finish_reason': None}]
+                    }
+                    self._chunk(f'data: {json.dumps(event)}\n\n'.encode('utf-8'))
+                    if pause:
+                        time.sleep(pause)
+                if (body.get('stream_options') or {}).get('include_usage'):
+                    # Like OpenAI: a last chunk with no choices that carries the usage
+                    event = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage}
+                    self._chunk(f'data: {json.dumps(event)}\n\n'.encode('utf-8'))
+                self._chunk(b'data: [DONE]\n\n')
+                self._chunk(b'')
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading (e.g. its consumer went away)
+                pass
+
+        def _chunk(self, data):
+            self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+            self.wfile.flush()
+
+    return Handler
+
+def make_server(fake, host='127.0.0.1', port=0):
+    """ThreadingHTTPServer serving `fake`; port 0 picks a free port (see server.server_address)"""
+    server = ThreadingHTTPServer((host, port), _handler(fake))
+    server.daemon_threads = True
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible server for benchmarks')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18001)
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=2000, help='completion generation speed')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='share of requests answered with a 429')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='share of requests that wait --slow-latency extra seconds')
+    parser.add_argument('--slow-latency', type=float, default=2.0, help='extra seconds for a slow request')
+    parser.add_argument('--seed', type=int, default=0, help='seed for injected failures and slow requests')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--record', metavar='CASSETTE', help='forward unrecorded requests to --upstream and append them to CASSETTE')
+    mode.add_argument('--replay', metavar='CASSETTE', help='serve only responses recorded in CASSETTE')
+    parser.add_argument('--upstream', default='https://api.openai.com/v1', help='API to record from (uses OPENAI_API_KEY)')
+    parser.add_argument('--recorded-timing', action='store_true', help='replay with the recorded latencies instead of --latency/--tokens-per-second')
+    args = parser.parse_args(argv)
+
+    if args.record and not os.getenv('OPENAI_API_KEY'):
+        parser.error('--record needs OPENAI_API_KEY')
+    fake = FakeOpenAI(args.latency, args.tokens_per_second, args.error_rate, args.rate_limit_rate, args.seed,
+                      args.record, args.replay, args.upstream, args.recorded_timing, args.slow_rate, args.slow_latency)
+    server = make_server(fake, args.host, args.port)
+    print(f"Fake OpenAI listening on http://{args.host}:{server.server_address[1]}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
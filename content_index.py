@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate and template-fallback detection over the generated corpus.
+
+Every article is reduced to 5-word shingles with its keyword and product
+masked (so pages that differ only in `{keyword}` look the same) and to a
+one-permutation MinHash signature. Signatures and LSH buckets live in
+SQLite (minhash.py's SQLiteLSHIndex), so checking a new article only looks
+at the few articles sharing a bucket with it, never the whole corpus, and
+the index grows one article at a time across runs and processes.
+
+Two flags are raised:
+- near_duplicate: the estimated Jaccard similarity with an indexed article
+  is at least CONTENT_DUPLICATE_THRESHOLD (default 0.7)
+- template_fallback: the article matches fallback_templates.py's article for
+  its product (similarity at least CONTENT_TEMPLATE_THRESHOLD, default 0.8);
+  these are not indexed, since they already match the template
+
+    python content_index.py results.jsonl --index corpus.sqlite3 -o flagged.jsonl
+
+With CONTENT_INDEX_PATH set, batch rows (batch_cli.py, /api/generate_batch)
+are checked and indexed as they are generated.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+
+import fallback_templates
+import metrics
+from log_config import get_logger
+from minhash import OnePermutationHasher, SQLiteLSHIndex, estimate_similarity, word_shingles
+
+logger = get_logger('content_index')
+
+DUPLICATE_THRESHOLD = float(os.getenv('CONTENT_DUPLICATE_THRESHOLD', '0.7'))
+TEMPLATE_THRESHOLD = float(os.getenv('CONTENT_TEMPLATE_THRESHOLD', '0.8'))
+FLAG_NEAR_DUPLICATE = 'near_duplicate'
+FLAG_TEMPLATE_FALLBACK = 'template_fallback'
+# Candidates verified per article, so a large cluster of duplicates does not make checks linear
+MAX_CANDIDATES = 100
+MAX_MATCHES = 5
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Stands in for the keyword when fingerprinting the fallback templates
+_TEMPLATE_KEYWORD = 'template keyword'
+
+def _mask(tokens, phrase, mark):
+    """tokens with every occurrence of the token sequence `phrase` replaced by one `mark`"""
+    if not phrase:
+        return tokens
+    masked = []
+    size = len(phrase)
+    i = 0
+    while i < len(tokens):
+        if tokens[i] == phrase[0] and tokens[i:i + size] == phrase:
+            masked.append(mark)
+            i += size
+        else:
+            masked.append(tokens[i])
+            i += 1
+    return masked
+
+def article_tokens(text, keyword, product):
+    """Lowercased words of an article with its keyword and product phrases masked"""
+    tokens = _TOKEN.findall(text.lower())
+    tokens = _mask(tokens, _TOKEN.findall(keyword.lower()), '@keyword')
+    return _mask(tokens, _TOKEN.findall((product or '').lower()), '@product')
+
+def _pack(signature):
+    return struct.pack(f'<{len(signature)}I', *signature)
+
+def _unpack(blob):
+    return struct.unpack(f'<{len(blob) // 4}I', blob)
+
+def _key(keyword, product):
+    return f"{product or ''}\t{' '.join(keyword.lower().split())}"
+
+class ContentIndex:
+    """Persistent MinHash/LSH index of generated articles with duplicate and template checks"""
+
+    def __init__(self, path=None, enabled=True, threshold=DUPLICATE_THRESHOLD, template_threshold=TEMPLATE_THRESHOLD,
+                 num_perm=64, bands=16, shingle_words=5):
+        self.path = path
+        self.enabled = enabled and bool(path)
+        self.threshold = threshold
+        self.template_threshold = template_threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        # Articles have hundreds of shingles; one hash each instead of num_perm
+        self.hasher = OnePermutationHasher(num_perm)
+        self.stats = {'checked': 0, 'indexed': 0, FLAG_NEAR_DUPLICATE: 0, FLAG_TEMPLATE_FALLBACK: 0}
+        self._templates = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._lsh = None
+
+    @classmethod
+    def from_env(cls):
+        """Build from CONTENT_INDEX_PATH (unset disables the index)"""
+        return cls(path=os.getenv('CONTENT_INDEX_PATH'))
+
+    def _connection(self):
+        # Opened lazily; if the file cannot be opened the index is switched off
+        if self._conn is None and self.enabled:
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS articles (id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, keyword TEXT NOT NULL, '
+                    'product TEXT, digest TEXT NOT NULL, signature BLOB, flags TEXT NOT NULL, added_at REAL NOT NULL)'
+                )
+                self._lsh = SQLiteLSHIndex(conn, self.bands, self.rows)
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Content index unavailable ({e}), duplicate checks are off")
+                self.enabled = False
+        return self._conn
+
+    def signature(self, article, keyword, product):
+        return self.hasher.signature(word_shingles(article_tokens(article, keyword, product), self.shingle_words))
+
+    def _template_signatures(self, product):
+        """Signatures of the fallback article of every content length for a product, computed once per product"""
+        signatures = self._templates.get(product)
+        if signatures is None:
+            title = fallback_templates.article_title(_TEMPLATE_KEYWORD, product)
+            signatures = self._templates[product] = {
+                content_length: self.signature(fallback_templates.full_article(_TEMPLATE_KEYWORD, title, product, content_length), _TEMPLATE_KEYWORD, product)
+                for content_length in ('short', 'medium', 'long', 'comprehensive')
+            }
+        return signatures
+
+    def check(self, keyword, product, article, add=True):
+        """Flags for one article, indexing it unless it is template output (or add is False).
+
+        Returns {'flags', 'duplicate_of': [{'keyword', 'product', 'similarity'}],
+        'template', 'template_similarity'}, or None when the index is off.
+        """
+        if not self.enabled or not article:
+            return None
+        product = product or fallback_templates.DEFAULT_PRODUCT
+        signature = self.signature(article, keyword, product)
+        template, template_similarity = max(
+            ((content_length, estimate_similarity(signature, template_signature)) for content_length, template_signature in self._template_signatures(product).items()),
+            key=lambda item: item[1]
+        )
+        is_template = template_similarity >= self.template_threshold
+        key = _key(keyword, product)
+        digest = hashlib.sha1(article.encode('utf-8')).hexdigest()
+
+        with self._lock:
+            conn = self._connection()
+            if conn is None:
+                return None
+            try:
+                existing = conn.execute('SELECT id, digest FROM articles WHERE key = ?', (key,)).fetchone()
+                candidates = self._lsh.query(signature, limit=MAX_CANDIDATES)
+                if existing is not None:
+                    candidates.discard(existing[0])
+                matches = []
+                if candidates:
+                    placeholders = ','.join('?' * len(candidates))
+                    for keyword_match, product_match, blob in conn.execute(
+                        f'SELECT keyword, product, signature FROM articles WHERE id IN ({placeholders})', sorted(candidates)
+                    ):
+                        similarity = estimate_similarity(signature, _unpack(blob))
+                        if similarity >= self.threshold:
+                            matches.append({'keyword': keyword_match, 'product': product_match, 'similarity': round(similarity, 3)})
+                matches.sort(key=lambda match: -match['similarity'])
+                flags = ([FLAG_NEAR_DUPLICATE] if matches else []) + ([FLAG_TEMPLATE_FALLBACK] if is_template else [])
+
+                if add and (existing is None or existing[1] != digest):
+                    if existing is not None:
+                        self._lsh.remove(existing[0])
+                    conn.execute(
+                        'INSERT INTO articles (key, keyword, product, digest, signature, flags, added_at) VALUES (?, ?, ?, ?, ?, ?, ?) '
+                        'ON CONFLICT(key) DO UPDATE SET keyword = excluded.keyword, digest = excluded.digest, '
+                        'signature = excluded.signature, flags = excluded.flags, added_at = excluded.added_at',
+                        (key, keyword, product, digest, None if is_template else _pack(signature), json.dumps(flags), time.time())
+                    )
+                    row_id = existing[0] if existing is not None else conn.execute('SELECT id FROM articles WHERE key = ?', (key,)).fetchone()[0]
+                    if not is_template:
+                        self._lsh.add(row_id, signature)
+                        self.stats['indexed'] += 1
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Content index check failed: {e}", extra={'fields': {'keyword': keyword}})
+                return None
+            self.stats['checked'] += 1
+            for flag in flags:
+                self.stats[flag] += 1
+
+        for flag in flags:
+            metrics.CONTENT_FLAGS.labels(flag).inc()
+        if flags:
+            logger.info('Thin content flagged', extra={'fields': {'keyword': keyword, 'product': product, 'flags': ','.join(flags)}})
+        return {
+            'flags': flags,
+            'duplicate_of': matches[:MAX_MATCHES],
+            'template': template if is_template else None,
+            'template_similarity': round(template_similarity, 3)
+        }
+
+    def snapshot(self):
+        """Check counters and the indexed article count, for monitoring"""
+        with self._lock:
+            conn = self._connection()
+            articles = conn.execute('SELECT COUNT(*) FROM articles').fetchone()[0] if conn is not None else 0
+            return dict(self.stats, enabled=self.enabled, articles=articles, threshold=self.threshold)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+content_index = ContentIndex.from_env()
+
+def main(argv=None):
+    from static_export import read_entries
+
+    parser = argparse.ArgumentParser(description='Flag near-duplicate and template-fallback articles in batch results')
+    parser.add_argument('inputs', nargs='+', help='batch_cli.py output files (.jsonl, or .parquet parts with pyarrow installed)')
+    parser.add_argument('--index', required=True, help='SQLite index file; created on first use and extended by every run')
+    parser.add_argument('-o', '--output', help='JSONL of the flagged rows')
+    parser.add_argument('--threshold', type=float, default=DUPLICATE_THRESHOLD, help='estimated Jaccard similarity of a near-duplicate')
+    parser.add_argument('--check-only', action='store_true', help='check against the index without adding the articles')
+    args = parser.parse_args(argv)
+
+    index = ContentIndex(args.index, threshold=args.threshold)
+    started = time.monotonic()
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    flagged = 0
+    try:
+        for entry in read_entries(args.inputs):
+            if not isinstance(entry, dict) or entry.get('error'):
+                continue
+            result = entry.get('result') if isinstance(entry.get('result'), dict) else entry
+            if not entry.get('keyword') or not result.get('full_article'):
+                continue
+            check = index.check(entry['keyword'], entry.get('product'), result['full_article'], add=not args.check_only)
+            if check and check['flags']:
+                flagged += 1
+                if output:
+                    output.write(json.dumps(dict({key: entry.get(key) for key in ('index', 'keyword', 'product', 'contentLength')}, **check), ensure_ascii=False) + '\n')
+        stats = index.snapshot()
+    finally:
+        if output:
+            output.close()
+        index.close()
+
+    print(f"🧬 {stats['checked']} articles checked in {time.monotonic() - started:.1f}s: {stats[FLAG_NEAR_DUPLICATE]} near-duplicates, "
+          f"{stats[FLAG_TEMPLATE_FALLBACK]} template fallbacks; {stats['articles']} articles in {args.index}", file=sys.stderr)
+    if output:
+        print(f"🚩 {flagged} flagged rows -> {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
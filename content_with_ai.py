@@ -1,436 +1,1144 @@
-from openai import OpenAI
+import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
 import os
+import queue
+import re
+import threading
 import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import fallback_templates
+import metrics
+import prompts
+from article_sanitizer import sanitize_article, StreamingSanitizer
+from hedging import hedger
+from openai_transport import build_http_client, build_async_http_client, call_with_retries, call_with_retries_async
+from rate_limiter import limiter as rate_limiter, estimate_tokens
+from result_cache import cache as result_cache, current_cache_mode, make_key
+from request_options import parse_flag
+from single_flight import single_flight
+from token_counter import count_message_tokens, count_tokens, token_cost, words_to_tokens
+from log_config import get_logger
+from usage_ledger import ledger as usage_ledger
 
 # Content generation functions only - no Flask blueprint needed
 
-# Configure OpenAI
+logger = get_logger('content')
+
+MODEL = "gpt-3.5-turbo"
+
+# Generate article title, meta title and meta description with one JSON-mode call
+# instead of three (callers can also opt in per request)
+COMBINED_METADATA = parse_flag(os.getenv('COMBINED_METADATA'))
+
+# Configure OpenAI. The SDK (openai, httpx, pydantic) is most of a cold start,
+# so it is imported and the clients are built on the first generation call.
 api_key = os.getenv('OPENAI_SECRET_KEY') or os.getenv('OPENAI_API_KEY')
 if not api_key:
-    print("⚠️  Warning: OpenAI API key not found in environment variables")
-    print("🔄 Using template-based content generation as fallback")
-    client = None
-else:
-    client = OpenAI(api_key=api_key)
+    logger.warning("OpenAI API key not found in environment variables, using template-based content generation as fallback")
 
-def generate_content_brief(keyword, product="Files.com"):
+_client = None
+_client_lock = threading.Lock()
+_sdk_error = None
+
+class SDKUnavailable(ImportError):
+    """The OpenAI SDK cannot be imported; generators fall back to templates"""
+
+def _openai_sdk():
+    """Import the openai module on first use; raises SDKUnavailable (logged once) if that fails"""
+    global _sdk_error
+    if _sdk_error is None:
+        try:
+            import openai
+            return openai
+        except ImportError as e:
+            _sdk_error = SDKUnavailable(f"Error importing the OpenAI SDK: {e}")
+            logger.error(str(_sdk_error))
+    raise _sdk_error
+
+def get_client():
+    """Return the blocking OpenAI client, building it on first use (None without an API key)"""
+    global _client
+    if _client is None and api_key:
+        with _client_lock:
+            if _client is None:
+                # Retries are handled by openai_transport, so the SDK's own are disabled
+                _client = _openai_sdk().OpenAI(api_key=api_key, http_client=build_http_client(), max_retries=0)
+    return _client
+
+# AsyncOpenAI clients hold an httpx pool bound to the event loop that created
+# it, so keep one per loop instead of a single module-level instance. Blocking
+# callers all share the loop of run_sync below, so in practice there is one
+# client per process (plus one for an ASGI server's own loop).
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client():
+    """Return the AsyncOpenAI client for the running event loop (None without an API key)"""
+    if not api_key:
+        return None
+    loop = asyncio.get_running_loop()
+    async_client = _async_clients.get(loop)
+    if async_client is None:
+        async_client = _openai_sdk().AsyncOpenAI(api_key=api_key, http_client=build_async_http_client(), max_retries=0)
+        _async_clients[loop] = async_client
+    return async_client
+
+async def close_async_client():
+    """Close and forget the running loop's AsyncOpenAI client, for loops that are about to exit"""
+    async_client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if async_client is not None:
+        await async_client.close()
+
+# Blocking callers (Flask and serverless handlers, worker threads, batch
+# requests) run their coroutines on one long-lived event loop in a daemon
+# thread rather than a new asyncio.run loop per call, which would build (and
+# leak) a client and connection pool per request and never reuse keep-alive.
+_loop = None
+_loop_thread = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+def _shared_loop():
+    global _loop, _loop_thread, _loop_pid
+    # A forked worker does not inherit the loop's thread, so it starts its own
+    if _loop is None or _loop_pid != os.getpid():
+        with _loop_lock:
+            if _loop is None or _loop_pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='content-event-loop', daemon=True)
+                thread.start()
+                _loop, _loop_thread, _loop_pid = loop, thread, os.getpid()
+    return _loop
+
+def run_sync(coroutine):
+    """Run a coroutine on the shared event loop and block until it finishes.
+
+    The caller's context variables (cache mode, budget, request deadline) are
+    carried over to the coroutine.
+    """
+    loop = _shared_loop()
+    if threading.current_thread() is _loop_thread:
+        coroutine.close()
+        raise RuntimeError('run_sync cannot be called from the shared event loop; await the coroutine instead')
+    future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+    try:
+        return future.result()
+    except BaseException:
+        # Stop the work if the caller gave up (e.g. KeyboardInterrupt)
+        future.cancel()
+        raise
+
+def _cache_key(function, keyword, product, content_length=None, extra=None):
+    # The prompt version keeps results of older prompts from being reused
+    return make_key(function, keyword, product, content_length, MODEL, prompts.version_id(function), extra)
+
+def _log_fields(function, keyword, product, **fields):
+    return {'fields': dict(function=function, keyword=keyword, product=product, **fields)}
+
+def _cache_hit(function, keyword, product):
+    metrics.CACHE_HITS.labels(function).inc()
+    logger.debug('Cache hit', extra=_log_fields(function, keyword, product))
+
+def _failed(function, keyword, product, error, **fields):
+    """Log and count a failed OpenAI call; returns the failure cause (the error type)"""
+    cause = type(error).__name__
+    metrics.GENERATION_ERRORS.labels(function, cause).inc()
+    logger.warning(f'OpenAI API error: {error}', extra=_log_fields(function, keyword, product, cause=cause, **fields))
+    return cause
+
+def _fallback(function, keyword, product, cause):
+    metrics.FALLBACKS.labels(function, cause).inc()
+    logger.info('Falling back to template', extra=_log_fields(function, keyword, product, cause=cause))
+
+def _article_done(function, keyword, product, content_length, attempts, article_content, short=False):
+    """Log and count an article produced by OpenAI"""
+    word_count = len(article_content.split())
+    metrics.ARTICLE_ATTEMPTS.labels(content_length).observe(attempts)
+    metrics.WORDS_GENERATED.labels(content_length).inc(word_count)
+    logger.info(
+        'Generated article below the minimum length' if short else 'Generated',
+        extra=_log_fields(function, keyword, product, content_length=content_length, attempts=attempts, words=word_count)
+    )
+
+def _instrumented(function):
+    """Record duration and in-flight count of a generator function (sync, async or generator) under `function`"""
+    def decorate(generate):
+        parameters = list(inspect.signature(generate).parameters.values())
+        names = [parameter.name for parameter in parameters]
+        index = names.index('content_length') if 'content_length' in names else None
+        default = parameters[index].default if index is not None else ''
+        in_flight = metrics.GENERATIONS_IN_FLIGHT.labels(function)
+        
+        def observe(args, kwargs, started):
+            content_length = kwargs.get('content_length', args[index] if index is not None and len(args) > index else default)
+            metrics.GENERATION_SECONDS.labels(function, content_length).observe(time.perf_counter() - started)
+            in_flight.dec()
+        
+        if inspect.iscoroutinefunction(generate):
+            @functools.wraps(generate)
+            async def wrapper(*args, **kwargs):
+                in_flight.inc()
+                started = time.perf_counter()
+                try:
+                    return await generate(*args, **kwargs)
+                finally:
+                    observe(args, kwargs, started)
+        elif inspect.isgeneratorfunction(generate):
+            # Generators are timed until they are exhausted or closed
+            @functools.wraps(generate)
+            def wrapper(*args, **kwargs):
+                in_flight.inc()
+                started = time.perf_counter()
+                try:
+                    return (yield from generate(*args, **kwargs))
+                finally:
+                    observe(args, kwargs, started)
+        else:
+            @functools.wraps(generate)
+            def wrapper(*args, **kwargs):
+                in_flight.inc()
+                started = time.perf_counter()
+                try:
+                    return generate(*args, **kwargs)
+                finally:
+                    observe(args, kwargs, started)
+        return wrapper
+    return decorate
+
+def _coalesced(function):
+    """Let concurrent identical calls of a generator share one call (see single_flight.py)"""
+    def decorate(generate):
+        signature = inspect.signature(generate)
+        
+        def key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            keyword, product = arguments.pop('keyword'), arguments.pop('product')
+            content_length = arguments.pop('content_length', None)
+            # A refresh or bypass must not join a call that may be served from the cache
+            return _cache_key(function, keyword, product, content_length, [current_cache_mode(), arguments])
+        
+        def own(result):
+            # Callers may add keys to a shared dict (e.g. content_brief), so each gets its own
+            return dict(result) if isinstance(result, dict) else result
+        
+        if inspect.iscoroutinefunction(generate):
+            @functools.wraps(generate)
+            async def wrapper(*args, **kwargs):
+                return own(await single_flight.do_async(key(args, kwargs), function, generate, *args, **kwargs))
+        else:
+            @functools.wraps(generate)
+            def wrapper(*args, **kwargs):
+                return own(single_flight.do(key(args, kwargs), function, generate, *args, **kwargs))
+        return wrapper
+    return decorate
+
+def _stream_usage(chunk):
+    """(prompt_tokens, completion_tokens) from a stream's final usage chunk, or None.
+
+    SDK releases that predate stream_options leave the usage as a plain dict.
+    """
+    usage = getattr(chunk, 'usage', None)
+    if isinstance(usage, dict):
+        prompt_tokens, completion_tokens = usage.get('prompt_tokens'), usage.get('completion_tokens')
+    else:
+        prompt_tokens, completion_tokens = getattr(usage, 'prompt_tokens', None), getattr(usage, 'completion_tokens', None)
+    return None if prompt_tokens is None else (prompt_tokens, completion_tokens or 0)
+
+def _stream_completion(label, product, content_length=None, **kwargs):
+    """Stream a chat completion with the blocking client, yielding its chunks.
+
+    Opening the stream waits for the shared rate limiter and is retried like
+    any call. The limiter slot is held until the stream is consumed or closed,
+    and the final chunk's usage reconciles the limiter's max_tokens estimate
+    and is recorded in the usage ledger under label (a stream that stops
+    early is recorded from locally counted tokens).
+    """
+    client = get_client()
+    estimated_tokens = estimate_tokens(kwargs['messages'], kwargs.get('max_tokens'))
+    
+    def open_stream(timeout):
+        # The slot stays taken once the stream is open; a failed open releases it
+        with contextlib.ExitStack() as stack:
+            call = stack.enter_context(rate_limiter.limit(estimated_tokens))
+            stream = client.chat.completions.create(
+                model=MODEL, timeout=timeout, stream=True,
+                # Passed through extra_body, which the pinned SDK accepts
+                extra_body={'stream_options': {'include_usage': True}}, **kwargs
+            )
+            return stack.pop_all(), call, stream
+    
+    started = time.monotonic()
+    slot, call, stream = call_with_retries(open_stream, kwargs.get('max_tokens'))
+    usage = None
+    parts = []
+    with slot:
+        try:
+            for chunk in stream:
+                usage = _stream_usage(chunk) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                yield chunk
+        except GeneratorExit:
+            # The consumer stopped reading (e.g. its client went away), which is
+            # no upstream failure, so the slot is released and reconciled as usual
+            pass
+        finally:
+            stream.close()
+            if usage is not None:
+                usage_ledger.record(label, product, content_length, MODEL, usage[0], usage[1], time.monotonic() - started)
+            else:
+                usage = count_message_tokens(kwargs['messages']), count_tokens(''.join(parts))
+                usage_ledger.record(label, product, content_length, MODEL, usage[0], usage[1], time.monotonic() - started, estimated=True)
+            call.actual_tokens = sum(usage)
+
+async def _create_completion_async(async_client, label, product, content_length=None, **kwargs):
+    """Send a chat completion request with the async client (same limits, retries and usage recording).
+
+    Slow calls of the short functions may be hedged with a duplicate request (see hedging.py).
+    """
+    estimated_tokens = estimate_tokens(kwargs['messages'], kwargs.get('max_tokens'))
+    
+    async def send(timeout):
+        async with rate_limiter.limit_async(estimated_tokens) as call:
+            started = time.monotonic()
+            response = await async_client.chat.completions.create(model=MODEL, timeout=timeout, **kwargs)
+            call.record(response)
+            usage_ledger.record_response(label, product, content_length, MODEL, response, kwargs['messages'], time.monotonic() - started)
+            return response
+    
+    return await hedger.run(label, lambda: call_with_retries_async(send, kwargs.get('max_tokens')))
+
+def _brief_messages(keyword, product):
+    return prompts.render('content_brief', product, keyword=keyword)
+
+def _title_messages(keyword, product):
+    return prompts.render('article_title', product, keyword=keyword)
+
+def _clean_title(title):
+    # Remove quotation marks from beginning and end
+    title = title.strip('"').strip("'").strip()
+    # Remove any numbering or list formatting
+    title = title.replace('1.', '').replace('2.', '').replace('3.', '').replace('-', '').strip()
+    return title
+
+def _meta_title_messages(keyword, product):
+    return prompts.render('meta_title', product, keyword=keyword)
+
+def _clean_meta_title(meta_title):
+    # Remove quotation marks from beginning and end
+    return meta_title.strip('"').strip("'").strip()
+
+def _meta_description_messages(keyword, product):
+    return prompts.render('meta_description', product, keyword=keyword)
+
+# Each generator is written once, as a coroutine on AsyncOpenAI so that
+# independent calls for one row can run concurrently; the blocking functions
+# beside them run that coroutine on the shared loop (run_sync).
+
+@_instrumented('content_brief')
+@_coalesced('content_brief')
+async def generate_content_brief_async(keyword, product="Files.com"):
     """Generate a content brief for the given keyword using OpenAI"""
-    print(f"🤖 OpenAI API: Generating content brief for keyword: '{keyword}' for product: '{product}'")
+    logger.debug('Generating', extra=_log_fields('content_brief', keyword, product))
     
-    if not client:
-        print(f"🔄 Using template for keyword: '{keyword}' for {product}")
-        return f"Content brief for '{keyword}' for {product}: Create a comprehensive guide covering fundamentals, best practices, and actionable tips. Target audience: {product} users and potential customers. Include examples and case studies relevant to {product}'s market. Use a mix of paragraph text and bulleted lists for better readability."
+    if not api_key:
+        _fallback('content_brief', keyword, product, 'no_api_key')
+        return fallback_templates.content_brief(keyword, product)
+    
+    cache_key = _cache_key('content_brief', keyword, product)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        _cache_hit('content_brief', keyword, product)
+        return cached
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are an expert content strategist for {product}. Create a detailed content brief for SEO articles that are specifically tailored for {product}'s audience and brand voice. Focus on providing clear direction for content creation that aligns with {product}'s expertise and market position. Include guidance for content structure with a mix of paragraphs and bulleted lists."
-                },
-                {
-                    "role": "user",
-                    "content": f"Create a comprehensive content brief for an article about '{keyword}' that will be published on {product}'s website. Include target audience, key topics to cover, tone, content structure (mix of paragraphs and bulleted lists), and specific sections to include. Keep it concise but detailed. Make sure the content aligns with {product}'s brand and expertise."
-                }
-            ],
+        response = await _create_completion_async(
+            get_async_client(),
+            'content_brief',
+            product,
+            messages=_brief_messages(keyword, product),
             max_tokens=300,
             temperature=0.7
         )
-        print(f"✅ OpenAI API: Successfully generated content brief for '{keyword}' for {product}")
-        return response.choices[0].message.content.strip()
+        logger.info('Generated', extra=_log_fields('content_brief', keyword, product))
+        result = response.choices[0].message.content.strip()
+        result_cache.set(cache_key, result)
+        return result
     except Exception as e:
-        print(f"❌ OpenAI API Error generating content brief: {e}")
-        print(f"🔄 Falling back to template for keyword: '{keyword}' for {product}")
-        return f"Content brief for '{keyword}' for {product}: Create a comprehensive guide covering fundamentals, best practices, and actionable tips. Target audience: {product} users and potential customers. Include examples and case studies relevant to {product}'s market. Use a mix of paragraph text and bulleted lists for better readability."
+        _fallback('content_brief', keyword, product, _failed('content_brief', keyword, product, e))
+        return fallback_templates.content_brief(keyword, product)
 
-def generate_article_title(keyword, product="Files.com"):
+def generate_content_brief(keyword, product="Files.com"):
+    """Blocking entry point for generate_content_brief_async"""
+    return run_sync(generate_content_brief_async(keyword, product))
+
+@_instrumented('article_title')
+@_coalesced('article_title')
+async def generate_article_title_async(keyword, product="Files.com"):
     """Generate an article title for the given keyword using OpenAI"""
-    print(f"🤖 OpenAI API: Generating article title for keyword: '{keyword}' for product: '{product}'")
+    logger.debug('Generating', extra=_log_fields('article_title', keyword, product))
+    
+    if not api_key:
+        _fallback('article_title', keyword, product, 'no_api_key')
+        return fallback_templates.article_title(keyword, product)
     
-    if not client:
-        print(f"🔄 Using template for keyword: '{keyword}' for {product}")
-        return f"The Complete Guide to {keyword}: Everything You Need to Know"
+    cache_key = _cache_key('article_title', keyword, product)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        _cache_hit('article_title', keyword, product)
+        return cached
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are an expert SEO copywriter for {product}. Create compelling, SEO-friendly article titles that are engaging, click-worthy, and aligned with {product}'s brand voice and expertise. Return only ONE title without quotation marks."
-                },
-                {
-                    "role": "user",
-                    "content": f"Create ONE compelling article title for '{keyword}' that will be published on {product}'s website. Make it SEO-friendly, engaging, and click-worthy. The title should reflect {product}'s expertise and appeal to their target audience. Return only the title without any quotation marks or numbering."
-                }
-            ],
+        response = await _create_completion_async(
+            get_async_client(),
+            'article_title',
+            product,
+            messages=_title_messages(keyword, product),
             max_tokens=100,
             temperature=0.8
         )
-        print(f"✅ OpenAI API: Successfully generated article title for '{keyword}' for {product}")
-        title = response.choices[0].message.content.strip()
-        # Remove quotation marks from beginning and end
-        title = title.strip('"').strip("'").strip()
-        # Remove any numbering or list formatting
-        title = title.replace('1.', '').replace('2.', '').replace('3.', '').replace('-', '').strip()
-        return title
+        logger.info('Generated', extra=_log_fields('article_title', keyword, product))
+        result = _clean_title(response.choices[0].message.content.strip())
+        result_cache.set(cache_key, result)
+        return result
     except Exception as e:
-        print(f"❌ OpenAI API Error generating article title: {e}")
-        print(f"🔄 Falling back to template for keyword: '{keyword}' for {product}")
-        return f"The Complete Guide to {keyword}: Everything You Need to Know"
+        _fallback('article_title', keyword, product, _failed('article_title', keyword, product, e))
+        return fallback_templates.article_title(keyword, product)
 
-def generate_meta_title(keyword, product="Files.com"):
+def generate_article_title(keyword, product="Files.com"):
+    """Blocking entry point for generate_article_title_async"""
+    return run_sync(generate_article_title_async(keyword, product))
+
+@_instrumented('meta_title')
+@_coalesced('meta_title')
+async def generate_meta_title_async(keyword, product="Files.com"):
     """Generate a meta title for SEO using OpenAI"""
-    print(f"🤖 OpenAI API: Generating meta title for keyword: '{keyword}' for product: '{product}'")
+    logger.debug('Generating', extra=_log_fields('meta_title', keyword, product))
+    
+    if not api_key:
+        _fallback('meta_title', keyword, product, 'no_api_key')
+        return fallback_templates.meta_title(keyword, product)
     
-    if not client:
-        print(f"🔄 Using template for keyword: '{keyword}' for {product}")
-        return f"{keyword} - Complete Guide, Tips & Best Practices"
+    cache_key = _cache_key('meta_title', keyword, product)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        _cache_hit('meta_title', keyword, product)
+        return cached
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are an SEO expert for {product}. Create compelling meta titles that are under 60 characters, include the target keyword, and are optimized for {product}'s brand and audience. Return titles without quotation marks."
-                },
-                {
-                    "role": "user",
-                    "content": f"Create a compelling meta title for '{keyword}' that will be used on {product}'s website. It should be under 60 characters, include the keyword, and be click-worthy. Make it relevant to {product}'s expertise and audience. Return without quotation marks."
-                }
-            ],
+        response = await _create_completion_async(
+            get_async_client(),
+            'meta_title',
+            product,
+            messages=_meta_title_messages(keyword, product),
             max_tokens=80,
             temperature=0.7
         )
-        print(f"✅ OpenAI API: Successfully generated meta title for '{keyword}' for {product}")
-        meta_title = response.choices[0].message.content.strip()
-        # Remove quotation marks from beginning and end
-        meta_title = meta_title.strip('"').strip("'").strip()
-        return meta_title
+        logger.info('Generated', extra=_log_fields('meta_title', keyword, product))
+        result = _clean_meta_title(response.choices[0].message.content.strip())
+        result_cache.set(cache_key, result)
+        return result
     except Exception as e:
-        print(f"❌ OpenAI API Error generating meta title: {e}")
-        print(f"🔄 Falling back to template for keyword: '{keyword}' for {product}")
-        return f"{keyword} - Complete Guide, Tips & Best Practices"
+        _fallback('meta_title', keyword, product, _failed('meta_title', keyword, product, e))
+        return fallback_templates.meta_title(keyword, product)
 
-def generate_meta_description(keyword, product="Files.com"):
+def generate_meta_title(keyword, product="Files.com"):
+    """Blocking entry point for generate_meta_title_async"""
+    return run_sync(generate_meta_title_async(keyword, product))
+
+@_instrumented('meta_description')
+@_coalesced('meta_description')
+async def generate_meta_description_async(keyword, product="Files.com"):
     """Generate a meta description for SEO using OpenAI"""
-    print(f"🤖 OpenAI API: Generating meta description for keyword: '{keyword}' for product: '{product}'")
+    logger.debug('Generating', extra=_log_fields('meta_description', keyword, product))
+    
+    if not api_key:
+        _fallback('meta_description', keyword, product, 'no_api_key')
+        return fallback_templates.meta_description(keyword, product)
     
-    if not client:
-        print(f"🔄 Using template for keyword: '{keyword}' for {product}")
-        return f"Learn everything about {keyword} with our comprehensive guide. Discover best practices, expert tips, and proven strategies."
+    cache_key = _cache_key('meta_description', keyword, product)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        _cache_hit('meta_description', keyword, product)
+        return cached
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": f"You are an SEO expert for {product}. Create compelling meta descriptions that are under 160 characters, include the target keyword, and are optimized for {product}'s brand and audience."
-                },
-                {
-                    "role": "user",
-                    "content": f"Create a compelling meta description for '{keyword}' that will be used on {product}'s website. It should be under 160 characters, include the keyword, and be engaging and click-worthy. Make it relevant to {product}'s expertise and audience."
-                }
-            ],
+        response = await _create_completion_async(
+            get_async_client(),
+            'meta_description',
+            product,
+            messages=_meta_description_messages(keyword, product),
             max_tokens=120,
             temperature=0.7
         )
-        print(f"✅ OpenAI API: Successfully generated meta description for '{keyword}' for {product}")
-        return response.choices[0].message.content.strip()
+        logger.info('Generated', extra=_log_fields('meta_description', keyword, product))
+        result = response.choices[0].message.content.strip()
+        result_cache.set(cache_key, result)
+        return result
+    except Exception as e:
+        _fallback('meta_description', keyword, product, _failed('meta_description', keyword, product, e))
+        return fallback_templates.meta_description(keyword, product)
+
+def generate_meta_description(keyword, product="Files.com"):
+    """Blocking entry point for generate_meta_description_async"""
+    return run_sync(generate_meta_description_async(keyword, product))
+
+METADATA_FIELDS = ('article_title', 'meta_title', 'meta_description')
+
+_METADATA_FIELD_RULES = {
+    'article_title': "ONE compelling, SEO-friendly, click-worthy article title",
+    'meta_title': "a meta title under 60 characters that includes the keyword",
+    'meta_description': "a meta description under 160 characters that includes the keyword and is engaging and click-worthy"
+}
+
+def _metadata_messages(keyword, product, fields):
+    rules = '; '.join(f"{field}: {_METADATA_FIELD_RULES[field]}" for field in fields)
+    return prompts.render('metadata', product, static={'fields': ', '.join(fields), 'rules': rules}, keyword=keyword)
+
+def _parse_metadata(content, fields):
+    """Validate a metadata JSON response; returns only the fields that are non-empty strings"""
+    data = json.loads(content)
+    if not isinstance(data, dict):
+        raise ValueError('metadata response is not a JSON object')
+    cleaners = {'article_title': _clean_title, 'meta_title': _clean_meta_title, 'meta_description': str.strip}
+    metadata = {}
+    for field in fields:
+        value = data.get(field)
+        if isinstance(value, str) and value.strip():
+            metadata[field] = cleaners[field](value.strip())
+    return metadata
+
+@_instrumented('metadata')
+@_coalesced('metadata')
+async def generate_metadata_async(keyword, product="Files.com", fields=METADATA_FIELDS):
+    """Generate article title, meta title and meta description with a single JSON-mode call.
+
+    Fields missing from (or invalid in) the response are generated with the
+    per-field functions instead.
+    """
+    logger.debug('Generating', extra=_log_fields('metadata', keyword, product))
+    
+    per_field = {'article_title': generate_article_title_async, 'meta_title': generate_meta_title_async, 'meta_description': generate_meta_description_async}
+    
+    if not api_key:
+        values = await asyncio.gather(*(per_field[field](keyword, product) for field in fields))
+        return dict(zip(fields, values))
+    
+    cache_key = _cache_key('metadata', keyword, product, extra=list(fields))
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        _cache_hit('metadata', keyword, product)
+        return cached
+    
+    metadata = {}
+    try:
+        response = await _create_completion_async(
+            get_async_client(),
+            'metadata',
+            product,
+            messages=_metadata_messages(keyword, product, fields),
+            max_tokens=100 * len(fields),
+            temperature=0.7,
+            response_format={"type": "json_object"}
+        )
+        metadata = _parse_metadata(response.choices[0].message.content, fields)
+        logger.info('Generated', extra=_log_fields('metadata', keyword, product))
     except Exception as e:
-        print(f"❌ OpenAI API Error generating meta description: {e}")
-        print(f"🔄 Falling back to template for keyword: '{keyword}' for {product}")
-        return f"Learn everything about {keyword} with our comprehensive guide. Discover best practices, expert tips, and proven strategies."
+        _failed('metadata', keyword, product, e)
+    
+    missing = [field for field in fields if field not in metadata]
+    if missing:
+        logger.info('Falling back to per-field generation', extra=_log_fields('metadata', keyword, product, fields=','.join(missing)))
+        values = await asyncio.gather(*(per_field[field](keyword, product) for field in missing))
+        metadata.update(zip(missing, values))
+    else:
+        result_cache.set(cache_key, metadata)
+    return metadata
+
+def generate_metadata(keyword, product="Files.com", fields=METADATA_FIELDS):
+    """Blocking entry point for generate_metadata_async"""
+    return run_sync(generate_metadata_async(keyword, product, fields))
+
+# Upper word target (sizes max_tokens) and typical article length (used by
+# preview_content) per content length; the prompt wording is in prompts.LENGTH_WORDING
+LENGTH_WORDS = {
+    'short': (800, 650),
+    'medium': (1200, 1000),
+    'long': (2000, 1600),
+    'comprehensive': (2700, 2300)
+}
 
 def get_content_length_instructions(content_length):
-    """Get specific instructions based on content length"""
-    length_instructions = {
-        'short': {
-            'word_count': 'EXACTLY 500-800 words',
-            'sections': 'EXACTLY 3-4 main sections',
-            'detail_level': 'concise and focused',
-            'max_tokens': 1000,
-            'style': 'Keep paragraphs short (2-3 sentences each). Be direct and to the point. Focus on essential information only.',
-            'structure': 'Introduction, 2-3 main sections, Conclusion'
-        },
-        'medium': {
-            'word_count': 'EXACTLY 800-1200 words', 
-            'sections': 'EXACTLY 4-5 main sections',
-            'detail_level': 'balanced with good detail',
-            'max_tokens': 1500,
-            'style': 'Use medium-length paragraphs (3-4 sentences each). Provide good detail with examples.',
-            'structure': 'Introduction, 3-4 main sections, Conclusion'
-        },
-        'long': {
-            'word_count': 'EXACTLY 1200-2000 words',
-            'sections': 'EXACTLY 5-6 main sections', 
-            'detail_level': 'comprehensive and detailed',
-            'max_tokens': 2500,
-            'style': 'Use longer paragraphs (4-5 sentences each). Include detailed explanations, examples, and case studies.',
-            'structure': 'Introduction, 4-5 main sections, Conclusion'
-        },
-        'comprehensive': {
-            'word_count': 'EXACTLY 2000+ words',
-            'sections': 'EXACTLY 6+ main sections',
-            'detail_level': 'extremely comprehensive with extensive detail',
-            'max_tokens': 3500,
-            'style': 'Use comprehensive paragraphs (5+ sentences each). Include extensive examples, case studies, and detailed analysis.',
-            'structure': 'Introduction, 5+ main sections, Conclusion'
-        }
+    """Get specific instructions based on content length.
+
+    max_tokens is sized from the upper word target; expected_words is the
+    typical article length, used by preview_content.
+    """
+    if content_length not in LENGTH_WORDS:
+        content_length = 'medium'
+    max_words, expected_words = LENGTH_WORDS[content_length]
+    return dict(prompts.LENGTH_WORDING[content_length], max_tokens=words_to_tokens(max_words), expected_words=expected_words)
+
+# How to handle a draft that comes back under MIN_WORDS: 'top_up' keeps the draft
+# and asks only for continuations of its thinnest sections, 'regenerate' throws
+# it away and asks for a whole new article with a larger token budget.
+ARTICLE_LENGTH_MODE = os.getenv('ARTICLE_LENGTH_MODE', 'top_up')
+
+# Minimum acceptable word counts per content length (more realistic targets)
+MIN_WORDS = {
+    'short': 400,      # More realistic for short articles
+    'medium': 600,     # More realistic for medium articles  
+    'long': 900,       # More realistic for long articles
+    'comprehensive': 1200  # More realistic for comprehensive articles
+}
+
+def _variants_instruction(variants):
+    """Prompt line asking the article to also cover a keyword's near-duplicate variants"""
+    if not variants:
+        return ""
+    return f"\nAlso naturally cover these closely related search terms, without treating them as separate topics: {', '.join(variants)}"
+
+def _article_request(keyword, title, product, content_length, attempt, variants=None):
+    """Build the prompts and sampling settings for one article attempt"""
+    length_config = get_content_length_instructions(content_length)
+    # Adjust temperature and max_tokens based on attempt
+    temperature = 0.7 if attempt == 0 else 0.8
+    # Cap max_tokens at 4000 to avoid API errors
+    max_tokens = min(length_config['max_tokens'], 4000) if attempt == 0 else min(int(length_config['max_tokens'] * 1.2), 4000)
+    
+    # Retries get more aggressive prompts
+    return {
+        'messages': prompts.render(
+            'full_article', product, content_length, 'draft' if attempt == 0 else 'regenerate',
+            keyword=keyword, title=title, variants=_variants_instruction(variants)
+        ),
+        'max_tokens': max_tokens,
+        'temperature': temperature
     }
-    return length_instructions.get(content_length, length_instructions['medium'])
 
-def generate_full_article(keyword, title, product="Files.com", content_length="medium"):
-    """Generate a full article based on keyword and title using OpenAI"""
-    print(f"🤖 OpenAI API: Generating full article for keyword: '{keyword}' with title: '{title}' for product: '{product}' with length: '{content_length}'")
+_SECTION_HEADING = re.compile(r'^##(?!#)\s*(.+?)\s*$', re.MULTILINE)
+
+def _split_sections(article_content):
+    """Split an article into [(heading or None, text)] at its H2 headings; H3s stay in their section"""
+    sections = []
+    matches = list(_SECTION_HEADING.finditer(article_content))
+    if not matches or matches[0].start() > 0:
+        sections.append((None, article_content[:matches[0].start() if matches else len(article_content)]))
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(article_content)
+        sections.append((match.group(1), article_content[match.start():end]))
+    return sections
+
+def _normalize_heading(heading):
+    return ' '.join(re.sub(r'[^\w\s]', '', heading).lower().split())
+
+def _top_up_request(keyword, title, product, content_length, article_content, min_words):
+    """Build a request asking only for continuations of the thinnest sections of a short draft.
+
+    Returns (request, headings), where headings are the sections asked for.
+    """
+    sections = [(heading, text) for heading, text in _split_sections(article_content) if heading]
+    deficit = min_words - len(article_content.split())
     
-    length_config = get_content_length_instructions(content_length)
+    if sections:
+        # Thinnest sections first; enough of them to spread the missing words sensibly
+        target = min_words / len(sections)
+        by_size = sorted(sections, key=lambda section: len(section[1].split()))
+        thin = [section for section in by_size if len(section[1].split()) < target][:4] or by_size[:1]
+        # Keep the article's own order in the prompt
+        thin = [section for section in sections if section in thin]
+    else:
+        thin = [(None, article_content)]
     
-    if not client:
-        print(f"🔄 Using template for keyword: '{keyword}' for {product}")
-        return f"""# {title}
-
-## Introduction
-
-{keyword} is a crucial topic that many people want to understand better, especially in the context of {product}'s expertise. In this comprehensive guide, we'll explore everything you need to know about {keyword}, from the basics to advanced strategies that can help you achieve your goals.
-
-## What is {keyword}?
-
-{keyword} refers to the practice and techniques involved in optimizing and implementing effective strategies. It encompasses various methodologies and approaches that help improve results, increase efficiency, and drive meaningful outcomes for individuals and organizations.
-
-## Key Benefits
-
-1. **Improved Performance**: Better results and enhanced effectiveness
-2. **Increased Efficiency**: Streamlined processes and optimized workflows  
-3. **Better User Experience**: Solutions that serve real needs and deliver value
-4. **Higher Success Rates**: More qualified outcomes and measurable improvements
-5. **Competitive Advantage**: Stay ahead of trends and industry developments
-
-## Best Practices for {keyword}
-
-### 1. Research and Planning
-Before diving into {keyword}, it's essential to conduct thorough research. This includes understanding your target audience, analyzing current market conditions, identifying opportunities, and setting clear, measurable objectives.
-
-### 2. Strategy Development
-Create a comprehensive strategy that addresses your specific needs and goals. Focus on developing actionable plans that can be implemented systematically and measured for effectiveness.
-
-### 3. Implementation Techniques
-Apply proven methodologies and techniques that have been tested in real-world scenarios. Consider factors such as scalability, sustainability, and long-term impact when choosing your approach.
-
-### 4. Monitoring and Optimization
-Continuously monitor your progress and make data-driven adjustments to improve results. Regular evaluation helps identify what's working well and what needs improvement.
-
-## Common Mistakes to Avoid
-
-- **Lack of Clear Strategy**: Jumping into implementation without proper planning
-- **Ignoring Data and Analytics**: Making decisions without supporting evidence
-- **Poor Resource Allocation**: Not dedicating sufficient time or resources
-- **Resistance to Change**: Failing to adapt when circumstances change
-- **Overlooking User Feedback**: Not incorporating valuable insights from stakeholders
-
-## Advanced Strategies
-
-### Leveraging Technology
-Modern {keyword} implementations benefit greatly from leveraging appropriate technology solutions. Consider automation tools, analytics platforms, and integration capabilities that can enhance your efforts.
-
-### Building Partnerships
-Collaborate with industry experts, complementary service providers, and strategic partners to expand your capabilities and reach. Strong partnerships can accelerate success and provide valuable insights.
-
-### Continuous Learning
-Stay updated with the latest trends, best practices, and emerging technologies in the {keyword} space. Attend conferences, participate in professional communities, and invest in ongoing education.
-
-## Measuring Success
-
-### Key Performance Indicators (KPIs)
-- Efficiency metrics and performance benchmarks
-- User satisfaction and engagement rates
-- Return on investment (ROI) calculations
-- Quality indicators and success metrics
-- Long-term sustainability measures
-
-### Tools and Analytics
-Utilize appropriate measurement tools to track progress and identify areas for improvement. Regular reporting and analysis help maintain focus on objectives and demonstrate value.
-
-## Future Trends and Considerations
-
-The landscape of {keyword} continues to evolve rapidly. Stay informed about emerging trends, technological advances, and changing best practices. Consider how these developments might impact your strategy and be prepared to adapt accordingly.
-
-## Conclusion
-
-Mastering {keyword} requires dedication, continuous learning, and adaptation to changing conditions. By following the strategies and best practices outlined in this guide, you'll be well-equipped to achieve success in your {keyword} endeavors.
-
-Remember to always prioritize value creation, maintain ethical practices, and focus on sustainable, long-term results. Success in {keyword} comes from consistent effort, strategic thinking, and a commitment to excellence.
-
-## Additional Resources
-
-- Industry publications and research reports
-- Professional associations and communities
-- Training programs and certification courses
-- Expert consultations and advisory services
-- Technology platforms and implementation tools
+    extra_words = max(80, -(-int(deficit * 1.2) // len(thin)))
+    section_texts = '\n\n'.join(text.strip() for _, text in thin)
+    
+    return {
+        'messages': prompts.render(
+            'full_article', product, content_length, 'continue' if thin[0][0] is None else 'top_up',
+            keyword=keyword, title=title, extra_words=extra_words, text=section_texts
+        ),
+        # Only the missing words are generated (~1.4 tokens per word plus headings)
+        'max_tokens': min(int(extra_words * len(thin) * 1.4) + 50 * len(thin), 4000),
+        'temperature': 0.7
+    }, [heading for heading, _ in thin]
+
+def _merge_top_up(article_content, continuation, headings):
+    """Append each continuation to the end of its section in the draft"""
+    continuation = continuation.strip()
+    if headings == [None]:
+        return article_content.rstrip() + '\n\n' + continuation
+    
+    additions = {}
+    for heading, text in _split_sections(continuation):
+        body = text if heading is None else text.split('\n', 1)[1] if '\n' in text else ''
+        if body.strip():
+            # Text before any heading can only belong to a single requested section
+            key = _normalize_heading(heading) if heading else (_normalize_heading(headings[0]) if len(headings) == 1 else None)
+            if key:
+                additions[key] = additions.get(key, '') + '\n\n' + body.strip()
+    
+    merged = []
+    for heading, text in _split_sections(article_content):
+        addition = additions.pop(_normalize_heading(heading), None) if heading else None
+        merged.append(text.rstrip() + addition + '\n\n' if addition else text)
+    return ''.join(merged).rstrip()
+
+def _report_attempt(keyword, attempt, mode, response, word_count):
+    """Log token usage for one article attempt so top-up savings are visible"""
+    usage = getattr(response, 'usage', None)
+    fields = {'keyword': keyword, 'attempt': attempt + 1, 'mode': mode, 'words': word_count}
+    if usage:
+        fields.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    logger.debug('Article attempt', extra={'fields': fields})
+
+def _article_attempt_request(keyword, title, product, content_length, attempt, draft, min_words, variants=None):
+    """Pick the request for this attempt: a fresh draft, a top-up of the draft, or a regeneration"""
+    if draft is not None and ARTICLE_LENGTH_MODE == 'top_up':
+        request, headings = _top_up_request(keyword, title, product, content_length, draft, min_words)
+        return 'top_up', request, headings
+    return ('draft' if attempt == 0 else 'regenerate'), _article_request(keyword, title, product, content_length, attempt, variants), None
+
+def _apply_attempt(mode, draft, text, headings):
+    article_content = sanitize_article(text)
+    if mode == 'top_up':
+        return _merge_top_up(draft, article_content, headings)
+    return article_content
+
+# Sectioned mode for the long lengths: one JSON-mode call plans the main
+# sections from length_config['structure'], then the introduction, every
+# section and the conclusion are written in parallel, each with its own token
+# budget, and assembled under consistent headings. An article then takes about
+# as long as the outline plus the slowest section, and no single completion
+# has to produce thousands of words under the 4000 max_tokens cap.
+SECTIONED_LENGTHS = {length.strip() for length in os.getenv('SECTIONED_ARTICLE_LENGTHS', 'long,comprehensive').split(',') if length.strip()}
+
+# Target words for the introduction and for the conclusion; main sections share the rest
+FRAME_SECTION_WORDS = 150
+
+_MAIN_SECTIONS = re.compile(r'(\d+)(?:-(\d+)|(\+))?\s+main sections')
+
+def _outline_size(structure):
+    """(fewest, most) main sections a structure asks for, e.g. '4-5 main sections' -> (4, 5), '5+' -> (5, 6)"""
+    match = _MAIN_SECTIONS.search(structure)
+    if not match:
+        return 3, 4
+    low = int(match.group(1))
+    return low, int(match.group(2)) if match.group(2) else low + 1 if match.group(3) else low
+
+def _outline_request(keyword, title, product, content_length, variants=None):
+    _, high = _outline_size(get_content_length_instructions(content_length)['structure'])
+    return {
+        'messages': prompts.render(
+            'full_article', product, content_length, 'outline', static={'count': high},
+            keyword=keyword, title=title, variants=_variants_instruction(variants)
+        ),
+        'max_tokens': 60 * high + 50,
+        'temperature': 0.7,
+        'response_format': {"type": "json_object"}
+    }
 
-Start implementing these strategies today and begin your journey toward {keyword} mastery. With the right approach and consistent effort, you can achieve remarkable results and establish yourself as a leader in this important field."""
+def _clean_heading(heading):
+    # Drop markdown hashes, numbering and quotation marks the model may add
+    return re.sub(r'^[#\s]*(\d+[.)]\s*)?', '', heading).strip().strip('"').strip("'").strip()
+
+def _parse_outline(content, low, high):
+    """Validate an outline JSON response; returns [(heading, points)] for at most `high` distinct sections"""
+    data = json.loads(content)
+    sections = data.get('sections') if isinstance(data, dict) else None
+    if not isinstance(sections, list):
+        raise ValueError('outline response has no sections list')
+    outline = []
+    seen = {'introduction', 'conclusion'}
+    for section in sections:
+        if not isinstance(section, dict) or not isinstance(section.get('heading'), str):
+            continue
+        heading = _clean_heading(section['heading'])
+        key = _normalize_heading(heading)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        points = section.get('points') if isinstance(section.get('points'), list) else []
+        outline.append((heading, [point.strip() for point in points if isinstance(point, str) and point.strip()]))
+    if len(outline) < low:
+        raise ValueError(f'outline has {len(outline)} usable sections, expected at least {low}')
+    return outline[:high]
+
+def _section_requests(keyword, title, product, content_length, outline):
+    """[(heading, target words, request)] for the introduction, each planned section and the conclusion"""
+    length_config = get_content_length_instructions(content_length)
+    # Fewer sections than planned get longer ones, so the article still reaches its length
+    section_words = max(FRAME_SECTION_WORDS, (length_config['expected_words'] - 2 * FRAME_SECTION_WORDS) // len(outline))
+    plan = '\n'.join(f"- {heading}" for heading in ['Introduction'] + [heading for heading, _ in outline] + ['Conclusion'])
+    parts = [('introduction', 'Introduction', [], FRAME_SECTION_WORDS)]
+    parts += [('section', heading, points, section_words) for heading, points in outline]
+    parts.append(('conclusion', 'Conclusion', [], FRAME_SECTION_WORDS))
+    
+    requests = []
+    for template, heading, points, words in parts:
+        requests.append((heading, words, {
+            'messages': prompts.render(
+                'full_article', product, content_length, template,
+                keyword=keyword, title=title, plan=plan, heading=heading,
+                covering=f"\nCovering: {'; '.join(points)}" if points else '', words=words
+            ),
+            # Headroom over the target so a section is not cut off mid-sentence
+            'max_tokens': min(int(words_to_tokens(words) * 1.3) + 50, 4000),
+            'temperature': 0.7
+        }))
+    return requests
+
+_LEADING_HEADINGS = re.compile(r'\A(?:\s*#{1,2}(?!#)[^\n]*(?:\n|\Z))+')
+_TOP_HEADINGS = re.compile(r'^#{1,2}(?!#)\s*', re.MULTILINE)
+
+def _section_body(text):
+    """A part's text without the heading lines it starts with, and with any other # / ## demoted to ###"""
+    body = _LEADING_HEADINGS.sub('', sanitize_article(text.strip()))
+    return _TOP_HEADINGS.sub('### ', body).strip()
+
+def _assemble_article(title, parts):
+    """Join [(heading, text)] into one article under the title, with a ## heading per part"""
+    blocks = [f'# {title}']
+    for heading, text in parts:
+        body = _section_body(text)
+        if body:
+            blocks.append(f'## {heading}\n\n{body}')
+    return '\n\n'.join(blocks)
+
+def _report_sections(keyword, product, content_length, outline, article_content, started):
+    logger.debug('Sectioned article', extra=_log_fields(
+        'full_article', keyword, product, content_length=content_length,
+        sections=len(outline), words=len(article_content.split()), seconds=round(time.monotonic() - started, 2)
+    ))
+
+async def _sectioned_article_async(keyword, title, product, content_length, variants=None):
+    """Write an article as an outline plus parallel sections; returns None (after logging) if a call fails"""
+    started = time.monotonic()
+    try:
+        response = await _create_completion_async(get_async_client(), 'article_outline', product, content_length, **_outline_request(keyword, title, product, content_length, variants))
+        outline = _parse_outline(response.choices[0].message.content, *_outline_size(get_content_length_instructions(content_length)['structure']))
+        parts = _section_requests(keyword, title, product, content_length, outline)
+        responses = await asyncio.gather(*(
+            _create_completion_async(get_async_client(), 'article_section', product, content_length, **request)
+            for _, _, request in parts
+        ), return_exceptions=True)
+        for response in responses:
+            if isinstance(response, BaseException):
+                raise response
+    except Exception as e:
+        _failed('full_article', keyword, product, e, mode='sectioned')
+        return None
+    article_content = _assemble_article(title, [(heading, response.choices[0].message.content) for (heading, _, _), response in zip(parts, responses)])
+    _report_sections(keyword, product, content_length, outline, article_content, started)
+    return article_content
+
+@_instrumented('full_article')
+@_coalesced('full_article')
+async def generate_full_article_async(keyword, title, product="Files.com", content_length="medium", variants=None):
+    """Generate a full article based on keyword and title using OpenAI"""
+    logger.debug('Generating', extra=_log_fields('full_article', keyword, product, content_length=content_length))
     
-    # Try multiple times to get the right length
+    if not api_key:
+        _fallback('full_article', keyword, product, 'no_api_key')
+        return fallback_templates.full_article(keyword, title, product, content_length)
+    
+    cache_key = _cache_key('full_article', keyword, product, content_length, extra=[title, list(variants)] if variants else title)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        _cache_hit('full_article', keyword, product)
+        return cached
+    
+    # Try multiple times to get the right length, topping up short drafts
+    # (errors are retried by the transport, not by this loop)
+    min_words = MIN_WORDS.get(content_length, 800)
     max_attempts = 3
-    for attempt in range(max_attempts):
+    # Long lengths start from an outline and parallel sections; a short result
+    # is topped up below like any other draft
+    draft = await _sectioned_article_async(keyword, title, product, content_length, variants) if content_length in SECTIONED_LENGTHS else None
+    if draft is not None and len(draft.split()) >= min_words:
+        _article_done('full_article', keyword, product, content_length, 1, draft)
+        result_cache.set(cache_key, draft)
+        return draft
+    for attempt in range(0 if draft is None else 1, max_attempts):
         try:
-            # Adjust temperature and max_tokens based on attempt
-            temperature = 0.7 if attempt == 0 else 0.8
-            # Cap max_tokens at 4000 to avoid API errors
-            max_tokens = min(length_config['max_tokens'], 4000) if attempt == 0 else min(int(length_config['max_tokens'] * 1.2), 4000)
-            
-            # Create more aggressive prompts for retries
-            if attempt > 0:
-                system_prompt = f"You are an expert content writer specializing in SEO articles for {product}. Write {length_config['detail_level']}, well-structured articles in markdown format that are specifically tailored for {product}'s audience, brand voice, and expertise. {length_config['style']} Use a balanced mix of paragraph text and bulleted lists to improve readability and engagement. Include headings, subheadings, bullet points, and engaging content that provides real value to {product}'s readers and potential customers. EXPAND EVERY SECTION WITH MORE DETAIL!"
-                user_prompt = f"Write a {length_config['detail_level']} article about '{keyword}' with the title '{title}' for {product}'s website. The article should have {length_config['sections']}. Follow this structure: {length_config['structure']}. Write the article in markdown format with proper headings (H1, H2, H3). {length_config['style']} Include practical tips, examples, and actionable advice that are relevant to {product}'s audience and expertise. The content should reflect {product}'s brand voice and market position. Use bullet points for lists of features, benefits, steps, or tips, and use paragraphs for explanations and context. ADD MORE DETAIL TO EVERY SECTION! INCLUDE MORE EXAMPLES, CASE STUDIES, AND DETAILED EXPLANATIONS!"
-            else:
-                system_prompt = f"You are an expert content writer specializing in SEO articles for {product}. Write {length_config['detail_level']}, well-structured articles in markdown format that are specifically tailored for {product}'s audience, brand voice, and expertise. {length_config['style']} Use a balanced mix of paragraph text and bulleted lists to improve readability and engagement. Include headings, subheadings, bullet points, and engaging content that provides real value to {product}'s readers and potential customers."
-                user_prompt = f"Write a {length_config['detail_level']} article about '{keyword}' with the title '{title}' for {product}'s website. The article should have {length_config['sections']}. Follow this structure: {length_config['structure']}. Write the article in markdown format with proper headings (H1, H2, H3). {length_config['style']} Include practical tips, examples, and actionable advice that are relevant to {product}'s audience and expertise. The content should reflect {product}'s brand voice and market position. Use bullet points for lists of features, benefits, steps, or tips, and use paragraphs for explanations and context. INCLUDE DETAILED EXAMPLES, CASE STUDIES, AND COMPREHENSIVE EXPLANATIONS FOR EACH SECTION."
-            
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": user_prompt
-                    }
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            
-            article_content = response.choices[0].message.content.strip()
-            
-            # Clean up any debugging info that might have been included in the content
-            article_content = article_content.replace("📊 Generated article word count:", "")
-            article_content = article_content.replace("words (target:", "")
-            article_content = article_content.replace("EXACTLY", "")
-            article_content = article_content.replace("words)", "")
-            article_content = article_content.replace("(target:", "")
-            article_content = article_content.replace(")", "")
-            
-            # Remove word count references from headlines and content
-            import re
-            # Remove word count patterns from headings only (e.g., "## Section Title (500 words)")
-            article_content = re.sub(r'\([0-9]+\s*words?\)', '', article_content)
-            # Remove specific word count debugging text that might appear
-            article_content = re.sub(r'This section contains [0-9]+ words?', '', article_content)
-            article_content = re.sub(r'Target: [0-9]+ words?', '', article_content)
-            # Clean up any empty parentheses left behind
-            article_content = re.sub(r'\s*\(\s*\)', '', article_content)
+            mode, request, headings = _article_attempt_request(keyword, title, product, content_length, attempt, draft, min_words, variants)
+            response = await _create_completion_async(get_async_client(), 'full_article', product, content_length, **request)
             
+            article_content = _apply_attempt(mode, draft, response.choices[0].message.content.strip(), headings)
             word_count = len(article_content.split())
+            draft = article_content
+            _report_attempt(keyword, attempt, mode, response, word_count)
             
-            # Check if we meet the minimum word count requirements (more realistic targets)
-            min_words = {
-                'short': 400,      # More realistic for short articles
-                'medium': 600,     # More realistic for medium articles  
-                'long': 900,       # More realistic for long articles
-                'comprehensive': 1200  # More realistic for comprehensive articles
-            }
-            
-            if word_count >= min_words.get(content_length, 800):
-                print(f"✅ OpenAI API: Successfully generated full article for '{keyword}' for {product} (attempt {attempt + 1})")
-                print(f"📊 Generated article word count: {word_count} words (target: {length_config['word_count']})")
+            # Check if we meet the minimum word count requirements
+            if word_count >= min_words:
+                _article_done('full_article', keyword, product, content_length, attempt + 1, article_content)
+                result_cache.set(cache_key, article_content)
                 return article_content
             else:
-                print(f"⚠️ Attempt {attempt + 1}: Generated {word_count} words (target: {length_config['word_count']}) - Too short, retrying...")
+                logger.info('Article too short', extra=_log_fields('full_article', keyword, product, attempt=attempt + 1, words=word_count, min_words=min_words))
                 if attempt == max_attempts - 1:
-                    print(f"⚠️ Final attempt: Using generated content despite being short")
+                    _article_done('full_article', keyword, product, content_length, attempt + 1, article_content, short=True)
+                    result_cache.set(cache_key, article_content)
                     return article_content
                     
         except Exception as e:
-            print(f"❌ OpenAI API Error generating full article (attempt {attempt + 1}): {e}")
-            if attempt == max_attempts - 1:
-                print(f"🔄 Falling back to template for keyword: '{keyword}' for {product}")
-                # Fallback to template if all attempts fail
-                return f"""# {title}
-
-## Introduction
-
-{keyword} is a crucial topic that many people want to understand better, especially in the context of {product}'s expertise. In this comprehensive guide, we'll explore everything you need to know about {keyword}, from the basics to advanced strategies that can help you achieve your goals.
-
-## What is {keyword}?
-
-{keyword} refers to the practice and techniques involved in optimizing and implementing effective strategies. It encompasses various methodologies and approaches that help improve results, increase efficiency, and drive meaningful outcomes for individuals and organizations.
-
-## Key Benefits
-
-1. **Improved Performance**: Better results and enhanced effectiveness
-2. **Increased Efficiency**: Streamlined processes and optimized workflows  
-3. **Better User Experience**: Solutions that serve real needs and deliver value
-4. **Higher Success Rates**: More qualified outcomes and measurable improvements
-5. **Competitive Advantage**: Stay ahead of trends and industry developments
-
-## Best Practices for {keyword}
-
-### 1. Research and Planning
-Before diving into {keyword}, it's essential to conduct thorough research. This includes understanding your target audience, analyzing current market conditions, identifying opportunities, and setting clear, measurable objectives.
-
-### 2. Strategy Development
-Create a comprehensive strategy that addresses your specific needs and goals. Focus on developing actionable plans that can be implemented systematically and measured for effectiveness.
-
-### 3. Implementation Techniques
-Apply proven methodologies and techniques that have been tested in real-world scenarios. Consider factors such as scalability, sustainability, and long-term impact when choosing your approach.
-
-### 4. Monitoring and Optimization
-Continuously monitor your progress and make data-driven adjustments to improve results. Regular evaluation helps identify what's working well and what needs improvement.
-
-## Common Mistakes to Avoid
-
-- **Lack of Clear Strategy**: Jumping into implementation without proper planning
-- **Ignoring Data and Analytics**: Making decisions without supporting evidence
-- **Poor Resource Allocation**: Not dedicating sufficient time or resources
-- **Resistance to Change**: Failing to adapt when circumstances change
-- **Overlooking User Feedback**: Not incorporating valuable insights from stakeholders
-
-## Advanced Strategies
-
-### Leveraging Technology
-Modern {keyword} implementations benefit greatly from leveraging appropriate technology solutions. Consider automation tools, analytics platforms, and integration capabilities that can enhance your efforts.
-
-### Building Partnerships
-Collaborate with industry experts, complementary service providers, and strategic partners to expand your capabilities and reach. Strong partnerships can accelerate success and provide valuable insights.
-
-### Continuous Learning
-Stay updated with the latest trends, best practices, and emerging technologies in the {keyword} space. Attend conferences, participate in professional communities, and invest in ongoing education.
-
-## Measuring Success
-
-### Key Performance Indicators (KPIs)
-- Efficiency metrics and performance benchmarks
-- User satisfaction and engagement rates
-- Return on investment (ROI) calculations
-- Quality indicators and success metrics
-- Long-term sustainability measures
+            cause = _failed('full_article', keyword, product, e, attempt=attempt + 1)
+            # Transient errors were already retried by the transport, so another
+            # attempt would only repeat the failure
+            if draft is not None:
+                _article_done('full_article', keyword, product, content_length, attempt, draft, short=True)
+                return draft
+            _fallback('full_article', keyword, product, cause)
+            return fallback_templates.full_article(keyword, title, product, content_length)
+
+def generate_full_article(keyword, title, product="Files.com", content_length="medium", variants=None):
+    """Blocking entry point for generate_full_article_async"""
+    return run_sync(generate_full_article_async(keyword, title, product, content_length, variants))
+
+def prompt_versions(content_length="medium", combined_metadata=False, fields=None):
+    """Version ids of the prompts behind each field of generate_all_content's result (or just `fields`)"""
+    versions = {field: prompts.version_id('metadata' if combined_metadata else field) for field in METADATA_FIELDS}
+    versions['full_article'] = prompts.version_id('full_article', content_length)
+    return {field: version for field, version in versions.items() if fields is None or field in fields}
+
+@_instrumented('all_content')
+@_coalesced('all_content')
+async def generate_all_content_async(keyword, product="Files.com", content_length="medium", combined_metadata=False, variants=None):
+    """Generate title, article, meta title and meta description for one keyword.
+
+    Only the article depends on the title, so the meta calls run alongside the
+    title -> article chain and the row takes roughly as long as that chain.
+    With combined_metadata, one structured call produces all three short
+    fields before the article is written. `variants` (near-duplicate keywords
+    clustered under this one) are worked into the article prompt.
+    """
+    logger.debug('Generating', extra=_log_fields('all_content', keyword, product, content_length=content_length))
+    
+    if combined_metadata:
+        metadata = await generate_metadata_async(keyword, product)
+        full_article = await generate_full_article_async(keyword, metadata['article_title'], product, content_length, variants)
+        return {
+            'article_title': metadata['article_title'],
+            'full_article': full_article,
+            'meta_title': metadata['meta_title'],
+            'meta_description': metadata['meta_description'],
+            'prompt_versions': prompt_versions(content_length, combined_metadata)
+        }
+    
+    async def title_and_article():
+        article_title = await generate_article_title_async(keyword, product)
+        full_article = await generate_full_article_async(keyword, article_title, product, content_length, variants)
+        return article_title, full_article
+    
+    (article_title, full_article), meta_title, meta_description = await asyncio.gather(
+        title_and_article(),
+        generate_meta_title_async(keyword, product),
+        generate_meta_description_async(keyword, product)
+    )
+    
+    return {
+        'article_title': article_title,
+        'full_article': full_article,
+        'meta_title': meta_title,
+        'meta_description': meta_description,
+        'prompt_versions': prompt_versions(content_length)
+    }
 
-### Tools and Analytics
-Utilize appropriate measurement tools to track progress and identify areas for improvement. Regular reporting and analysis help maintain focus on objectives and demonstrate value.
+def generate_all_content(keyword, product="Files.com", content_length="medium", combined_metadata=False, variants=None):
+    """Blocking entry point for generate_all_content_async, for WSGI and serverless handlers"""
+    return run_sync(generate_all_content_async(keyword, product, content_length, combined_metadata, variants))
 
-## Future Trends and Considerations
+# Dry-run cost preview: counts the prompts that would be sent without calling
+# OpenAI. Completion sizes and latencies come from the usage ledger's recent
+# history when it has some, otherwise from the defaults below.
 
-The landscape of {keyword} continues to evolve rapidly. Stay informed about emerging trends, technological advances, and changing best practices. Consider how these developments might impact your strategy and be prepared to adapt accordingly.
+PREVIEW_TOKENS_PER_SECOND = float(os.getenv('PREVIEW_TOKENS_PER_SECOND', '50'))
+PREVIEW_CALL_OVERHEAD_SECONDS = float(os.getenv('PREVIEW_CALL_OVERHEAD_SECONDS', '0.5'))
 
-## Conclusion
+# Typical completion tokens of the short calls
+EXPECTED_COMPLETION_TOKENS = {'article_title': 20, 'meta_title': 18, 'meta_description': 45, 'metadata': 100}
 
-Mastering {keyword} requires dedication, continuous learning, and adaptation to changing conditions. By following the strategies and best practices outlined in this guide, you'll be well-equipped to achieve success in your {keyword} endeavors.
+def preview_content(keyword, product="Files.com", content_length="medium", combined_metadata=False, variants=None, history=None):
+    """Estimate tokens, cost and latency of generate_all_content for one keyword.
 
-Remember to always prioritize value creation, maintain ethical practices, and focus on sustainable, long-term results. Success in {keyword} comes from consistent effort, strategic thinking, and a commitment to excellence.
+    history is usage_ledger.averages(); pass it in when previewing many rows.
+    Cache hits and length top-ups are not predicted.
+    """
+    history = usage_ledger.averages() if history is None else history
+    length_config = get_content_length_instructions(content_length)
+    calls = []
+    
+    def add(label, messages, max_tokens, expected, length=None):
+        past = history.get((label, length))
+        completion_tokens = min(max_tokens, round(past['completion_tokens'] if past else expected))
+        latency = past['latency'] if past and past['latency'] else PREVIEW_CALL_OVERHEAD_SECONDS + completion_tokens / PREVIEW_TOKENS_PER_SECOND
+        calls.append({'label': label, 'prompt_tokens': count_message_tokens(messages), 'completion_tokens': completion_tokens, 'latency_seconds': round(latency, 2)})
+        return latency
+    
+    if combined_metadata:
+        first = add('metadata', _metadata_messages(keyword, product, METADATA_FIELDS), 100 * len(METADATA_FIELDS), EXPECTED_COMPLETION_TOKENS['metadata'])
+    else:
+        first = add('article_title', _title_messages(keyword, product), 100, EXPECTED_COMPLETION_TOKENS['article_title'])
+        add('meta_title', _meta_title_messages(keyword, product), 80, EXPECTED_COMPLETION_TOKENS['meta_title'])
+        add('meta_description', _meta_description_messages(keyword, product), 120, EXPECTED_COMPLETION_TOKENS['meta_description'])
+    # The template title stands in for the generated one; they are about as long
+    title = fallback_templates.article_title(keyword, product)
+    if content_length in SECTIONED_LENGTHS:
+        # Outline, then every section at once; placeholder headings stand in for the plan
+        _, high = _outline_size(length_config['structure'])
+        request = _outline_request(keyword, title, product, content_length, variants)
+        article = add('article_outline', request['messages'], request['max_tokens'], 30 * high, content_length)
+        placeholders = [(f'Section {number}', []) for number in range(1, high + 1)]
+        article += max(
+            add('article_section', request['messages'], request['max_tokens'], words_to_tokens(words), content_length)
+            for _, words, request in _section_requests(keyword, title, product, content_length, placeholders)
+        )
+    else:
+        request = _article_request(keyword, title, product, content_length, 0, variants)
+        article = add('full_article', request['messages'], request['max_tokens'], words_to_tokens(length_config['expected_words']), content_length)
+    
+    prompt_tokens = sum(call['prompt_tokens'] for call in calls)
+    completion_tokens = sum(call['completion_tokens'] for call in calls)
+    return {
+        'keyword': keyword,
+        'product': product,
+        'contentLength': content_length,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+        'cost': round(token_cost(MODEL, prompt_tokens, completion_tokens), 6),
+        # Metas run alongside the title -> article chain
+        'latency_seconds': round(first + article, 2),
+        'calls': calls
+    }
 
-## Additional Resources
+# Streaming path: yields (event, data) pairs so callers can forward tokens as
+# they arrive instead of waiting for the whole completion.
 
-- Industry publications and research reports
-- Professional associations and communities
-- Training programs and certification courses
-- Expert consultations and advisory services
-- Technology platforms and implementation tools
+@_instrumented('stream_full_article')
+def stream_full_article(keyword, title, product="Files.com", content_length="medium", variants=None):
+    """Yield article text deltas as OpenAI streams them; the joined deltas are the raw article.
 
-Start implementing these strategies today and begin your journey toward {keyword} mastery. With the right approach and consistent effort, you can achieve remarkable results and establish yourself as a leader in this important field.""" 
\ No newline at end of file
+    Streams a single attempt (no length retries). Falls back to the template if
+    the request fails before any text arrives, and serves cache hits as one delta.
+    """
+    logger.debug('Generating', extra=_log_fields('stream_full_article', keyword, product, content_length=content_length))
+    
+    if not api_key:
+        _fallback('stream_full_article', keyword, product, 'no_api_key')
+        yield fallback_templates.full_article(keyword, title, product, content_length)
+        return
+    
+    cache_key = _cache_key('full_article', keyword, product, content_length, extra=[title, list(variants)] if variants else title)
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        _cache_hit('stream_full_article', keyword, product)
+        yield cached
+        return
+    
+    parts = []
+    # Sanitize as we go so debugging artifacts never reach the client
+    sanitizer = StreamingSanitizer()
+    request = _article_request(keyword, title, product, content_length, 0, variants)
+    try:
+        for chunk in _stream_completion('full_article', product, content_length, **request):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                clean = sanitizer.feed(delta)
+                if clean:
+                    yield clean
+    except Exception as e:
+        cause = _failed('stream_full_article', keyword, product, e)
+        if not parts:
+            _fallback('stream_full_article', keyword, product, cause)
+            yield fallback_templates.full_article(keyword, title, product, content_length)
+        else:
+            tail = sanitizer.flush()
+            if tail:
+                yield tail
+        return
+    
+    tail = sanitizer.flush()
+    if tail:
+        yield tail
+    article_content = sanitize_article(''.join(parts).strip())
+    _article_done('stream_full_article', keyword, product, content_length, 1, article_content)
+    result_cache.set(cache_key, article_content)
+
+@_instrumented('stream_all_content')
+def stream_all_content(keyword, product="Files.com", content_length="medium", variants=None):
+    """Generate all content for one keyword, yielding (event, data) pairs as pieces become ready.
+
+    Events: `article_title`, `meta_title` and `meta_description` once each is
+    available, `article_delta` for every streamed chunk of the article, and a
+    final `done` event with the sanitized article, its word count and the
+    prompt versions.
+    """
+    events = queue.Queue()
+    stop = threading.Event()
+    result = {}
+    
+    def produce_meta(field, generate):
+        events.put((field, {field: generate(keyword, product)}))
+    
+    def produce_article():
+        article_title = generate_article_title(keyword, product)
+        events.put(('article_title', {'article_title': article_title}))
+        for delta in stream_full_article(keyword, article_title, product, content_length, variants):
+            if stop.is_set():
+                break
+            events.put(('article_delta', {'text': delta}))
+        events.put((None, None))
+    
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        # Worker threads do not inherit context variables (e.g. cache mode), so copy them
+        futures = [
+            executor.submit(contextvars.copy_context().run, produce_article),
+            executor.submit(contextvars.copy_context().run, produce_meta, 'meta_title', generate_meta_title),
+            executor.submit(contextvars.copy_context().run, produce_meta, 'meta_description', generate_meta_description)
+        ]
+        parts = []
+        try:
+            remaining = 3
+            while remaining:
+                try:
+                    event, data = events.get(timeout=0.5)
+                except queue.Empty:
+                    # Surface producer crashes instead of waiting forever
+                    for future in futures:
+                        if future.done() and future.exception():
+                            raise future.exception()
+                    continue
+                if event is None or event in ('meta_title', 'meta_description'):
+                    remaining -= 1
+                if event is None:
+                    continue
+                if event == 'article_delta':
+                    parts.append(data['text'])
+                else:
+                    result.update(data)
+                yield event, data
+        finally:
+            # Stop streaming tokens nobody will read if the client went away
+            stop.set()
+    
+    # The streamed deltas are already sanitized
+    full_article = ''.join(parts).strip()
+    yield 'done', {
+        'article_title': result['article_title'],
+        'full_article': full_article,
+        'meta_title': result['meta_title'],
+        'meta_description': result['meta_description'],
+        'word_count': len(full_article.split()),
+        'prompt_versions': prompt_versions(content_length)
+    }
@@ -0,0 +1,246 @@
+import string
+
+# Template content used when OpenAI is unavailable or every attempt fails.
+# Articles are assembled from shared section blocks into one str.format template
+# per content length, and compiled once at import; a render is then a single
+# format_map call. Product-specific wording comes from PRODUCT_PROFILES.
+# Stdlib only, so the API handlers can fall back to it even when the OpenAI
+# SDK cannot be imported.
+
+DEFAULT_PRODUCT = 'Files.com'
+
+PRODUCT_PROFILES = {
+    'files.com': {
+        'category': 'cloud-native managed file transfer platform',
+        'strength': 'automating secure file workflows across SFTP, FTPS, AS2 and cloud storage',
+        'audience': 'IT and operations teams'
+    },
+    'exavault': {
+        'category': 'cloud-based FTP and file sharing service',
+        'strength': 'sharing large files with clients and partners over FTP, SFTP and the web',
+        'audience': 'small and mid-sized businesses'
+    },
+    'expandrive': {
+        'category': 'cloud storage drive client',
+        'strength': 'working with S3, Google Drive, SharePoint and other cloud storage as if it were a local drive',
+        'audience': 'developers and creative teams'
+    }
+}
+
+_DEFAULT_PROFILE = {
+    'category': 'solution',
+    'strength': 'turning these practices into repeatable day-to-day workflows',
+    'audience': 'growing teams'
+}
+
+_SECTIONS = {
+    'introduction': """## Introduction
+
+{keyword} is a crucial topic that many people want to understand better, especially in the context of {product}'s expertise. In this comprehensive guide, we'll explore everything you need to know about {keyword}, from the basics to advanced strategies that can help you achieve your goals.""",
+
+    'what_is': """## What is {keyword}?
+
+{keyword} refers to the practice and techniques involved in optimizing and implementing effective strategies. It encompasses various methodologies and approaches that help improve results, increase efficiency, and drive meaningful outcomes for individuals and organizations.""",
+
+    'benefits': """## Key Benefits
+
+1. **Improved Performance**: Better results and enhanced effectiveness
+2. **Increased Efficiency**: Streamlined processes and optimized workflows
+3. **Better User Experience**: Solutions that serve real needs and deliver value
+4. **Higher Success Rates**: More qualified outcomes and measurable improvements
+5. **Competitive Advantage**: Stay ahead of trends and industry developments""",
+
+    'best_practices': """## Best Practices for {keyword}
+
+### 1. Research and Planning
+Before diving into {keyword}, it's essential to conduct thorough research. This includes understanding your target audience, analyzing current market conditions, identifying opportunities, and setting clear, measurable objectives.
+
+### 2. Strategy Development
+Create a comprehensive strategy that addresses your specific needs and goals. Focus on developing actionable plans that can be implemented systematically and measured for effectiveness.
+
+### 3. Implementation Techniques
+Apply proven methodologies and techniques that have been tested in real-world scenarios. Consider factors such as scalability, sustainability, and long-term impact when choosing your approach.
+
+### 4. Monitoring and Optimization
+Continuously monitor your progress and make data-driven adjustments to improve results. Regular evaluation helps identify what's working well and what needs improvement.""",
+
+    'mistakes': """## Common Mistakes to Avoid
+
+- **Lack of Clear Strategy**: Jumping into implementation without proper planning
+- **Ignoring Data and Analytics**: Making decisions without supporting evidence
+- **Poor Resource Allocation**: Not dedicating sufficient time or resources
+- **Resistance to Change**: Failing to adapt when circumstances change
+- **Overlooking User Feedback**: Not incorporating valuable insights from stakeholders""",
+
+    'product': """## How {product} Helps with {keyword}
+
+{product} is a {category} built for {audience}. It helps with {keyword} by {strength}, so teams spend less time on manual work and more time on the outcomes that matter.
+
+- **Centralized Control**: Manage users, permissions and activity for {keyword} from one place
+- **Automation**: Replace repetitive manual steps with scheduled, rule-based workflows
+- **Visibility**: Audit logs and reporting show exactly what happened and when
+- **Scalability**: Start small and grow without re-architecting your setup
+
+Whether you are just getting started or refining a mature process, {product} gives {audience} a dependable foundation for {keyword}.""",
+
+    'implementation': """## Step-by-Step Implementation Plan
+
+1. **Define Goals**: Write down what success with {keyword} looks like and how you will measure it.
+2. **Audit Your Current Setup**: Document existing tools, processes, owners and pain points.
+3. **Choose the Right Tools**: Select solutions that fit your requirements, budget and team skills.
+4. **Pilot with One Team**: Roll out {keyword} to a small group first and collect feedback.
+5. **Document and Train**: Turn lessons from the pilot into clear guides and short training sessions.
+6. **Roll Out Gradually**: Expand to more teams in stages, fixing issues as they surface.
+7. **Review Regularly**: Revisit goals every quarter and adjust the plan as your needs change.
+
+Taking these steps in order keeps risk low and makes it easier to show early wins to stakeholders.""",
+
+    'advanced': """## Advanced Strategies
+
+### Leveraging Technology
+Modern {keyword} implementations benefit greatly from leveraging appropriate technology solutions. Consider automation tools, analytics platforms, and integration capabilities that can enhance your efforts.
+
+### Building Partnerships
+Collaborate with industry experts, complementary service providers, and strategic partners to expand your capabilities and reach. Strong partnerships can accelerate success and provide valuable insights.
+
+### Continuous Learning
+Stay updated with the latest trends, best practices, and emerging technologies in the {keyword} space. Attend conferences, participate in professional communities, and invest in ongoing education.""",
+
+    'security': """## Security and Compliance Considerations
+
+Security should be part of every {keyword} decision rather than an afterthought. Encrypt data in transit and at rest, enforce strong authentication such as multi-factor sign-in, and grant each user only the access they need.
+
+Many industries also have compliance requirements to meet. Keep detailed audit trails, define data retention rules, and review access regularly so you can demonstrate control during audits. Frameworks such as SOC 2, HIPAA and GDPR each set expectations that affect how {keyword} should be configured and monitored.
+
+Finally, plan for failure. Regular backups, tested recovery procedures and clear incident response steps limit the impact when something goes wrong.""",
+
+    'measuring': """## Measuring Success
+
+### Key Performance Indicators (KPIs)
+- Efficiency metrics and performance benchmarks
+- User satisfaction and engagement rates
+- Return on investment (ROI) calculations
+- Quality indicators and success metrics
+- Long-term sustainability measures
+
+### Tools and Analytics
+Utilize appropriate measurement tools to track progress and identify areas for improvement. Regular reporting and analysis help maintain focus on objectives and demonstrate value.""",
+
+    'example': """## Real-World Example
+
+Consider a mid-sized organization that handled {keyword} with a patchwork of scripts, shared folders and manual checklists. Work was slow, errors were hard to trace, and only a few people understood the full process.
+
+The team started by mapping every step, then consolidated their tooling on a {category}. They automated the most frequent tasks first, added alerts for failures, and gave each department clear ownership of its part of the workflow.
+
+Within a few months, turnaround times dropped, errors became visible and fixable, and new team members could be onboarded in days instead of weeks. The same approach can be applied to {keyword} in almost any organization.""",
+
+    'trends': """## Future Trends and Considerations
+
+The landscape of {keyword} continues to evolve rapidly. Stay informed about emerging trends, technological advances, and changing best practices. Consider how these developments might impact your strategy and be prepared to adapt accordingly.""",
+
+    'faq': """## Frequently Asked Questions
+
+### How long does it take to see results with {keyword}?
+Most teams see early improvements within a few weeks of a focused pilot, while the full benefits build over several months as processes mature.
+
+### Do I need specialized skills to get started?
+No. A clear plan, good documentation and the right tools matter more than deep expertise. Skills can be developed as the program grows.
+
+### How much does {keyword} cost?
+Costs depend on scale, tooling and how much work is automated. Starting with a small pilot keeps the initial investment low and makes the return easy to measure.
+
+### What is the biggest risk?
+Skipping planning. Teams that define goals, owners and success metrics up front avoid most of the common pitfalls.""",
+
+    'conclusion': """## Conclusion
+
+Mastering {keyword} requires dedication, continuous learning, and adaptation to changing conditions. By following the strategies and best practices outlined in this guide, you'll be well-equipped to achieve success in your {keyword} endeavors.
+
+Remember to always prioritize value creation, maintain ethical practices, and focus on sustainable, long-term results. Success in {keyword} comes from consistent effort, strategic thinking, and a commitment to excellence.""",
+
+    'resources': """## Additional Resources
+
+- Industry publications and research reports
+- Professional associations and communities
+- Training programs and certification courses
+- Expert consultations and advisory services
+- Technology platforms and implementation tools
+
+Start implementing these strategies today and begin your journey toward {keyword} mastery. With the right approach and consistent effort, you can achieve remarkable results and establish yourself as a leader in this important field."""
+}
+
+# Sections per content length, in article order
+_LAYOUTS = {
+    'short': ('introduction', 'what_is', 'benefits', 'best_practices', 'product', 'conclusion'),
+    'medium': ('introduction', 'what_is', 'benefits', 'best_practices', 'mistakes', 'advanced', 'product',
+               'measuring', 'trends', 'conclusion', 'resources'),
+    'long': ('introduction', 'what_is', 'benefits', 'best_practices', 'implementation', 'mistakes', 'advanced',
+             'security', 'product', 'measuring', 'trends', 'conclusion', 'resources'),
+    'comprehensive': ('introduction', 'what_is', 'benefits', 'best_practices', 'implementation', 'mistakes', 'advanced',
+                      'security', 'product', 'example', 'measuring', 'trends', 'faq', 'conclusion', 'resources')
+}
+
+_FIELDS = {'keyword', 'title', 'product', 'category', 'strength', 'audience'}
+
+def _compile(layout):
+    """Join a layout's sections into one format template and check its placeholders"""
+    template = '\n\n'.join(['# {title}'] + [_SECTIONS[name] for name in layout])
+    unknown = {field for _, field, _, _ in string.Formatter().parse(template) if field} - _FIELDS
+    if unknown:
+        raise ValueError(f"Unknown template fields: {', '.join(sorted(unknown))}")
+    return template
+
+_ARTICLES = {content_length: _compile(layout) for content_length, layout in _LAYOUTS.items()}
+
+def _fields(keyword, product):
+    product = product or DEFAULT_PRODUCT
+    fields = dict(PRODUCT_PROFILES.get(product.strip().lower(), _DEFAULT_PROFILE))
+    fields.update(keyword=keyword, product=product)
+    return fields
+
+def content_brief(keyword, product=DEFAULT_PRODUCT):
+    fields = _fields(keyword, product)
+    return f"Content brief for '{keyword}' for {product}: Create a comprehensive guide covering fundamentals, best practices, and actionable tips. Target audience: {product} users and potential customers, especially {fields['audience']}. Include examples and case studies relevant to {product}'s market as a {fields['category']}. Use a mix of paragraph text and bulleted lists for better readability."
+
+def article_title(keyword, product=DEFAULT_PRODUCT):
+    return f"The Complete Guide to {keyword}: Everything You Need to Know"
+
+def meta_title(keyword, product=DEFAULT_PRODUCT):
+    return f"{keyword} - Complete Guide, Tips & Best Practices"
+
+def meta_description(keyword, product=DEFAULT_PRODUCT):
+    return f"Learn everything about {keyword} with our comprehensive guide. Discover best practices, expert tips, and proven strategies."
+
+def full_article(keyword, title, product=DEFAULT_PRODUCT, content_length='medium', variants=None):
+    """Template article sized for content_length (unknown lengths use medium); variants are not used"""
+    fields = _fields(keyword, product)
+    fields['title'] = title or article_title(keyword, product)
+    return _ARTICLES.get(content_length, _ARTICLES['medium']).format_map(fields)
+
+_METADATA = {'article_title': article_title, 'meta_title': meta_title, 'meta_description': meta_description}
+
+def metadata(keyword, product=DEFAULT_PRODUCT, fields=tuple(_METADATA)):
+    return {field: _METADATA[field](keyword, product) for field in fields}
+
+def all_content(keyword, product=DEFAULT_PRODUCT, content_length='medium', combined_metadata=False, variants=None):
+    """Template equivalent of the /api/generate_content payload"""
+    title = article_title(keyword, product)
+    return {
+        'article_title': title,
+        'full_article': full_article(keyword, title, product, content_length),
+        'meta_title': meta_title(keyword, product),
+        'meta_description': meta_description(keyword, product)
+    }
+
+def prompt_versions(content_length='medium', combined_metadata=False, fields=None):
+    """Template content is not generated from prompts, so it has no prompt versions"""
+    return {}
+
+def stream_all_content(keyword, product=DEFAULT_PRODUCT, content_length='medium', variants=None):
+    """Template equivalent of content_with_ai.stream_all_content's events"""
+    content = all_content(keyword, product, content_length)
+    yield 'article_title', {'article_title': content['article_title']}
+    yield 'meta_title', {'meta_title': content['meta_title']}
+    yield 'meta_description', {'meta_description': content['meta_description']}
+    yield 'article_delta', {'text': content['full_article']}
+    yield 'done', dict(content, word_count=len(content['full_article'].split()))
@@ -0,0 +1,149 @@
+import asyncio
+import collections
+import math
+import os
+import threading
+import time
+
+import metrics
+from log_config import get_logger
+
+# Hedged requests for the short generation calls (article title and metas):
+# when a call has not answered by a high percentile of its recent latencies, a
+# duplicate goes out, the first answer wins and the other request is
+# cancelled. Hedges are capped at a share of recent calls so a slow upstream
+# does not get twice the traffic. Only async calls are hedged: a blocking HTTP
+# call cannot be cancelled, so its loser would run to completion anyway.
+
+logger = get_logger('hedging')
+
+class Hedger:
+    """Per-function latency history and the hedged call runner"""
+
+    def __init__(self, enabled=False, functions=('article_title', 'meta_title', 'meta_description'), percentile=95, max_rate=0.1, window=200, min_samples=20, min_delay=0.05):
+        self.enabled = enabled
+        self.functions = set(functions)
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.window = window
+        # No hedging until a function has this many latency samples
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.stats = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'capped': 0}
+        self._latencies = {}
+        # One [hedged] flag per recent call, for the rate cap
+        self._recent = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build from HEDGE_ENABLED / HEDGE_FUNCTIONS / HEDGE_PERCENTILE / HEDGE_MAX_RATE / HEDGE_MIN_SAMPLES"""
+        return cls(
+            enabled=os.getenv('HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+            functions=[function.strip() for function in os.getenv('HEDGE_FUNCTIONS', 'article_title,meta_title,meta_description').split(',') if function.strip()],
+            percentile=float(os.getenv('HEDGE_PERCENTILE', '95')),
+            max_rate=float(os.getenv('HEDGE_MAX_RATE', '0.1')),
+            min_samples=int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+        )
+
+    def observe(self, label, seconds):
+        """Add one call's latency to the history of `label`"""
+        with self._lock:
+            history = self._latencies.get(label)
+            if history is None:
+                history = self._latencies[label] = collections.deque(maxlen=self.window)
+            history.append(seconds)
+
+    def delay(self, label):
+        """Seconds to wait before hedging a call of `label`, or None while its history is too short"""
+        with self._lock:
+            history = self._latencies.get(label)
+            if history is None or len(history) < self.min_samples:
+                return None
+            ordered = sorted(history)
+        index = min(len(ordered) - 1, max(0, math.ceil(self.percentile / 100 * len(ordered)) - 1))
+        return max(self.min_delay, ordered[index])
+
+    def _allow(self, label, flag):
+        """Take a hedge under the rate cap: at most max_rate of the recent calls are hedged"""
+        with self._lock:
+            hedged = sum(1 for recent in self._recent if recent[0])
+            if hedged + 1 > self.max_rate * max(len(self._recent), self.min_samples):
+                self.stats['capped'] += 1
+                allowed = False
+            else:
+                flag[0] = True
+                self.stats['hedged'] += 1
+                allowed = True
+        if allowed:
+            metrics.HEDGES.labels(label).inc()
+        else:
+            metrics.HEDGES_CAPPED.labels(label).inc()
+        return allowed
+
+    async def _timed(self, label, call):
+        started = time.monotonic()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            # A cancelled loser took at least this long; keeping it keeps the tail in the history
+            self.observe(label, time.monotonic() - started)
+            raise
+        self.observe(label, time.monotonic() - started)
+        return result
+
+    async def run(self, label, call):
+        """Await call(), hedging slow calls of the configured functions; call must return a new awaitable each time"""
+        if not self.enabled or label not in self.functions:
+            return await call()
+        flag = [False]
+        with self._lock:
+            self.stats['calls'] += 1
+            self._recent.append(flag)
+        delay = self.delay(label)
+        if delay is None:
+            return await self._timed(label, call)
+
+        tasks = [asyncio.ensure_future(self._timed(label, call))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._allow(label, flag):
+                logger.debug('Hedging slow call', extra={'fields': {'function': label, 'delay': round(delay, 3)}})
+                tasks.append(asyncio.ensure_future(self._timed(label, call)))
+            pending = set(tasks)
+            winner = None
+            while winner is None and pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # The first answer wins; a failed leg only matters if the other one fails too
+                winner = next((task for task in tasks if task in done and task.exception() is None), None)
+            if winner is None:
+                raise tasks[0].exception()
+            if winner is not tasks[0]:
+                with self._lock:
+                    self.stats['hedge_wins'] += 1
+                metrics.HEDGE_WINS.labels(label).inc()
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark a losing leg's error as handled
+                    task.exception()
+
+    def snapshot(self):
+        """Hedging counters and the current hedge delay per function"""
+        with self._lock:
+            stats = dict(self.stats)
+            samples = {label: len(history) for label, history in self._latencies.items()}
+        delays = {label: self.delay(label) for label in samples}
+        return dict(
+            stats,
+            enabled=self.enabled,
+            max_rate=self.max_rate,
+            percentile=self.percentile,
+            delays={label: None if delay is None else round(delay, 3) for label, delay in delays.items()},
+            samples=samples
+        )
+
+hedger = Hedger.from_env()
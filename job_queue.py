@@ -0,0 +1,224 @@
+import contextlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+# Durable queue for long generations: jobs live in a SQLite file so several
+# worker processes can pull from it. A worker leases a job, extends the lease
+# with heartbeats while it runs, and checkpoints each completed stage; when a
+# worker dies its lease runs out and another worker re-claims the job, resuming
+# from the checkpointed stages.
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+
+# Serverless instances each have a /tmp of their own, so there is no safe
+# default there: a job queued on one instance would 404 when polled on another
+PATH_REQUIRED = 'JOB_QUEUE_PATH must be set to storage shared by every instance on serverless deployments'
+
+class LeaseLost(Exception):
+    """Raised when a worker writes to a job whose lease it no longer holds"""
+
+class QueueNotConfigured(RuntimeError):
+    """Raised when a queue without a path (JOB_QUEUE_PATH unset on Vercel) is used"""
+
+class JobQueue:
+    """SQLite-backed job queue with leases, heartbeats and per-stage checkpoints"""
+
+    def __init__(self, path, lease_seconds=60, max_attempts=3, retention=7 * 24 * 3600):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @classmethod
+    def from_env(cls):
+        """Build the queue from JOB_QUEUE_PATH / JOB_LEASE_SECONDS / JOB_MAX_ATTEMPTS / JOB_RETENTION_SECONDS.
+
+        JOB_QUEUE_PATH defaults to a file in the temp directory, except on
+        Vercel, where it is required and the queue has no path until it is set.
+        """
+        default_path = None if os.getenv('VERCEL') else os.path.join(tempfile.gettempdir(), 'seo_jobs.sqlite3')
+        return cls(
+            path=os.getenv('JOB_QUEUE_PATH') or default_path,
+            lease_seconds=float(os.getenv('JOB_LEASE_SECONDS', '60')),
+            max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '3')),
+            retention=float(os.getenv('JOB_RETENTION_SECONDS', str(7 * 24 * 3600)))
+        )
+
+    def _connection(self):
+        if self.path is None:
+            raise QueueNotConfigured(PATH_REQUIRED)
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, results TEXT NOT NULL, '
+                'error TEXT, attempts INTEGER NOT NULL, lease_owner TEXT, lease_expires REAL, '
+                'created_at REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)')
+            self._conn = conn
+        return self._conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so a claim's
+        # select-then-update cannot race another process
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    @staticmethod
+    def _row_to_job(row):
+        job_id, status, payload, results, error, attempts, lease_owner, lease_expires, created_at, updated_at = row
+        return {
+            'id': job_id,
+            'status': status,
+            'payload': json.loads(payload),
+            'results': json.loads(results),
+            'error': error,
+            'attempts': attempts,
+            'lease_owner': lease_owner,
+            'lease_expires': lease_expires,
+            'created_at': created_at,
+            'updated_at': updated_at
+        }
+
+    def enqueue(self, payload):
+        """Add a job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, payload, results, attempts, created_at, updated_at) VALUES (?, ?, ?, ?, 0, ?, ?)',
+                (job_id, JOB_QUEUED, json.dumps(payload), '{}', now, now)
+            )
+            # Finished jobs are only kept for polling, so expire old ones here
+            conn.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?',
+                (JOB_SUCCEEDED, JOB_FAILED, now - self.retention)
+            )
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist"""
+        with self._lock:
+            row = self._connection().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def claim(self, worker_id, job_id=None):
+        """Lease the oldest runnable job (or only `job_id`) to worker_id; returns the job or None.
+
+        Runnable means queued, or running with an expired lease. Expired leases
+        that were already on their last attempt are marked failed instead.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? '
+                'WHERE status = ? AND lease_expires < ? AND attempts >= ?',
+                (JOB_FAILED, f'Lease expired on attempt {self.max_attempts} of {self.max_attempts}', now, JOB_RUNNING, now, self.max_attempts)
+            )
+            query = 'SELECT id FROM jobs WHERE (status = ? OR (status = ? AND lease_expires < ?))'
+            params = [JOB_QUEUED, JOB_RUNNING, now]
+            if job_id is not None:
+                query += ' AND id = ?'
+                params.append(job_id)
+            row = conn.execute(query + ' ORDER BY created_at LIMIT 1', params).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                (JOB_RUNNING, worker_id, now + self.lease_seconds, now, row[0])
+            )
+            job = self._row_to_job(conn.execute('SELECT * FROM jobs WHERE id = ?', (row[0],)).fetchone())
+        return job
+
+    def _update_leased(self, conn, job_id, worker_id, assignments, params):
+        # Only the current lease holder may write to a running job
+        cursor = conn.execute(
+            f'UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ? AND status = ? AND lease_owner = ?',
+            list(params) + [time.time(), job_id, JOB_RUNNING, worker_id]
+        )
+        if cursor.rowcount == 0:
+            raise LeaseLost(f'Worker {worker_id} no longer holds the lease on job {job_id}')
+
+    def heartbeat(self, job_id, worker_id):
+        """Extend the lease; returns False if the worker has lost it"""
+        try:
+            with self._transaction() as conn:
+                self._update_leased(conn, job_id, worker_id, 'lease_expires = ?', [time.time() + self.lease_seconds])
+            return True
+        except LeaseLost:
+            return False
+
+    def checkpoint(self, job_id, worker_id, results):
+        """Merge completed stage results into the job and extend the lease"""
+        with self._transaction() as conn:
+            row = conn.execute('SELECT results FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            merged = dict(json.loads(row[0]) if row else {}, **results)
+            self._update_leased(conn, job_id, worker_id, 'results = ?, lease_expires = ?', [json.dumps(merged), time.time() + self.lease_seconds])
+
+    def complete(self, job_id, worker_id):
+        with self._transaction() as conn:
+            self._update_leased(conn, job_id, worker_id, 'status = ?, lease_owner = NULL, lease_expires = NULL, error = NULL', [JOB_SUCCEEDED])
+
+    def release(self, job_id, worker_id):
+        """Hand an unfinished job back to the queue without counting the attempt"""
+        with self._transaction() as conn:
+            self._update_leased(conn, job_id, worker_id, 'status = ?, lease_owner = NULL, lease_expires = NULL, attempts = attempts - 1', [JOB_QUEUED])
+
+    def fail(self, job_id, worker_id, error):
+        """Record a failed attempt; the job is queued again until it runs out of attempts"""
+        with self._transaction() as conn:
+            row = conn.execute('SELECT attempts FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            status = JOB_QUEUED if row and row[0] < self.max_attempts else JOB_FAILED
+            self._update_leased(conn, job_id, worker_id, 'status = ?, lease_owner = NULL, lease_expires = NULL, error = ?', [status, str(error)])
+        return status
+
+    @contextlib.contextmanager
+    def heartbeats(self, job_id, worker_id):
+        """Keep the lease alive from a background thread while the block runs.
+
+        Yields an Event that is set if the lease is lost.
+        """
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def beat():
+            while not stop.wait(self.lease_seconds / 3):
+                if not self.heartbeat(job_id, worker_id):
+                    lost.set()
+                    return
+
+        thread = threading.Thread(target=beat, name=f'job-heartbeat-{job_id[:8]}', daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
+
+    def counts(self):
+        """Number of jobs per status"""
+        with self._lock:
+            rows = self._connection().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+jobs = JobQueue.from_env()
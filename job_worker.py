@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Workers for the durable job queue (job_queue.py).
+
+Each job generates the /api/generate_content payload in stages (title, meta
+title, meta description, article), checkpointing every stage so a retried job
+resumes where the previous attempt stopped.
+
+    python job_worker.py [--processes N] [--poll SECONDS] [--exit-when-idle]
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import uuid
+
+from batch_generation import parse_row
+from content_with_ai import (
+    generate_article_title,
+    generate_meta_title,
+    generate_meta_description,
+    generate_metadata,
+    generate_full_article,
+    prompt_versions,
+    COMBINED_METADATA,
+    METADATA_FIELDS
+)
+from job_queue import jobs, JobQueue, LeaseLost, JOB_SUCCEEDED, JOB_FAILED
+from keyword_clustering import parse_variants
+from log_config import get_logger
+from request_options import parse_flag
+from result_cache import cache_mode, cache_mode_from_request
+
+logger = get_logger('jobs')
+
+JOB_STAGES = ('article_title', 'meta_title', 'meta_description', 'full_article')
+
+JOB_WORKER_THREADS = int(os.getenv('JOB_WORKER_THREADS', '2'))
+# Serverless handlers have no background workers, so each status poll runs
+# the job's next stage itself (turn off when job_worker.py processes run)
+JOB_DRIVE_ON_POLL = os.getenv('JOB_DRIVE_ON_POLL', 'true').lower() not in ('0', 'false', 'no')
+
+def new_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def submit_job(data, job_queue=jobs):
+    """Validate a /api/generate_content style request and enqueue it; returns the job id"""
+    keyword, product, content_length = parse_row(data)
+    return job_queue.enqueue({
+        'keyword': keyword,
+        'product': product,
+        'contentLength': content_length,
+        'variants': parse_variants(data),
+        'combinedMetadata': parse_flag(data.get('combinedMetadata'), COMBINED_METADATA),
+        'cacheMode': cache_mode_from_request(data)
+    })
+
+def _stages(payload):
+    """Ordered (fields, generate) pairs; generate(results) returns the stage's fields"""
+    keyword, product, content_length = payload['keyword'], payload['product'], payload['contentLength']
+    if payload.get('combinedMetadata'):
+        stages = [(METADATA_FIELDS, lambda results: generate_metadata(keyword, product))]
+    else:
+        stages = [
+            (('article_title',), lambda results: {'article_title': generate_article_title(keyword, product)}),
+            (('meta_title',), lambda results: {'meta_title': generate_meta_title(keyword, product)}),
+            (('meta_description',), lambda results: {'meta_description': generate_meta_description(keyword, product)})
+        ]
+    stages.append((('full_article',), lambda results: {
+        'full_article': generate_full_article(keyword, results['article_title'], product, content_length, payload.get('variants')),
+        'prompt_versions': prompt_versions(content_length, payload.get('combinedMetadata'))
+    }))
+    return stages
+
+def run_job(job, worker_id, job_queue=jobs, max_stages=None):
+    """Run the stages a leased job has not completed yet.
+
+    With max_stages, stops after that many stages and hands the job back to
+    the queue. Returns True once the job is complete.
+    """
+    results = dict(job['results'])
+    completed = 0
+    with job_queue.heartbeats(job['id'], worker_id) as lease_lost, cache_mode(job['payload'].get('cacheMode')):
+        for fields, generate in _stages(job['payload']):
+            if all(field in results for field in fields):
+                continue
+            if lease_lost.is_set():
+                raise LeaseLost(f"Lease on job {job['id']} expired while it was running")
+            if max_stages is not None and completed >= max_stages:
+                job_queue.release(job['id'], worker_id)
+                return False
+            produced = generate(results)
+            job_queue.checkpoint(job['id'], worker_id, produced)
+            results.update(produced)
+            completed += 1
+    job_queue.complete(job['id'], worker_id)
+    return True
+
+def process_job(job, worker_id, job_queue=jobs, max_stages=None):
+    """run_job with logging; failures are recorded on the job instead of raised"""
+    keyword = job['payload']['keyword']
+    fields = {'job_id': job['id'], 'keyword': keyword}
+    logger.info('Job attempt started', extra={'fields': dict(fields, attempt=job['attempts'], checkpointed=len(job['results']))})
+    try:
+        if run_job(job, worker_id, job_queue, max_stages):
+            logger.info('Job completed', extra={'fields': fields})
+    except LeaseLost as e:
+        # Another worker owns the job now and will resume from the checkpoints
+        logger.warning(str(e), extra={'fields': fields})
+    except Exception as e:
+        logger.error(f"Job failed: {e}", extra={'fields': fields})
+        try:
+            status = job_queue.fail(job['id'], worker_id, f'Generation failed: {str(e)}')
+            logger.info('Job queued for retry' if status != JOB_FAILED else 'Job has no attempts left', extra={'fields': fields})
+        except LeaseLost:
+            pass
+
+def advance_job(job_id, job_queue=jobs, max_stages=1):
+    """Run up to max_stages of one job if nobody holds its lease; returns the job afterwards"""
+    worker_id = new_worker_id()
+    job = job_queue.claim(worker_id, job_id)
+    if job is not None:
+        process_job(job, worker_id, job_queue, max_stages)
+    return job_queue.get(job_id)
+
+def job_status(job):
+    """Public view of a job for GET /api/jobs/<id>"""
+    results = job['results']
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'completed_stages': [stage for stage in JOB_STAGES if stage in results],
+        'total_stages': len(JOB_STAGES),
+        'result': results,
+        'error': job['error'] if job['status'] != JOB_SUCCEEDED else None,
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    }
+
+def work(job_queue=jobs, worker_id=None, poll_interval=1.0, stop=None, exit_when_idle=False):
+    """Claim and run jobs until `stop` is set (or the queue is empty, with exit_when_idle)"""
+    worker_id = worker_id or new_worker_id()
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        job = job_queue.claim(worker_id)
+        if job is None:
+            if exit_when_idle:
+                return
+            stop.wait(poll_interval)
+            continue
+        process_job(job, worker_id, job_queue)
+
+_worker_threads = []
+_worker_threads_lock = threading.Lock()
+
+def start_worker_threads(count=JOB_WORKER_THREADS, job_queue=jobs):
+    """Start `count` daemon worker threads in this process (once), e.g. for the Flask dev server"""
+    with _worker_threads_lock:
+        while len(_worker_threads) < count:
+            thread = threading.Thread(target=work, kwargs={'job_queue': job_queue}, name=f'job-worker-{len(_worker_threads)}', daemon=True)
+            thread.start()
+            _worker_threads.append(thread)
+
+def _work_in_process(poll_interval, exit_when_idle):
+    # Each process opens its own connection to the queue file
+    work(JobQueue.from_env(), poll_interval=poll_interval, exit_when_idle=exit_when_idle)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run workers for the durable job queue')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes to run')
+    parser.add_argument('--poll', type=float, default=1.0, help='seconds between polls when the queue is empty')
+    parser.add_argument('--exit-when-idle', action='store_true', help='exit once no runnable jobs are left')
+    args = parser.parse_args()
+
+    logger.info(f"Starting {args.processes} job worker(s) on {jobs.path}")
+    if args.processes == 1:
+        work(poll_interval=args.poll, exit_when_idle=args.exit_when_idle)
+        return
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_work_in_process, args=(args.poll, args.exit_when_idle)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Keyword normalization and near-duplicate clustering, run before generation.
+
+Keywords that normalize to the same tokens (case, plurals, stopwords and word
+order ignored) are grouped directly. Remaining near-duplicates are found with
+MinHash/LSH over the normalized tokens (minhash.py), so a keyword is only
+compared with the cluster leaders the index returns, never with every other
+keyword. Each cluster is generated once
+under its canonical keyword; the other keywords become `variants` that the
+article prompt works in.
+
+    python keyword_clustering.py keywords.csv -o clusters.jsonl [--threshold 0.6]
+
+The output rows (keyword, product, contentLength, variants) are valid
+batch_cli.py input.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from minhash import MinHasher, LSHIndex
+
+DEFAULT_THRESHOLD = 0.6
+# Variants beyond this are dropped rather than bloating the article prompt
+MAX_VARIANTS = int(os.getenv('MAX_KEYWORD_VARIANTS', '20'))
+
+STOPWORDS = frozenset(
+    'a an and are as at be by can do does for from i in is it its my of on or our the this to with you your'.split()
+)
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.+#'][a-z0-9]+)*")
+_VOWEL = re.compile(r'[aeiou]')
+
+def _singular(token):
+    """Strip common English plural endings; acronyms (no vowels, e.g. https) are left alone"""
+    if len(token) <= 3 or not _VOWEL.search(token) or token.isdigit():
+        return token
+    if token.endswith('ies') and len(token) > 4:
+        return token[:-3] + 'y'
+    if token.endswith(('sses', 'xes', 'ches', 'shes')):
+        return token[:-2]
+    if token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+def keyword_tokens(keyword):
+    """Normalized token tuple of a keyword: lowercased, singular, without stopwords, sorted"""
+    tokens = [_singular(token.replace("'", '')) for token in _TOKEN.findall(keyword.lower())]
+    kept = [token for token in tokens if token not in STOPWORDS]
+    # A keyword made only of stopwords keeps them rather than normalizing to nothing
+    return tuple(sorted(set(kept or tokens)))
+
+def cluster_keywords(keywords, threshold=DEFAULT_THRESHOLD, num_perm=48, bands=16):
+    """Group near-duplicate keywords.
+
+    Returns clusters in order of first appearance, each
+    {'keyword': canonical, 'variants': [...], 'size': n}. Two keywords are
+    clustered when the Jaccard similarity of their normalized token sets is at
+    least `threshold`; shorter (more general) keywords become the canonicals.
+
+    The index hashes token sets rather than character n-grams: on keywords a
+    few words long, one added word pushes n-gram similarity below the
+    threshold, while n-grams shared by unrelated keywords flood the buckets. Bands of 3 rows
+    keep frequent tokens ("best", "software") from making every keyword that
+    contains them a candidate.
+    """
+    groups = {}
+    for position, keyword in enumerate(keywords):
+        keyword = ' '.join(keyword.split())
+        if not keyword:
+            continue
+        tokens = keyword_tokens(keyword)
+        group = groups.get(tokens)
+        if group is None:
+            group = groups[tokens] = {'first': position, 'forms': Counter()}
+        group['forms'][keyword] += 1
+
+    hasher = MinHasher(num_perm)
+    index = LSHIndex(bands, num_perm // bands)
+    leaders = []
+    members = []
+    for tokens in sorted(groups, key=lambda tokens: (len(tokens), len(' '.join(tokens)), groups[tokens]['first'])):
+        signature = hasher.signature(tokens)
+        token_set = frozenset(tokens)
+        # Leaders are never longer than tokens, so shorter ones than this cannot reach the threshold
+        min_size = threshold * len(token_set)
+        best, best_similarity = None, threshold
+        for candidate in index.query(signature):
+            leader = leaders[candidate]
+            if len(leader) < min_size:
+                continue
+            shared = len(token_set & leader)
+            similarity = shared / (len(token_set) + len(leader) - shared)
+            if similarity > best_similarity or (similarity == best_similarity and (best is None or candidate < best)):
+                best, best_similarity = candidate, similarity
+        if best is None:
+            index.add(len(leaders), signature)
+            leaders.append(token_set)
+            members.append([tokens])
+        else:
+            members[best].append(tokens)
+
+    clusters = []
+    for cluster in members:
+        # The leader's most frequent spelling is the canonical keyword
+        canonical = groups[cluster[0]]['forms'].most_common(1)[0][0]
+        forms = []
+        for tokens in sorted(cluster, key=lambda tokens: groups[tokens]['first']):
+            forms.extend(form for form, _ in groups[tokens]['forms'].most_common())
+        variants = [form for form in forms if form != canonical]
+        first = min(groups[tokens]['first'] for tokens in cluster)
+        clusters.append((first, {'keyword': canonical, 'variants': variants, 'size': len(forms)}))
+    return [cluster for _, cluster in sorted(clusters, key=lambda item: item[0])]
+
+def parse_variants(row):
+    """Near-duplicate keywords clustered under a row's keyword: a list, or a '|'-separated string (CSV cells)"""
+    variants = row.get('variants') if isinstance(row, dict) else None
+    if not variants:
+        return []
+    if isinstance(variants, str):
+        variants = variants.split('|')
+    if not isinstance(variants, list) or not all(isinstance(variant, str) for variant in variants):
+        raise ValueError('variants must be a list of strings')
+    return [variant.strip() for variant in variants if variant.strip()][:MAX_VARIANTS]
+
+def parse_threshold(value):
+    """A request's similarity threshold: a number in (0, 1], DEFAULT_THRESHOLD when missing"""
+    if value is None:
+        return DEFAULT_THRESHOLD
+    try:
+        threshold = float(value) if not isinstance(value, bool) else None
+    except (TypeError, ValueError):
+        threshold = None
+    # NaN fails the range check too
+    if threshold is None or not 0 < threshold <= 1:
+        raise ValueError('threshold must be a number greater than 0 and at most 1')
+    return threshold
+
+def cluster_rows(rows, threshold=DEFAULT_THRESHOLD):
+    """Cluster batch rows per product; each cluster keeps its canonical row's other fields.
+
+    Rows without a usable keyword are passed through unchanged so the batch
+    still reports them as invalid.
+    """
+    by_product = {}
+    # Invalid rows keep their place; each product's clusters go where its first row was
+    order = []
+    for row in rows:
+        if not isinstance(row, dict) or not isinstance(row.get('keyword'), str) or not row['keyword'].strip():
+            order.append((None, row))
+            continue
+        product = (row.get('product') or 'Files.com').strip()
+        if product not in by_product:
+            by_product[product] = {}
+            order.append((product, None))
+        # First row for each spelling supplies contentLength and other fields
+        by_product[product].setdefault(' '.join(row['keyword'].split()), row)
+
+    clustered = []
+    for product, row in order:
+        if product is None:
+            clustered.append(row)
+            continue
+        product_rows = by_product[product]
+        for cluster in cluster_keywords(list(product_rows), threshold):
+            canonical_row = product_rows[cluster['keyword']]
+            extra = [variant for variant in canonical_row.get('variants') or [] if variant not in cluster['variants']]
+            clustered.append(dict(canonical_row, keyword=cluster['keyword'], variants=cluster['variants'] + extra))
+    return clustered
+
+def main(argv=None):
+    from batch_cli import RowReader
+
+    parser = argparse.ArgumentParser(description='Cluster near-duplicate keywords before generation')
+    parser.add_argument('input', help='CSV with keyword[, product, contentLength] columns, or JSONL with the same keys')
+    parser.add_argument('-o', '--output', required=True, help='JSONL output, one row per cluster (batch_cli.py input)')
+    parser.add_argument('--input-format', choices=('csv', 'jsonl'), help='defaults to the input file extension')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='minimum token Jaccard similarity to merge keywords')
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    rows = [row for _, row, _ in RowReader(args.input, args.input_format).rows()]
+    clustered = cluster_rows(rows, args.threshold)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for row in clustered:
+            f.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    merged = sum(len(row['variants']) for row in clustered if isinstance(row, dict) and row.get('variants'))
+    print(f"✅ {len(rows)} keywords -> {len(clustered)} clusters ({merged} variants merged) in {time.monotonic() - started:.1f}s -> {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
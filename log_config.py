@@ -0,0 +1,57 @@
+import json
+import logging
+import os
+import sys
+
+# Structured logging for the generator modules. Every logger hangs off the
+# 'seo' logger, which writes one line per event to stderr: human-readable by
+# default, or one JSON object per line with LOG_FORMAT=json. Fields passed as
+# logger.info('event', extra={'fields': {...}}) are appended as key=value
+# pairs (text) or merged into the object (json). LOG_LEVEL sets the level.
+
+ROOT_LOGGER = 'seo'
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<7} {record.name} {record.getMessage()}"
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_logging(level=None, fmt=None):
+    """(Re)configure the 'seo' logger; defaults come from LOG_LEVEL / LOG_FORMAT"""
+    root = logging.getLogger(ROOT_LOGGER)
+    level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.getenv('LOG_FORMAT', 'text')).lower()
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(_JsonFormatter() if fmt == 'json' else _TextFormatter())
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+    # Records stay out of the root logger, so a host application's config does not print them twice
+    root.propagate = False
+    return root
+
+def get_logger(name):
+    """Logger for one module, configured on first use"""
+    root = logging.getLogger(ROOT_LOGGER)
+    if not root.handlers:
+        configure_logging()
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
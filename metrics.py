@@ -0,0 +1,216 @@
+import bisect
+import math
+import threading
+import time
+
+# Minimal Prometheus metrics (counters, gauges, histograms) rendered in the
+# text exposition format for /api/metrics. Recording is a dict lookup plus a
+# short critical section, so it is cheap enough for the generation hot path.
+# Values are per process: scrape the long-running server (vercel_app.py or a
+# job worker), not the short-lived serverless handlers.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """All metrics in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, *values):
+        """The child for one combination of label values (created on first use)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(tuple(str(value) for value in values), self._child())
+                self._children[values] = child
+        return child
+
+    def _items(self):
+        # Children are stored under both the caller's and the stringified key; render each once
+        with self._lock:
+            seen = {}
+            for values, child in self._children.items():
+                seen.setdefault(id(child), (tuple(str(value) for value in values), child))
+        return sorted(seen.values(), key=lambda item: item[0])
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    kind = 'counter'
+    _child = _CounterChild
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [f'{self.name}{_label_text(self.labelnames, values)} {_format_value(child.value)}' for values, child in self._items()]
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+class Gauge(_Metric):
+    """Gauge; without labels it can instead read its value from a callback at scrape time"""
+    kind = 'gauge'
+    _child = _GaugeChild
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function = None
+
+    def set_function(self, function):
+        self._function = function
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def samples(self):
+        if self._function is not None:
+            return [f'{self.name} {_format_value(self._function())}']
+        return [f'{self.name}{_label_text(self.labelnames, values)} {_format_value(child.value)}' for values, child in self._items()]
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.started)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        lines = []
+        for values, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_label_text(self.labelnames, values, [("le", _format_value(bound))])} {cumulative}')
+            labels = _label_text(self.labelnames, values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+# Generation
+GENERATION_SECONDS = Histogram('seo_generation_duration_seconds', 'Time to produce one piece of content, cache hits and fallbacks included', ('function', 'content_length'))
+GENERATIONS_IN_FLIGHT = Gauge('seo_generations_in_flight', 'Generator calls currently running', ('function',))
+ARTICLE_ATTEMPTS = Histogram('seo_article_attempts', 'OpenAI attempts (draft, top-ups, regenerations) per generated article', ('content_length',), buckets=(1, 2, 3))
+WORDS_GENERATED = Counter('seo_words_generated_total', 'Words in articles returned by OpenAI', ('content_length',))
+FALLBACKS = Counter('seo_fallbacks_total', 'Template fallbacks by cause (no_api_key or the error type)', ('function', 'cause'))
+GENERATION_ERRORS = Counter('seo_generation_errors_total', 'Failed OpenAI calls by error type', ('function', 'cause'))
+CACHE_HITS = Counter('seo_cache_hits_total', 'Generator results served from the result cache', ('function',))
+COALESCED_CALLS = Counter('seo_coalesced_calls_total', 'Generator calls that joined an identical call already in flight', ('function',))
+CONTENT_FLAGS = Counter('seo_content_flags_total', 'Generated articles flagged by the content index (near_duplicate, template_fallback)', ('flag',))
+
+# OpenAI calls
+OPENAI_TOKENS = Counter('seo_openai_tokens_total', 'Tokens sent (prompt) and received (completion)', ('function', 'direction'))
+OPENAI_COST = Counter('seo_openai_cost_usd_total', 'Estimated OpenAI spend in USD', ('function',))
+OPENAI_CALL_SECONDS = Histogram('seo_openai_call_duration_seconds', 'Latency of successful OpenAI calls', ('function',))
+OPENAI_RETRIES = Counter('seo_openai_retries_total', 'Transport retries by cause', ('cause',))
+OPENAI_IN_FLIGHT = Gauge('seo_openai_requests_in_flight', 'OpenAI requests holding a rate limiter slot')
+HEDGES = Counter('seo_openai_hedges_total', 'Duplicate requests sent for slow short calls', ('function',))
+HEDGE_WINS = Counter('seo_openai_hedge_wins_total', 'Hedged calls answered first by the duplicate', ('function',))
+HEDGES_CAPPED = Counter('seo_openai_hedges_capped_total', 'Hedges skipped because of the hedge rate cap', ('function',))
+
+# HTTP
+HTTP_REQUESTS = Counter('seo_http_requests_total', 'HTTP requests by endpoint and status', ('endpoint', 'status'))
+HTTP_SECONDS = Histogram('seo_http_request_duration_seconds', 'HTTP request latency', ('endpoint',))
+HTTP_IN_FLIGHT = Gauge('seo_http_requests_in_flight', 'HTTP requests being handled')
+
+# Admission control (asgi_app.py)
+ADMISSION_IN_FLIGHT = Gauge('seo_admission_in_flight', 'Generation requests admitted and running')
+ADMISSION_QUEUE_DEPTH = Gauge('seo_admission_queue_depth', 'Generation requests waiting for a slot')
+ADMISSION_WAIT_SECONDS = Histogram('seo_admission_wait_seconds', 'Time queued requests waited for a slot', buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5))
+ADMISSION_REJECTIONS = Counter('seo_admission_rejections_total', 'Requests shed with 503 by reason (queue_full, queue_timeout)', ('reason',))
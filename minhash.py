@@ -0,0 +1,201 @@
+import random
+import struct
+import zlib
+from collections import defaultdict
+
+# MinHash signatures and a banded LSH index, used to find near-duplicate items
+# (keywords, articles) without comparing every pair. Items whose signatures
+# agree on every row of at least one band land in the same bucket and become
+# candidates; callers verify candidates with an exact similarity.
+#
+# Hashes are derived from zlib.crc32 and a fixed seed rather than hash(), so
+# signatures are stable across processes and can be persisted.
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def char_shingles(text, k=3):
+    """Character k-grams of each whitespace-separated token, with word boundary markers"""
+    shingles = set()
+    for token in text.split():
+        token = f' {token} '
+        if len(token) <= k:
+            shingles.add(token)
+        else:
+            shingles.update(token[i:i + k] for i in range(len(token) - k + 1))
+    return shingles
+
+def word_shingles(tokens, k=5):
+    """Overlapping k-word sequences of a token list"""
+    if len(tokens) <= k:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+def jaccard(a, b):
+    """Exact Jaccard similarity of two sets"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+class MinHasher:
+    """num_perm universal hash functions (a * x + b mod p) applied to crc32 shingle hashes.
+
+    Permuted hashes are memoized per shingle (up to cache_size shingles):
+    short n-grams repeat heavily across keywords and documents, and a cached
+    shingle costs one C-level min per permutation instead of num_perm
+    multiplications.
+    """
+
+    def __init__(self, num_perm=64, seed=1, cache_size=1 << 18):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.permutations = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def _hashes(self, shingle):
+        hashes = self._cache.get(shingle)
+        if hashes is None:
+            h = zlib.crc32(shingle.encode('utf-8'))
+            hashes = tuple(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for a, b in self.permutations)
+            if len(self._cache) < self.cache_size:
+                self._cache[shingle] = hashes
+        return hashes
+
+    def signature(self, shingles):
+        """MinHash signature (tuple of num_perm ints) of a set of strings"""
+        if not shingles:
+            return self._hashes('')
+        return tuple(map(min, zip(*map(self._hashes, shingles))))
+
+class OnePermutationHasher:
+    """MinHash signatures from one hash per shingle (one permutation hashing).
+
+    Each shingle's hash picks one of num_perm bins and the signature keeps the
+    smallest value per bin, so a signature costs one hash per shingle instead
+    of num_perm: the hasher for long documents. Empty bins borrow the value of
+    the next filled bin, offset by the distance (rotation densification).
+    Signatures are 32-bit like MinHasher's, but the two are not comparable.
+    """
+
+    def __init__(self, num_perm=64, seed=1):
+        self.num_perm = num_perm
+        self.seed = seed
+        self._span = (_MAX_HASH + 1) // num_perm
+
+    def signature(self, shingles):
+        num_perm = self.num_perm
+        bins = [None] * num_perm
+        for shingle in shingles or ('',):
+            # Multiplicative mixing spreads crc32's linear structure over the bins
+            h = (zlib.crc32(shingle.encode('utf-8'), self.seed) * 0x9E3779B1) & _MAX_HASH
+            position, value = h % num_perm, h // num_perm
+            current = bins[position]
+            if current is None or value < current:
+                bins[position] = value
+        if None not in bins:
+            return tuple(bins)
+        signature = []
+        for position in range(num_perm):
+            distance = 0
+            while bins[(position + distance) % num_perm] is None:
+                distance += 1
+            signature.append(bins[(position + distance) % num_perm] + distance * self._span)
+        return tuple(signature)
+
+def estimate_similarity(signature_a, signature_b):
+    """Jaccard estimate from two signatures of equal length"""
+    return sum(1 for x, y in zip(signature_a, signature_b) if x == y) / len(signature_a)
+
+class LSHIndex:
+    """Banded LSH over MinHash signatures; `bands * rows` must equal the signature length.
+
+    The similarity at which two items become candidates with probability 1/2
+    is roughly (1 / bands) ** (1 / rows).
+    """
+
+    def __init__(self, bands, rows):
+        self.bands = bands
+        self.rows = rows
+        self.buckets = [defaultdict(set) for _ in range(bands)]
+        self.signatures = {}
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, key, signature):
+        self.signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self.buckets[band][band_key].add(key)
+
+    def remove(self, key):
+        signature = self.signatures.pop(key, None)
+        if signature is None:
+            return
+        for band, band_key in self._band_keys(signature):
+            bucket = self.buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band][band_key]
+
+    def query(self, signature):
+        """Keys sharing at least one band with signature"""
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self.buckets[band].get(band_key, ()))
+        return candidates
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, key):
+        return key in self.signatures
+
+class SQLiteLSHIndex:
+    """LSHIndex with its buckets in a SQLite table, for indexes too large to keep in memory.
+
+    Keys are integers. Each band key is stored as the crc32 of its packed rows;
+    a crc collision only adds a candidate, which callers verify anyway. The
+    caller owns the connection and commits.
+    """
+
+    def __init__(self, conn, bands, rows, table='lsh_buckets'):
+        self.conn = conn
+        self.bands = bands
+        self.rows = rows
+        self.table = table
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (band INTEGER NOT NULL, bucket INTEGER NOT NULL, item INTEGER NOT NULL)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_bucket ON {table} (band, bucket)')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_item ON {table} (item)')
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, zlib.crc32(struct.pack(f'<{len(rows)}I', *rows))
+
+    def add(self, key, signature):
+        self.conn.executemany(
+            f'INSERT INTO {self.table} (band, bucket, item) VALUES (?, ?, ?)',
+            [(band, bucket, key) for band, bucket in self._band_keys(signature)]
+        )
+
+    def remove(self, key):
+        self.conn.execute(f'DELETE FROM {self.table} WHERE item = ?', (key,))
+
+    def query(self, signature, limit=None):
+        """Keys sharing at least one band with signature; with `limit`, the keys sharing the most bands first"""
+        clauses = ' OR '.join(['(band = ? AND bucket = ?)'] * self.bands)
+        values = [value for band_key in self._band_keys(signature) for value in band_key]
+        sql = f'SELECT item FROM {self.table} WHERE {clauses} GROUP BY item'
+        if limit is not None:
+            sql += ' ORDER BY COUNT(*) DESC, item LIMIT ?'
+            values.append(limit)
+        return {item for (item,) in self.conn.execute(sql, values)}
+
+    def __len__(self):
+        return self.conn.execute(f'SELECT COUNT(DISTINCT item) FROM {self.table}').fetchone()[0]
+
+    def __contains__(self, key):
+        return self.conn.execute(f'SELECT 1 FROM {self.table} WHERE item = ? LIMIT 1', (key,)).fetchone() is not None
@@ -0,0 +1,219 @@
+import asyncio
+import contextlib
+import contextvars
+import importlib.util
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+
+import metrics
+from log_config import get_logger
+
+# HTTP transport for the OpenAI clients: a tuned keep-alive connection pool
+# (HTTP/2 when the h2 package is installed), per-call timeouts sized by
+# max_tokens and clipped to the request deadline, and jittered exponential
+# retries for transient errors only. The SDK's own retries are disabled.
+#
+# httpx and openai are imported on first use: they dominate a serverless cold
+# start, and handlers that never call OpenAI should not pay for them.
+
+logger = get_logger('openai_transport')
+
+MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '64'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', '32'))
+KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', '30'))
+CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', '5'))
+# Read timeout = base + max_tokens / slowest acceptable generation speed
+READ_TIMEOUT_BASE = float(os.getenv('OPENAI_READ_TIMEOUT_BASE', '15'))
+MIN_TOKENS_PER_SECOND = float(os.getenv('OPENAI_MIN_TOKENS_PER_SECOND', '20'))
+MAX_READ_TIMEOUT = float(os.getenv('OPENAI_MAX_READ_TIMEOUT', '240'))
+MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '3'))
+RETRY_BASE_DELAY = float(os.getenv('OPENAI_RETRY_BASE_DELAY', '0.5'))
+RETRY_MAX_DELAY = float(os.getenv('OPENAI_RETRY_MAX_DELAY', '8'))
+# Overall budget for a serverless request (e.g. the platform's function timeout
+# minus a margin); calls that cannot finish in time fail fast instead
+REQUEST_DEADLINE = float(os.environ['REQUEST_DEADLINE_SECONDS']) if os.getenv('REQUEST_DEADLINE_SECONDS') else None
+
+TRANSIENT_STATUS_CODES = (408, 409, 429, 500, 502, 503, 504)
+
+_deadline = contextvars.ContextVar('openai_deadline', default=None)
+_http_clients = weakref.WeakSet()
+_stats_lock = threading.Lock()
+_stats = {'calls': 0, 'retries': 0, 'retries_by_cause': {}, 'deadline_exceeded': 0}
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting (or retrying) a call once the request deadline has passed"""
+
+@contextlib.contextmanager
+def request_deadline(seconds):
+    """Bound every OpenAI call made inside the block (including retries) to `seconds` from now.
+
+    A no-op when seconds is None. Nested deadlines keep the earliest one.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + float(seconds)
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_time():
+    """Seconds left before the request deadline, or None when no deadline is set"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+_http2 = None
+
+def http2_available():
+    """Whether the h2 package is installed (checked once, on first use)"""
+    global _http2
+    if _http2 is None:
+        _http2 = importlib.util.find_spec('h2') is not None
+    return _http2
+
+def _limits():
+    import httpx
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+
+def _default_timeout():
+    import httpx
+    return httpx.Timeout(MAX_READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+def build_http_client():
+    """Pooled httpx.Client for the blocking OpenAI client"""
+    import httpx
+    http_client = httpx.Client(limits=_limits(), http2=http2_available(), timeout=_default_timeout())
+    _http_clients.add(http_client)
+    return http_client
+
+def build_async_http_client():
+    """Pooled httpx.AsyncClient for an AsyncOpenAI client"""
+    import httpx
+    http_client = httpx.AsyncClient(limits=_limits(), http2=http2_available(), timeout=_default_timeout())
+    _http_clients.add(http_client)
+    return http_client
+
+def call_timeout(max_tokens):
+    """Timeout for one call sized by its completion budget and clipped to the request deadline"""
+    read = min(READ_TIMEOUT_BASE + (max_tokens or 0) / MIN_TOKENS_PER_SECOND, MAX_READ_TIMEOUT)
+    connect = CONNECT_TIMEOUT
+    remaining = remaining_time()
+    if remaining is not None:
+        if remaining <= 0:
+            with _stats_lock:
+                _stats['deadline_exceeded'] += 1
+            raise DeadlineExceeded('Request deadline exceeded before calling OpenAI')
+        read = min(read, remaining)
+        connect = min(connect, remaining)
+    import httpx
+    return httpx.Timeout(read, connect=connect, write=min(10.0, read), pool=connect)
+
+def _sdk():
+    # An error can only come from the SDK once something has imported it
+    return sys.modules.get('openai')
+
+def is_transient(error):
+    """Connection failures, timeouts, 429s and 5xx are worth retrying; other errors are not"""
+    openai = _sdk()
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return True
+    return getattr(error, 'status_code', None) in TRANSIENT_STATUS_CODES
+
+def _retry_cause(error):
+    openai = _sdk()
+    if openai is not None and isinstance(error, openai.APITimeoutError):
+        return 'timeout'
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return 'connection'
+    return str(getattr(error, 'status_code', 'other'))
+
+def backoff_delay(attempt, error):
+    """Full-jitter exponential backoff; 429s retry at once because the rate limiter already paused for Retry-After"""
+    if getattr(error, 'status_code', None) == 429:
+        return 0.0
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+def _should_retry(attempt, error):
+    """Return the backoff delay before the next attempt, or None to give up"""
+    if not is_transient(error) or attempt >= MAX_RETRIES:
+        return None
+    delay = backoff_delay(attempt, error)
+    remaining = remaining_time()
+    if remaining is not None and delay >= remaining:
+        return None
+    with _stats_lock:
+        _stats['retries'] += 1
+        cause = _retry_cause(error)
+        _stats['retries_by_cause'][cause] = _stats['retries_by_cause'].get(cause, 0) + 1
+    metrics.OPENAI_RETRIES.labels(cause).inc()
+    logger.info('OpenAI transient error, retrying', extra={'fields': {'cause': cause, 'retry': attempt + 1, 'max_retries': MAX_RETRIES, 'delay': round(delay, 2)}})
+    return delay
+
+def call_with_retries(send, max_tokens):
+    """Run send(timeout) with per-call timeouts and retries for transient errors"""
+    with _stats_lock:
+        _stats['calls'] += 1
+    attempt = 0
+    while True:
+        try:
+            return send(call_timeout(max_tokens))
+        except Exception as e:
+            delay = _should_retry(attempt, e)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+
+async def call_with_retries_async(send, max_tokens):
+    """Async variant of call_with_retries; send(timeout) must return an awaitable"""
+    with _stats_lock:
+        _stats['calls'] += 1
+    attempt = 0
+    while True:
+        try:
+            return await send(call_timeout(max_tokens))
+        except Exception as e:
+            delay = _should_retry(attempt, e)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+
+def pool_stats():
+    """Connection pool and retry statistics across every client built by this module"""
+    clients = connections = in_use = idle = 0
+    for http_client in list(_http_clients):
+        if http_client.is_closed:
+            continue
+        clients += 1
+        # httpx does not expose pool state publicly; read it from the httpcore
+        # pool, and report only the client count if a release moves it
+        try:
+            idle_flags = [connection.is_idle() for connection in http_client._transport._pool.connections]
+        except AttributeError:
+            continue
+        connections += len(idle_flags)
+        idle += sum(idle_flags)
+        in_use += len(idle_flags) - sum(idle_flags)
+    with _stats_lock:
+        stats = dict(_stats, retries_by_cause=dict(_stats['retries_by_cause']))
+    stats.update(
+        clients=clients,
+        connections=connections,
+        in_use=in_use,
+        idle=idle,
+        http2=http2_available(),
+        max_connections=MAX_CONNECTIONS
+    )
+    return stats
@@ -0,0 +1,196 @@
+import functools
+import string
+
+# Versioned prompt templates for content_with_ai.py. Every template puts its
+# static instructions first and the per-row values (keyword, title, ...) last,
+# so the requests of a bulk run for one product share a long identical prefix
+# that the provider can serve from its prompt cache. The static part is
+# compiled once per product and content length.
+#
+# Bump a function's version whenever the wording of any of its templates (or
+# of LENGTH_WORDING, for full_article) changes: the version id is part of the
+# result cache key and goes out with every result.
+
+# Prompt wording per content length; token budgets are in content_with_ai
+LENGTH_WORDING = {
+    'short': {
+        'word_count': 'EXACTLY 500-800 words',
+        'sections': 'EXACTLY 3-4 main sections',
+        'detail_level': 'concise and focused',
+        'style': 'Keep paragraphs short (2-3 sentences each). Be direct and to the point. Focus on essential information only.',
+        'structure': 'Introduction, 2-3 main sections, Conclusion'
+    },
+    'medium': {
+        'word_count': 'EXACTLY 800-1200 words',
+        'sections': 'EXACTLY 4-5 main sections',
+        'detail_level': 'balanced with good detail',
+        'style': 'Use medium-length paragraphs (3-4 sentences each). Provide good detail with examples.',
+        'structure': 'Introduction, 3-4 main sections, Conclusion'
+    },
+    'long': {
+        'word_count': 'EXACTLY 1200-2000 words',
+        'sections': 'EXACTLY 5-6 main sections',
+        'detail_level': 'comprehensive and detailed',
+        'style': 'Use longer paragraphs (4-5 sentences each). Include detailed explanations, examples, and case studies.',
+        'structure': 'Introduction, 4-5 main sections, Conclusion'
+    },
+    'comprehensive': {
+        'word_count': 'EXACTLY 2000+ words',
+        'sections': 'EXACTLY 6+ main sections',
+        'detail_level': 'extremely comprehensive with extensive detail',
+        'style': 'Use comprehensive paragraphs (5+ sentences each). Include extensive examples, case studies, and detailed analysis.',
+        'structure': 'Introduction, 5+ main sections, Conclusion'
+    }
+}
+
+class Prompt:
+    """A system message and the static start of the user message, plus the per-row tail of the user message.
+
+    system and user may use {product}, the content length's wording and the
+    static values given to render(); row holds the values of one call.
+    """
+
+    def __init__(self, system, user, row):
+        self.system = system
+        self.user = user
+        self.row = row
+
+_KEYWORD_ROW = "Keyword: {keyword}"
+_ARTICLE_ROW = "Keyword: {keyword}\nTitle: {title}{variants}"
+
+_ARTICLE_SYSTEM = "You are an expert content writer specializing in SEO articles for {product}. Write {detail_level}, well-structured articles in markdown format that are specifically tailored for {product}'s audience, brand voice, and expertise. {style} Use a balanced mix of paragraph text and bulleted lists to improve readability and engagement. Include headings, subheadings, bullet points, and engaging content that provides real value to {product}'s readers and potential customers."
+_ARTICLE_USER = "Write a {detail_level} article for {product}'s website about the keyword below, with the title below. The article should have {sections}. Follow this structure: {structure}. Write the article in markdown format with proper headings (H1, H2, H3). {style} Include practical tips, examples, and actionable advice that are relevant to {product}'s audience and expertise. The content should reflect {product}'s brand voice and market position. Use bullet points for lists of features, benefits, steps, or tips, and use paragraphs for explanations and context."
+
+_TOP_UP_ROW = "Keyword: {keyword}\nTitle: {title}\nWords to add: {extra_words}\n\n{text}"
+
+_PART_USER = "You are writing one part of an article for {product}'s website; its keyword, title and outline are below. {task} Write about the number of words given below, in markdown. {style} Start with the part's '## ' heading line as given and use only ### for subheadings. Use bullet points for lists of features, benefits, steps, or tips, and paragraphs for explanations and context."
+_PART_ROW = "Keyword: {keyword}\nTitle: {title}\nOutline:\n{plan}\n\nPart: ## {heading}{covering}\nWords: {words}"
+
+# function -> (version, {template name: Prompt})
+REGISTRY = {
+    'content_brief': (2, {
+        'default': Prompt(
+            "You are an expert content strategist for {product}. Create a detailed content brief for SEO articles that are specifically tailored for {product}'s audience and brand voice. Focus on providing clear direction for content creation that aligns with {product}'s expertise and market position. Include guidance for content structure with a mix of paragraphs and bulleted lists.",
+            "Create a comprehensive content brief for an article about the keyword below that will be published on {product}'s website. Include target audience, key topics to cover, tone, content structure (mix of paragraphs and bulleted lists), and specific sections to include. Keep it concise but detailed. Make sure the content aligns with {product}'s brand and expertise.",
+            _KEYWORD_ROW
+        )
+    }),
+    'article_title': (2, {
+        'default': Prompt(
+            "You are an expert SEO copywriter for {product}. Create compelling, SEO-friendly article titles that are engaging, click-worthy, and aligned with {product}'s brand voice and expertise. Return only ONE title without quotation marks.",
+            "Create ONE compelling article title for the keyword below that will be published on {product}'s website. Make it SEO-friendly, engaging, and click-worthy. The title should reflect {product}'s expertise and appeal to their target audience. Return only the title without any quotation marks or numbering.",
+            _KEYWORD_ROW
+        )
+    }),
+    'meta_title': (2, {
+        'default': Prompt(
+            "You are an SEO expert for {product}. Create compelling meta titles that are under 60 characters, include the target keyword, and are optimized for {product}'s brand and audience. Return titles without quotation marks.",
+            "Create a compelling meta title for the keyword below that will be used on {product}'s website. It should be under 60 characters, include the keyword, and be click-worthy. Make it relevant to {product}'s expertise and audience. Return without quotation marks.",
+            _KEYWORD_ROW
+        )
+    }),
+    'meta_description': (2, {
+        'default': Prompt(
+            "You are an SEO expert for {product}. Create compelling meta descriptions that are under 160 characters, include the target keyword, and are optimized for {product}'s brand and audience.",
+            "Create a compelling meta description for the keyword below that will be used on {product}'s website. It should be under 160 characters, include the keyword, and be engaging and click-worthy. Make it relevant to {product}'s expertise and audience.",
+            _KEYWORD_ROW
+        )
+    }),
+    'metadata': (2, {
+        'default': Prompt(
+            "You are an SEO expert and copywriter for {product}. Respond with a JSON object containing exactly these string fields: {fields}. Field rules - {rules}. Everything must be aligned with {product}'s brand voice, expertise and audience. Do not wrap values in quotation marks or add numbering.",
+            "Create the metadata for an article about the keyword below that will be published on {product}'s website.",
+            _KEYWORD_ROW
+        )
+    }),
+    'full_article': (2, {
+        'draft': Prompt(
+            _ARTICLE_SYSTEM,
+            _ARTICLE_USER + " INCLUDE DETAILED EXAMPLES, CASE STUDIES, AND COMPREHENSIVE EXPLANATIONS FOR EACH SECTION.",
+            _ARTICLE_ROW
+        ),
+        'regenerate': Prompt(
+            _ARTICLE_SYSTEM + " EXPAND EVERY SECTION WITH MORE DETAIL!",
+            _ARTICLE_USER + " ADD MORE DETAIL TO EVERY SECTION! INCLUDE MORE EXAMPLES, CASE STUDIES, AND DETAILED EXPLANATIONS!",
+            _ARTICLE_ROW
+        ),
+        'top_up': Prompt(
+            _ARTICLE_SYSTEM,
+            "An article for {product}'s website is too short; its keyword, title and the sections that need more depth are below. For EACH section, write the given number of words to add as NEW content that continues it: additional paragraphs, examples, or bullet points relevant to {product}'s audience. Do not repeat or rewrite the existing text. Start each continuation with the section's exact '## ' heading line as given, and output only the continuations.",
+            _TOP_UP_ROW
+        ),
+        'continue': Prompt(
+            _ARTICLE_SYSTEM,
+            "An article for {product}'s website is too short; its keyword, title and text are below. Continue it with the given number of words of NEW content that fits its structure and tone, using ## headings for any new sections. Do not repeat or rewrite the existing text.",
+            _TOP_UP_ROW
+        ),
+        'outline': Prompt(
+            "You are an expert content strategist for {product}. Plan SEO articles that are tailored for {product}'s audience, brand voice, and expertise. Respond with a JSON object with one field, sections: a list of objects, each with a heading string and a points list of 2-4 short strings saying what the section covers.",
+            "Plan a {detail_level} article for {product}'s website about the keyword below, with the title below. It follows this structure: {structure}. List only the {count} main sections in reading order; the introduction and conclusion are written separately. Headings must be distinct and not numbered.",
+            _ARTICLE_ROW
+        ),
+        'introduction': Prompt(
+            _ARTICLE_SYSTEM,
+            _PART_USER.replace('{task}', "Write only the introduction: open with why the keyword matters to {product}'s audience and preview what the article covers."),
+            _PART_ROW
+        ),
+        'section': Prompt(
+            _ARTICLE_SYSTEM,
+            _PART_USER.replace('{task}', "Write only the section named below, covering the points listed with it. Do not introduce or conclude the whole article, and leave the other sections' topics to them."),
+            _PART_ROW
+        ),
+        'conclusion': Prompt(
+            _ARTICLE_SYSTEM,
+            _PART_USER.replace('{task}', "Write only the conclusion: sum up the key takeaways and end with a clear next step for {product}'s readers."),
+            _PART_ROW
+        )
+    })
+}
+
+_STATIC_FIELDS = {'product', 'fields', 'rules', 'count'} | set(LENGTH_WORDING['medium'])
+_ROW_FIELDS = {'keyword', 'title', 'variants', 'extra_words', 'text', 'plan', 'heading', 'covering', 'words'}
+
+def _fields(template):
+    return {field for _, field, _, _ in string.Formatter().parse(template) if field}
+
+def _check(function, name, prompt):
+    """Static templates must not use row values, or the shared prefix would vary per row"""
+    unknown = (_fields(prompt.system) | _fields(prompt.user)) - _STATIC_FIELDS
+    unknown |= _fields(prompt.row) - _ROW_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown fields in prompt {function}.{name}: {', '.join(sorted(unknown))}")
+
+for _function, (_, _templates) in REGISTRY.items():
+    for _name, _prompt in _templates.items():
+        _check(_function, _name, _prompt)
+
+def version_id(function, content_length=None):
+    """Id of the prompts a function's result was generated with, e.g. 'article_title@2' or 'full_article/long@2'.
+
+    None for functions without prompts of their own (e.g. all_content).
+    """
+    if function not in REGISTRY:
+        return None
+    version, _ = REGISTRY[function]
+    return f"{function}/{content_length}@{version}" if content_length else f"{function}@{version}"
+
+@functools.lru_cache(maxsize=1024)
+def _compiled(function, name, product, content_length, static):
+    """(system, user prefix) of one template with the product, length wording and static values filled in"""
+    prompt = REGISTRY[function][1][name]
+    values = dict(LENGTH_WORDING.get(content_length, LENGTH_WORDING['medium']), product=product, **dict(static))
+    return prompt.system.format_map(values), prompt.user.format_map(values)
+
+def render(function, product, content_length=None, template='default', static=None, **row):
+    """Chat messages for one call: the compiled static prefix, then this call's row values"""
+    system, user = _compiled(function, template, product, content_length, tuple(sorted((static or {}).items())))
+    return [
+        {
+            "role": "system",
+            "content": system
+        },
+        {
+            "role": "user",
+            "content": user + "\n\n" + REGISTRY[function][1][template].row.format_map(row)
+        }
+    ]
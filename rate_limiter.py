@@ -0,0 +1,281 @@
+import asyncio
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+from token_counter import count_message_tokens
+
+# Client-side limiter for OpenAI calls: request-per-minute and token-per-minute
+# token buckets plus an AIMD concurrency limit that halves on 429s and creeps
+# back up on success. Bucket state can optionally live in a SQLite file so that
+# several worker processes on one box share a single budget.
+
+def estimate_tokens(messages, max_tokens=None):
+    """Pre-call token cost: locally counted prompt tokens plus the completion budget"""
+    return count_message_tokens(messages) + (max_tokens or 0)
+
+def is_rate_limit_error(error):
+    return getattr(error, 'status_code', None) == 429
+
+def retry_after_seconds(error):
+    """Read Retry-After (or retry-after-ms) from an OpenAI error response, if present"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+class TokenBucket:
+    """Continuously refilling bucket; a request larger than the capacity may overdraw it"""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.time()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` can be taken (0 if it can be taken now)"""
+        needed = min(amount, self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+class _Call:
+    """Handle yielded by RateLimiter.limit; record the response to reconcile token estimates"""
+
+    def __init__(self):
+        self.actual_tokens = None
+
+    def record(self, response):
+        usage = getattr(response, 'usage', None)
+        if usage is not None and getattr(usage, 'total_tokens', None) is not None:
+            self.actual_tokens = usage.total_tokens
+
+class RateLimiter:
+    """RPM/TPM token buckets with an AIMD concurrency limit"""
+
+    def __init__(self, requests_per_minute=3500, tokens_per_minute=90000, max_concurrency=16, min_concurrency=1, shared_path=None):
+        self.buckets = {
+            'requests': TokenBucket(requests_per_minute),
+            'tokens': TokenBucket(tokens_per_minute)
+        }
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.shared_path = shared_path
+        self.stats = {'requests': 0, 'rate_limited': 0, 'throttled_seconds': 0.0, 'tokens_used': 0}
+        self._lock = threading.Lock()
+        self._slots = threading.Condition(self._lock)
+        self._file_lock = threading.Lock()
+        self._conn = None
+
+    @classmethod
+    def from_env(cls):
+        """Build the limiter from OPENAI_RPM / OPENAI_TPM / OPENAI_*_CONCURRENCY / OPENAI_RATE_LIMIT_FILE"""
+        return cls(
+            requests_per_minute=int(os.getenv('OPENAI_RPM', '3500')),
+            tokens_per_minute=int(os.getenv('OPENAI_TPM', '90000')),
+            max_concurrency=int(os.getenv('OPENAI_MAX_CONCURRENCY', '16')),
+            min_concurrency=int(os.getenv('OPENAI_MIN_CONCURRENCY', '1')),
+            shared_path=os.getenv('OPENAI_RATE_LIMIT_FILE') or None
+        )
+
+    # Budget ---------------------------------------------------------------
+
+    def _shared_connection(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.shared_path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute('CREATE TABLE IF NOT EXISTS limiter_state (name TEXT PRIMARY KEY, value REAL NOT NULL, updated REAL NOT NULL)')
+            self._conn = conn
+        return self._conn
+
+    @contextlib.contextmanager
+    def _state(self):
+        """Hold the limiter state for a read-modify-write, synced with the shared file if configured"""
+        if not self.shared_path:
+            with self._lock:
+                yield
+            return
+        # The file transaction can wait out the busy timeout while another
+        # process holds it, so it has a lock of its own; _lock (and the slot
+        # Condition built on it) is only held while the state is in memory
+        with self._file_lock:
+            conn = self._shared_connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = {name: (value, updated) for name, value, updated in conn.execute('SELECT name, value, updated FROM limiter_state')}
+                with self._lock:
+                    for name, bucket in self.buckets.items():
+                        if name in rows:
+                            bucket.tokens, bucket.updated = rows[name]
+                    if 'cooldown_until' in rows:
+                        self.cooldown_until = rows['cooldown_until'][0]
+                    yield
+                    state = [(name, bucket.tokens, bucket.updated) for name, bucket in self.buckets.items()]
+                    state.append(('cooldown_until', self.cooldown_until, time.time()))
+                conn.executemany('INSERT OR REPLACE INTO limiter_state (name, value, updated) VALUES (?, ?, ?)', state)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+
+    def _try_reserve(self, tokens):
+        """Consume budget for one call and return 0, or return the seconds to wait without consuming"""
+        with self._state():
+            now = time.time()
+            if self.cooldown_until > now:
+                return self.cooldown_until - now
+            amounts = {'requests': 1, 'tokens': tokens}
+            for bucket in self.buckets.values():
+                bucket.refill(now)
+            wait = max(bucket.wait_time(amounts[name]) for name, bucket in self.buckets.items())
+            if wait > 0:
+                return wait
+            for name, bucket in self.buckets.items():
+                bucket.tokens -= amounts[name]
+            return 0.0
+
+    def _reconcile(self, estimated_tokens, actual_tokens):
+        # Return over-estimated tokens to the bucket (or charge the shortfall)
+        if actual_tokens is None:
+            return
+        with self._lock:
+            self.stats['tokens_used'] += actual_tokens
+        with self._state():
+            bucket = self.buckets['tokens']
+            bucket.tokens = min(bucket.capacity, bucket.tokens + estimated_tokens - actual_tokens)
+
+    # Concurrency ----------------------------------------------------------
+
+    def _try_take_slot(self):
+        if self.in_flight < max(self.min_concurrency, int(self.concurrency_limit)):
+            self.in_flight += 1
+            return True
+        return False
+
+    def _release(self, outcome, retry_after=None):
+        with self._slots:
+            self.in_flight -= 1
+            if outcome == 'rate_limited':
+                # Multiplicative decrease, and pause everyone until Retry-After
+                self.stats['rate_limited'] += 1
+                self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2)
+            elif outcome == 'ok':
+                # Additive increase: roughly +1 slot per window of successful calls
+                self.concurrency_limit = min(float(self.max_concurrency), self.concurrency_limit + 1 / self.concurrency_limit)
+            self._slots.notify_all()
+        if outcome == 'rate_limited':
+            with self._state():
+                self.cooldown_until = max(self.cooldown_until, time.time() + (retry_after or 1.0))
+
+    # Public API -----------------------------------------------------------
+
+    def acquire(self, estimated_tokens):
+        """Block until a concurrency slot and enough RPM/TPM budget are available"""
+        started = time.monotonic()
+        with self._slots:
+            while not self._try_take_slot():
+                self._slots.wait()
+        try:
+            while True:
+                wait = self._try_reserve(estimated_tokens)
+                if wait <= 0:
+                    break
+                time.sleep(min(wait, 1.0))
+        except BaseException:
+            self._release('error')
+            raise
+        self._record_start(started)
+
+    async def _off_loop(self, function, *args):
+        # With a shared state file every reservation is a SQLite write
+        # transaction that may wait out its busy timeout, so it runs in a
+        # thread; the in-process state is only a short lock and stays inline
+        if self.shared_path:
+            return await asyncio.to_thread(function, *args)
+        return function(*args)
+
+    async def acquire_async(self, estimated_tokens):
+        """Async variant of acquire; polls, and syncs shared state in a thread, so it never blocks the event loop"""
+        started = time.monotonic()
+        while True:
+            with self._slots:
+                if self._try_take_slot():
+                    break
+            await asyncio.sleep(0.05)
+        try:
+            while True:
+                wait = await self._off_loop(self._try_reserve, estimated_tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(min(wait, 1.0))
+        except BaseException:
+            self._release('error')
+            raise
+        self._record_start(started)
+
+    def _record_start(self, started):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['throttled_seconds'] += time.monotonic() - started
+
+    def _finish(self, call, estimated_tokens, error=None):
+        if error is None:
+            self._release('ok')
+            self._reconcile(estimated_tokens, call.actual_tokens)
+        elif is_rate_limit_error(error):
+            self._release('rate_limited', retry_after_seconds(error))
+        else:
+            self._release('error')
+
+    @contextlib.contextmanager
+    def limit(self, estimated_tokens):
+        """Wrap one blocking API call: `with limiter.limit(n) as call: ...; call.record(response)`"""
+        self.acquire(estimated_tokens)
+        call = _Call()
+        try:
+            yield call
+        except BaseException as e:
+            self._finish(call, estimated_tokens, e)
+            raise
+        self._finish(call, estimated_tokens)
+
+    @contextlib.asynccontextmanager
+    async def limit_async(self, estimated_tokens):
+        """Async variant of limit"""
+        await self.acquire_async(estimated_tokens)
+        call = _Call()
+        try:
+            yield call
+        except BaseException as e:
+            await self._off_loop(self._finish, call, estimated_tokens, e)
+            raise
+        await self._off_loop(self._finish, call, estimated_tokens)
+
+    def snapshot(self):
+        """Current limiter state, for logging and monitoring"""
+        with self._lock:
+            return dict(
+                self.stats,
+                in_flight=self.in_flight,
+                concurrency_limit=round(self.concurrency_limit, 2),
+                request_budget=round(self.buckets['requests'].tokens, 1),
+                token_budget=round(self.buckets['tokens'].tokens, 1),
+                cooldown_remaining=max(0.0, round(self.cooldown_until - time.time(), 2))
+            )
+
+limiter = RateLimiter.from_env()
+metrics.OPENAI_IN_FLIGHT.set_function(lambda: limiter.in_flight)
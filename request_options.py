@@ -0,0 +1,24 @@
+# Request options shared by the Flask app, the ASGI app, the serverless
+# functions in api/ and the job queue. Standard library only, so it imports
+# even when the generation modules cannot.
+
+_TRUE = ('1', 'true', 'yes', 'on')
+_FALSE = ('0', 'false', 'no', 'off')
+
+def parse_flag(value, default=False):
+    """A boolean option sent as true/false, 1/0 or their string forms; `default` when missing or unrecognized.
+
+    JSON clients and query strings send "false" as often as false, and
+    bool("false") would turn it on.
+    """
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+    return default
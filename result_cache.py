@@ -0,0 +1,195 @@
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from log_config import get_logger
+from request_options import parse_flag
+
+# Two-tier cache for generated content: a bounded in-memory LRU in front of a
+# persistent SQLite store. Only successful OpenAI results are stored, so the
+# template fallbacks are never served from cache.
+
+# SQLite hits note their access time in memory; the LRU order on disk is
+# updated in one transaction per ACCESS_FLUSH_SIZE hits (or with the next write)
+ACCESS_FLUSH_SIZE = 100
+
+logger = get_logger('result_cache')
+
+CACHE_USE = 'use'          # read from and write to the cache
+CACHE_BYPASS = 'bypass'    # neither read nor write
+CACHE_REFRESH = 'refresh'  # skip reads, overwrite with the fresh result
+
+_cache_mode = contextvars.ContextVar('cache_mode', default=CACHE_USE)
+
+@contextlib.contextmanager
+def cache_mode(mode):
+    """Set the cache mode for generator calls made inside the block (and tasks it starts)"""
+    token = _cache_mode.set(mode or CACHE_USE)
+    try:
+        yield
+    finally:
+        _cache_mode.reset(token)
+
+def current_cache_mode():
+    """The cache mode in effect for the current context"""
+    return _cache_mode.get()
+
+def cache_mode_from_request(data):
+    """Map the bypassCache / refreshCache request flags to a cache mode"""
+    if parse_flag(data.get('bypassCache')):
+        return CACHE_BYPASS
+    if parse_flag(data.get('refreshCache')):
+        return CACHE_REFRESH
+    return CACHE_USE
+
+def normalize_keyword(keyword):
+    """Lowercase and collapse whitespace so trivially different keywords share an entry"""
+    return ' '.join(keyword.lower().split())
+
+def make_key(function, keyword, product, content_length=None, model=None, prompt_version=None, extra=None):
+    """Build a stable cache key from the inputs that determine a generator's output"""
+    parts = [function, normalize_keyword(keyword), product.strip(), content_length, model, prompt_version, extra]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+class ResultCache:
+    """In-memory LRU backed by SQLite, with TTL and size-based eviction in both tiers"""
+
+    def __init__(self, path=None, memory_size=512, ttl=7 * 24 * 3600, max_entries=50000, enabled=True):
+        self.path = path
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        self._reads = 0
+        self._accessed = {}
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from CONTENT_CACHE_* environment variables"""
+        return cls(
+            path=os.getenv('CONTENT_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'seo_content_cache.sqlite3')),
+            memory_size=int(os.getenv('CONTENT_CACHE_MEMORY_SIZE', '512')),
+            ttl=int(os.getenv('CONTENT_CACHE_TTL', str(7 * 24 * 3600))),
+            max_entries=int(os.getenv('CONTENT_CACHE_MAX_ENTRIES', '50000')),
+            enabled=os.getenv('CONTENT_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+        )
+
+    def _connection(self):
+        # Opened lazily so importing the module stays cheap; falls back to
+        # memory-only caching if the database cannot be opened.
+        if self._conn is None and self.path:
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)')
+                conn.execute('CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)')
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Result cache database unavailable ({e}), using memory only")
+                self.path = None
+        return self._conn
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or when the cache mode skips reads"""
+        if not self.enabled or _cache_mode.get() != CACHE_USE:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    return value
+                del self._memory[key]
+
+            conn = self._connection()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute('SELECT value, expires_at FROM results WHERE key = ?', (key,)).fetchone()
+                # Expired rows are left for _evict
+                if row is None or row[1] <= now:
+                    return None
+                self._accessed[key] = now
+                self._reads += 1
+                if self._reads % ACCESS_FLUSH_SIZE == 0:
+                    self._flush_access(conn)
+                    conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Result cache read failed: {e}")
+                return None
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            return value
+
+    def set(self, key, value):
+        """Store value under key unless the cache mode is bypass"""
+        if not self.enabled or _cache_mode.get() == CACHE_BYPASS:
+            return
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                self._flush_access(conn)
+                conn.execute(
+                    'INSERT OR REPLACE INTO results (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)',
+                    (key, json.dumps(value), expires_at, now)
+                )
+                conn.commit()
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._evict(conn, now)
+            except sqlite3.Error as e:
+                logger.warning(f"Result cache write failed: {e}")
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _flush_access(self, conn):
+        # Part of the caller's transaction; the caller commits
+        if self._accessed:
+            conn.executemany('UPDATE results SET last_access = ? WHERE key = ?', [(at, key) for key, at in self._accessed.items()])
+            self._accessed.clear()
+
+    def _evict(self, conn, now):
+        """Drop expired rows, then the least recently used rows beyond max_entries"""
+        conn.execute('DELETE FROM results WHERE expires_at <= ?', (now,))
+        (count,) = conn.execute('SELECT COUNT(*) FROM results').fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                'DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_access LIMIT ?)',
+                (count - self.max_entries,)
+            )
+        conn.commit()
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            self._accessed.clear()
+            conn = self._connection()
+            if conn is not None:
+                conn.execute('DELETE FROM results')
+                conn.commit()
+
+cache = ResultCache.from_env()
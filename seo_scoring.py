@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+SEO quality scores for generated articles, computed over whole batches.
+
+Each article is tokenized once into a row of counts (words, sentences,
+syllables, keyword hits, headings, list items, paragraphs, meta lengths).
+The checks then run column-wise over the batch with NumPy when it is
+installed; without it the same formulas run per article on plain floats.
+
+    python seo_scoring.py results.jsonl -o scored.jsonl --regenerate regenerate.jsonl [--min-score 60]
+
+Checks (each 0-1, weighted into a 0-100 score): keyword density, heading
+structure, Flesch reading ease, meta title and meta description length, and
+the share of list items among text blocks. Rows under --min-score, failed
+rows and rows flagged by content_index.py go to the --regenerate file as
+batch_cli.py input.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+MIN_SCORE = float(os.getenv('SEO_SCORE_MIN', '60'))
+# A check under this is reported as an issue
+ISSUE_BELOW = 0.5
+MAX_SCORE_ITEMS = int(os.getenv('SEO_SCORE_MAX_ITEMS', '10000'))
+
+# (low, high, tolerance): full marks inside [low, high], falling to 0 at `tolerance` outside it
+KEYWORD_DENSITY = (0.5, 2.5, 0.5)
+READING_EASE = (45.0, 80.0, 25.0)
+# The prompts ask for meta titles under 60 and descriptions under 160 characters
+META_TITLE_LENGTH = (30, 60, 15)
+META_DESCRIPTION_LENGTH = (110, 160, 50)
+LIST_RATIO = (0.15, 0.6, 0.2)
+H1_COUNT = (1, 1, 1)
+H2_COUNT = (3, 12, 3)
+
+WEIGHTS = {
+    'keyword_density': 0.2,
+    'headings': 0.2,
+    'readability': 0.2,
+    'meta_title': 0.15,
+    'meta_description': 0.15,
+    'list_ratio': 0.1
+}
+
+FEATURES = ('words', 'sentences', 'syllables', 'keyword_hits', 'keyword_words', 'h1', 'h2', 'heading_skips',
+            'list_items', 'paragraphs', 'meta_title_length', 'meta_description_length')
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_SENTENCE_END = re.compile(r'[.!?]+(?=\s|$)')
+_VOWEL_GROUP = re.compile(r'[aeiouy]+')
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+_LIST_ITEM = re.compile(r'^(?:[-*+]|\d+[.)])\s+(.*)$')
+
+_numpy_module = None
+_numpy_loaded = False
+
+def _numpy():
+    """NumPy, or None when it is not installed; imported on first use"""
+    global _numpy_module, _numpy_loaded
+    if not _numpy_loaded:
+        _numpy_loaded = True
+        try:
+            import numpy
+            _numpy_module = numpy
+        except ImportError:
+            _numpy_module = None
+    return _numpy_module
+
+def backend():
+    return 'numpy' if _numpy() is not None else 'python'
+
+def _item_fields(item):
+    """(keyword, article, meta title, meta description) of a generate_content result or a batch entry"""
+    if not isinstance(item, dict):
+        return '', '', '', ''
+    result = item.get('result') if isinstance(item.get('result'), dict) else item
+    return (
+        str(item.get('keyword') or result.get('keyword') or ''),
+        str(result.get('full_article') or ''),
+        str(result.get('meta_title') or ''),
+        str(result.get('meta_description') or '')
+    )
+
+def _features(item):
+    """One article's feature row, from a single pass over its lines and one tokenization of its text"""
+    keyword, article, meta_title, meta_description = _item_fields(item)
+    h1 = h2 = skips = list_items = paragraphs = 0
+    level = 1
+    in_paragraph = False
+    chunks = []
+    for line in article.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            in_paragraph = False
+            continue
+        heading = _HEADING.match(stripped)
+        item_match = _LIST_ITEM.match(stripped) if heading is None else None
+        if heading:
+            depth = len(heading.group(1))
+            h1 += depth == 1
+            h2 += depth == 2
+            # An H3 straight under the H1 (or an H4 under an H2) skips a level
+            skips += depth > level + 1
+            level = depth
+            in_paragraph = False
+            text = heading.group(2)
+        elif item_match:
+            list_items += 1
+            in_paragraph = False
+            text = item_match.group(1)
+        else:
+            paragraphs += not in_paragraph
+            in_paragraph = True
+            text = stripped
+        # Headings and list items count as sentences even without a full stop
+        chunks.append(text if text[-1] in '.!?' else text + '.')
+
+    text = ' '.join(chunks).lower()
+    words = _WORD.findall(text)
+    keyword_words = _WORD.findall(keyword.lower())
+    keyword_hits = 0
+    if keyword_words:
+        keyword_hits = f" {' '.join(words)} ".count(f" {' '.join(keyword_words)} ")
+    return (
+        len(words), len(_SENTENCE_END.findall(text)), len(_VOWEL_GROUP.findall(text)), keyword_hits, len(keyword_words),
+        h1, h2, skips, list_items, paragraphs, len(meta_title.strip()), len(meta_description.strip())
+    )
+
+def _band(value, limits, clip):
+    low, high, tolerance = limits
+    return 1 - clip((low - value) / tolerance, 0, 1) - clip((value - high) / tolerance, 0, 1)
+
+def _checks(f, clip, maximum):
+    """Metrics and 0-1 checks from feature columns: NumPy arrays for a whole batch, or one article's floats.
+
+    Only arithmetic, clip and maximum are used, so both backends share these formulas.
+    """
+    words = maximum(f['words'], 1)
+    metrics = {
+        'words': f['words'],
+        'keyword_density': f['keyword_hits'] * f['keyword_words'] / words * 100,
+        # Words without a vowel group still have a syllable
+        'reading_ease': 206.835 - 1.015 * words / maximum(f['sentences'], 1) - 84.6 * maximum(f['syllables'], f['words']) / words,
+        'h1': f['h1'],
+        'h2': f['h2'],
+        'heading_skips': f['heading_skips'],
+        'list_ratio': f['list_items'] / maximum(f['list_items'] + f['paragraphs'], 1),
+        'meta_title_length': f['meta_title_length'],
+        'meta_description_length': f['meta_description_length']
+    }
+    checks = {
+        'keyword_density': _band(metrics['keyword_density'], KEYWORD_DENSITY, clip),
+        'headings': (_band(f['h1'], H1_COUNT, clip) + _band(f['h2'], H2_COUNT, clip) + 1 - clip(f['heading_skips'] / 2, 0, 1)) / 3,
+        'readability': _band(metrics['reading_ease'], READING_EASE, clip),
+        'meta_title': _band(f['meta_title_length'], META_TITLE_LENGTH, clip),
+        'meta_description': _band(f['meta_description_length'], META_DESCRIPTION_LENGTH, clip),
+        'list_ratio': _band(metrics['list_ratio'], LIST_RATIO, clip)
+    }
+    score = sum(weight * checks[name] for name, weight in WEIGHTS.items()) * 100
+    return metrics, checks, score
+
+def _clip(value, low, high):
+    return min(max(value, low), high)
+
+def _columns(rows, use_numpy):
+    """Per-article (metrics, checks, score) tuples for feature rows, computed column-wise with NumPy"""
+    numpy = _numpy() if use_numpy is not False else None
+    if use_numpy and numpy is None:
+        raise RuntimeError('NumPy is not installed')
+    if numpy is None:
+        return [_checks(dict(zip(FEATURES, map(float, row))), _clip, max) for row in rows]
+
+    matrix = numpy.asarray(rows, dtype=numpy.float64).reshape(len(rows), len(FEATURES))
+    metrics, checks, score = _checks(dict(zip(FEATURES, matrix.T)), numpy.clip, numpy.maximum)
+    metric_lists = {name: column.tolist() for name, column in metrics.items()}
+    check_lists = {name: column.tolist() for name, column in checks.items()}
+    return [
+        ({name: values[i] for name, values in metric_lists.items()}, {name: values[i] for name, values in check_lists.items()}, value)
+        for i, value in enumerate(score.tolist())
+    ]
+
+def score_articles(items, min_score=MIN_SCORE, use_numpy=None):
+    """Score a batch of generate_content results (or batch entries); one dict per item, in order.
+
+    Each has `score` (0-100), `passed` (score >= min_score), `issues` (checks
+    under 0.5), the 0-1 `checks` and the raw `metrics`. use_numpy=None uses
+    NumPy when it is installed.
+    """
+    rows = [_features(item) for item in items]
+    if not rows:
+        return []
+    scored = []
+    for metrics, checks, score in _columns(rows, use_numpy):
+        score = round(score, 1)
+        scored.append({
+            'score': score,
+            'passed': score >= min_score,
+            'issues': [name for name, value in checks.items() if value < ISSUE_BELOW],
+            'checks': {name: round(value, 3) for name, value in checks.items()},
+            'metrics': {name: round(value, 2) if name in ('keyword_density', 'reading_ease', 'list_ratio') else int(value) for name, value in metrics.items()}
+        })
+    return scored
+
+def score_article(item, min_score=MIN_SCORE):
+    """Score one generate_content result; runs without NumPy, which only pays off on batches"""
+    return score_articles([item], min_score, use_numpy=False)[0]
+
+def parse_min_score(value):
+    """A request's passing score: a number from 0 to 100, MIN_SCORE when missing"""
+    if value is None:
+        return MIN_SCORE
+    try:
+        min_score = float(value) if not isinstance(value, bool) else None
+    except (TypeError, ValueError):
+        min_score = None
+    # NaN fails the range check too
+    if min_score is None or not 0 <= min_score <= 100:
+        raise ValueError('minScore must be a number from 0 to 100')
+    return min_score
+
+def summarize(scores):
+    """Batch totals for a list of score_articles results"""
+    scored = [score for score in scores if score is not None]
+    return {
+        'items': len(scored),
+        'passed': sum(1 for score in scored if score['passed']),
+        'failed': sum(1 for score in scored if not score['passed']),
+        'mean_score': round(sum(score['score'] for score in scored) / len(scored), 1) if scored else None,
+        'backend': backend()
+    }
+
+def _regenerate_row(entry):
+    """The batch_cli.py input row that generates an entry again"""
+    row = {'keyword': entry.get('keyword'), 'product': entry.get('product'), 'contentLength': entry.get('requestedContentLength') or entry.get('contentLength')}
+    if entry.get('variants'):
+        row['variants'] = entry['variants']
+    return {key: value for key, value in row.items() if value}
+
+def main(argv=None):
+    from static_export import read_entries
+
+    parser = argparse.ArgumentParser(description='Score batch results for SEO quality and pick rows to regenerate')
+    parser.add_argument('inputs', nargs='+', help='batch_cli.py output files (.jsonl, or .parquet parts with pyarrow installed)')
+    parser.add_argument('-o', '--output', help='JSONL copy of the input with seo_score and seo_issues set')
+    parser.add_argument('--regenerate', help='JSONL of the rows under --min-score, failed rows and flagged rows (batch_cli.py input)')
+    parser.add_argument('--min-score', type=float, default=MIN_SCORE, help='passing score (SEO_SCORE_MIN, default 60)')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='articles scored per vectorized batch')
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    regenerate = open(args.regenerate, 'w', encoding='utf-8') if args.regenerate else None
+    totals = {'scored': 0, 'passed': 0, 'failed': 0, 'errors': 0, 'regenerate': 0, 'score_sum': 0.0}
+
+    def flush(chunk):
+        # Rows without an article are not scored, but still regenerated
+        articles = [entry for entry in chunk if isinstance(entry, dict) and not entry.get('error') and _item_fields(entry)[1]]
+        for entry, score in zip(articles, score_articles(articles, args.min_score)):
+            entry['seo_score'], entry['seo_issues'] = score['score'], score['issues']
+            totals['scored'] += 1
+            totals['passed' if score['passed'] else 'failed'] += 1
+            totals['score_sum'] += score['score']
+        for entry in chunk:
+            if not isinstance(entry, dict):
+                continue
+            # Rows the content index flagged as near-duplicates or template output are thin too
+            failed = 'seo_score' not in entry or entry['seo_score'] < args.min_score or bool(entry.get('content_flags'))
+            totals['errors'] += 'seo_score' not in entry
+            if output:
+                output.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            if regenerate and failed and entry.get('keyword'):
+                regenerate.write(json.dumps(_regenerate_row(entry), ensure_ascii=False) + '\n')
+                totals['regenerate'] += 1
+        chunk.clear()
+
+    try:
+        chunk = []
+        for entry in read_entries(args.inputs):
+            chunk.append(entry)
+            if len(chunk) >= args.chunk_size:
+                flush(chunk)
+        flush(chunk)
+    finally:
+        for f in (output, regenerate):
+            if f:
+                f.close()
+
+    mean = totals['score_sum'] / totals['scored'] if totals['scored'] else 0
+    print(f"📏 {totals['scored']} articles scored with {backend()} in {time.monotonic() - started:.1f}s: "
+          f"{totals['passed']} passed, {totals['failed']} under {args.min_score:g}, mean {mean:.1f}, {totals['errors']} rows without an article", file=sys.stderr)
+    if regenerate:
+        print(f"🔁 {totals['regenerate']} rows to regenerate -> {args.regenerate}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import threading
+
+import metrics
+from log_config import get_logger
+
+# Request coalescing ("single flight") for the generators: while a call for a
+# key is running, identical calls wait for it and share its result (or its
+# exception) instead of starting their own. Works across threads and event
+# loops, since blocking callers share one background loop while the ASGI app
+# runs on its own. An async call is cancelled once every caller waiting on it has been
+# cancelled (e.g. all their clients disconnected); a blocking call always runs
+# to completion. Results are not kept after the call ends - that is the
+# result cache's job.
+
+logger = get_logger('single_flight')
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.waiters = 0
+        # (loop, future) for every async caller waiting on this flight
+        self.listeners = []
+        # Set when the call runs as a task, so the last waiter to leave can cancel it
+        self.loop = None
+        self.task = None
+
+def _resolve(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stats = {'calls': 0, 'coalesced': 0, 'cancelled': 0}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build from SINGLE_FLIGHT_ENABLED"""
+        return cls(enabled=os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() not in ('0', 'false', 'no'))
+
+    def _join(self, key, label):
+        """Return (flight, True) for a new call or (flight, False) to wait on a running one"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            flight.waiters += 1
+            self.stats['calls'] += 1
+            if not leader:
+                self.stats['coalesced'] += 1
+        if not leader:
+            metrics.COALESCED_CALLS.labels(label).inc()
+            logger.debug('Joined in-flight call', extra={'fields': {'function': label}})
+        return flight, leader
+
+    def _finish(self, key, flight, result=None, error=None, cancelled=False):
+        with self._lock:
+            flight.result, flight.error, flight.cancelled = result, error, cancelled
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.done.set()
+            listeners, flight.listeners = flight.listeners, []
+        for loop, waiter in listeners:
+            try:
+                loop.call_soon_threadsafe(_resolve, waiter)
+            except RuntimeError:
+                # That caller's event loop has already closed
+                pass
+
+    def _outcome(self, flight):
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def do(self, key, label, call, *args, **kwargs):
+        """Run call(*args, **kwargs), or wait for the identical call already running"""
+        if not self.enabled:
+            return call(*args, **kwargs)
+        flight, leader = self._join(key, label)
+        if leader:
+            try:
+                result = call(*args, **kwargs)
+            except BaseException as e:
+                self._finish(key, flight, error=e)
+                raise
+            self._finish(key, flight, result=result)
+            return result
+        flight.done.wait()
+        if flight.cancelled:
+            # The async call this one joined was cancelled by its own callers
+            return self.do(key, label, call, *args, **kwargs)
+        return self._outcome(flight)
+
+    async def do_async(self, key, label, call, *args, **kwargs):
+        """Async variant of do; call must return a coroutine"""
+        if not self.enabled:
+            return await call(*args, **kwargs)
+        loop = asyncio.get_running_loop()
+        flight, leader = self._join(key, label)
+        if leader:
+            flight.loop = loop
+            flight.task = loop.create_task(call(*args, **kwargs))
+            flight.task.add_done_callback(lambda task: self._task_done(key, flight, task))
+        waiter = loop.create_future()
+        with self._lock:
+            if flight.done.is_set():
+                waiter.set_result(None)
+            else:
+                flight.listeners.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            self._leave(key, flight, loop, waiter)
+            raise
+        if flight.cancelled:
+            return await self.do_async(key, label, call, *args, **kwargs)
+        return self._outcome(flight)
+
+    def _task_done(self, key, flight, task):
+        if task.cancelled():
+            self._finish(key, flight, cancelled=True)
+        else:
+            self._finish(key, flight, result=None if task.exception() else task.result(), error=task.exception())
+
+    def _leave(self, key, flight, loop, waiter):
+        # A cancelled caller stops waiting; the call is cancelled once nobody waits for it
+        with self._lock:
+            if (loop, waiter) in flight.listeners:
+                flight.listeners.remove((loop, waiter))
+            flight.waiters -= 1
+            abandoned = flight.waiters == 0 and not flight.done.is_set() and flight.task is not None
+            if abandoned:
+                self.stats['cancelled'] += 1
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+        if abandoned:
+            try:
+                flight.loop.call_soon_threadsafe(flight.task.cancel)
+            except RuntimeError:
+                pass
+
+    def snapshot(self):
+        """Coalescing counters and the number of calls in flight"""
+        with self._lock:
+            return dict(self.stats, in_flight=len(self._flights))
+
+single_flight = SingleFlight.from_env()
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Static-site export of batch results.
+
+Renders every successful row of batch_cli.py output (JSONL, or Parquet part
+files) as a page at SLUG/index.html (and/or SLUG/index.md) with the meta
+title and description in its head, then writes sitemap.xml as a sitemap
+index over sitemap-NNNNN.xml shards of at most 50,000 URLs.
+
+    python static_export.py results.jsonl -o site --base-url https://example.com/guides
+    python static_export.py results-*.parquet -o site --base-url https://example.com/guides --format both --prune
+
+Builds are incremental: site/.export-manifest.sqlite3 keeps each page's slug,
+content hash and lastmod, so a re-run only renders pages whose inputs (or the
+template, format or base URL) changed and only rewrites sitemap shards whose
+content changed. Input rows are streamed and pages are rendered by a process
+pool; neither the corpus nor the URL list is held in memory. A keyword maps
+to one page, so export one product per site (--product) and later rows win.
+"""
+import argparse
+import concurrent.futures
+import filecmp
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import sqlite3
+import string
+import sys
+import time
+import unicodedata
+
+# Bump when the page markup changes, so every page is rendered again
+RENDER_VERSION = 1
+MAX_SITEMAP_URLS = 50000
+# The sitemap protocol's limit is 50MB uncompressed; stay just under it
+MAX_SITEMAP_BYTES = 50 * 1000 * 1000 - 1000
+MANIFEST_NAME = '.export-manifest.sqlite3'
+FORMATS = {'html': ('index.html',), 'markdown': ('index.md',), 'both': ('index.html', 'index.md')}
+
+DEFAULT_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>$meta_title</title>
+<meta name="description" content="$meta_description">
+<link rel="canonical" href="$url">
+<meta property="og:title" content="$meta_title">
+<meta property="og:description" content="$meta_description">
+<meta property="og:url" content="$url">
+<meta property="og:type" content="article">
+</head>
+<body>
+<main>
+<article>
+$body
+</article>
+</main>
+</body>
+</html>
+"""
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_BULLET = re.compile(r'^[-*+]\s+(.*)$')
+_NUMBERED = re.compile(r'^\d+[.)]\s+(.*)$')
+_RULE = re.compile(r'^(?:-{3,}|\*{3,}|_{3,})$')
+_INLINE = re.compile(r'`([^`]+)`|\*\*(.+?)\*\*|__(.+?)__|\*(?![\s*])(.+?)\*|\[([^\]]+)\]\(([^)\s]+)\)')
+_SAFE_LINK = re.compile(r'^(?:https?://|mailto:|/|#|[^:]*$)', re.IGNORECASE)
+
+def _inline(text):
+    """Inline markdown (code, bold, italic, links) of already-escaped text"""
+
+    def replace(match):
+        code, bold, bold_underscore, italic, label, href = match.groups()
+        if code is not None:
+            return f'<code>{code}</code>'
+        if bold is not None or bold_underscore is not None:
+            return f'<strong>{_inline(bold or bold_underscore)}</strong>'
+        if italic is not None:
+            return f'<em>{_inline(italic)}</em>'
+        if not _SAFE_LINK.match(html.unescape(href)):
+            return _inline(label)
+        return f'<a href="{href}">{_inline(label)}</a>'
+
+    return _INLINE.sub(replace, text)
+
+def markdown_to_html(text):
+    """HTML for the markdown the article prompts produce: headings, lists, paragraphs, quotes, rules and code blocks"""
+    output = []
+    paragraph = []
+    list_tag = None
+    code = None
+
+    def close_paragraph():
+        if paragraph:
+            output.append(f"<p>{_inline(html.escape(' '.join(paragraph)))}</p>")
+            paragraph.clear()
+
+    def close_list():
+        nonlocal list_tag
+        if list_tag:
+            output.append(f'</{list_tag}>')
+            list_tag = None
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if code is not None:
+            if stripped.startswith('```'):
+                output.append('<pre><code>' + html.escape('\n'.join(code)) + '</code></pre>')
+                code = None
+            else:
+                code.append(line)
+            continue
+        if stripped.startswith('```'):
+            close_paragraph()
+            close_list()
+            code = []
+            continue
+        if not stripped:
+            close_paragraph()
+            close_list()
+            continue
+
+        heading = _HEADING.match(stripped)
+        item = _BULLET.match(stripped) if not _RULE.match(stripped) else None
+        tag = 'ul'
+        if item is None:
+            item = _NUMBERED.match(stripped)
+            tag = 'ol'
+        if heading:
+            close_paragraph()
+            close_list()
+            level = len(heading.group(1))
+            output.append(f'<h{level}>{_inline(html.escape(heading.group(2)))}</h{level}>')
+        elif _RULE.match(stripped):
+            close_paragraph()
+            close_list()
+            output.append('<hr>')
+        elif item:
+            close_paragraph()
+            if list_tag != tag:
+                close_list()
+                output.append(f'<{tag}>')
+                list_tag = tag
+            output.append(f'<li>{_inline(html.escape(item.group(1)))}</li>')
+        elif stripped.startswith('>'):
+            close_paragraph()
+            close_list()
+            output.append(f"<blockquote><p>{_inline(html.escape(stripped.lstrip('> ')))}</p></blockquote>")
+        else:
+            close_list()
+            paragraph.append(stripped)
+
+    if code is not None:
+        output.append('<pre><code>' + html.escape('\n'.join(code)) + '</code></pre>')
+    close_paragraph()
+    close_list()
+    return '\n'.join(output)
+
+def slugify(keyword):
+    """URL path segment for a keyword: lowercase ASCII words joined by hyphens"""
+    ascii_text = unicodedata.normalize('NFKD', keyword).encode('ascii', 'ignore').decode('ascii')
+    slug = re.sub(r'[^a-z0-9]+', '-', ascii_text.lower()).strip('-')[:80].rstrip('-')
+    return slug or 'page-' + hashlib.sha1(keyword.encode('utf-8')).hexdigest()[:10]
+
+def page_fields(entry):
+    """The page inputs of one batch output row (JSONL entry or flat Parquet row), or None for rows without an article"""
+    if not isinstance(entry, dict) or entry.get('error'):
+        return None
+    result = entry.get('result') or entry
+    keyword = (entry.get('keyword') or result.get('keyword') or '').strip()
+    article = result.get('full_article')
+    if not keyword or not article:
+        return None
+    title = result.get('article_title') or keyword
+    return {
+        'keyword': keyword,
+        'product': entry.get('product') or result.get('product') or '',
+        'title': title,
+        'meta_title': result.get('meta_title') or title,
+        'meta_description': result.get('meta_description') or '',
+        'article': article
+    }
+
+def read_entries(paths):
+    """Stream the rows of JSONL and Parquet batch output files"""
+    for path in paths:
+        if path.endswith('.parquet'):
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                raise SystemExit('Parquet input requires pyarrow (pip install pyarrow)')
+            for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=256):
+                yield from batch.to_pylist()
+            continue
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield None
+
+def page_url(base_url, slug):
+    return f'{base_url.rstrip("/")}/{slug}/'
+
+def page_hash(fields, options):
+    """Content hash of everything a page's files depend on"""
+    payload = json.dumps([RENDER_VERSION, options, fields], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _write_file(path, text):
+    # Write to a temporary file and rename, so a killed build never leaves a torn page
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+def render_page(fields, url, template):
+    """(html, markdown) of one page"""
+    article = fields['article'].strip()
+    if not article.startswith('# '):
+        article = f"# {fields['title']}\n\n{article}"
+    values = {key: html.escape(value) for key, value in fields.items() if key != 'article'}
+    page_html = string.Template(template).safe_substitute(values, url=html.escape(url), body=markdown_to_html(article))
+    # JSON strings are valid YAML scalars, so the front matter needs no YAML library
+    front_matter = '\n'.join(f'{key}: {json.dumps(value, ensure_ascii=False)}' for key, value in (
+        ('title', fields['meta_title']), ('description', fields['meta_description']),
+        ('keyword', fields['keyword']), ('product', fields['product']), ('canonical', url)
+    ))
+    return page_html, f'---\n{front_matter}\n---\n\n{article}\n'
+
+def render_batch(output_dir, base_url, file_names, template, pages):
+    """Render and write a batch of (slug, digest, fields) pages; runs in a worker process"""
+    for slug, _, fields in pages:
+        page_html, page_markdown = render_page(fields, page_url(base_url, slug), template)
+        directory = os.path.join(output_dir, slug)
+        os.makedirs(directory, exist_ok=True)
+        for file_name in file_names:
+            _write_file(os.path.join(directory, file_name), page_html if file_name.endswith('.html') else page_markdown)
+    return [(slug, digest) for slug, digest, _ in pages]
+
+class Manifest:
+    """Slug, content hash and lastmod of every exported page, in SQLite next to the pages.
+
+    Each export is a numbered run; pages not seen in the latest run are stale.
+    """
+
+    def __init__(self, path, commit_every=500):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages (id INTEGER PRIMARY KEY, slug TEXT NOT NULL UNIQUE, '
+            'keyword TEXT NOT NULL UNIQUE, hash TEXT, lastmod TEXT, run INTEGER NOT NULL)'
+        )
+        self.conn.execute('CREATE TABLE IF NOT EXISTS runs (run INTEGER PRIMARY KEY, started_at REAL NOT NULL)')
+        self.run = self.conn.execute('INSERT INTO runs (started_at) VALUES (?)', (time.time(),)).lastrowid
+        self.conn.commit()
+        self.commit_every = commit_every
+        self._writes = 0
+
+    def _written(self):
+        self._writes += 1
+        if self._writes >= self.commit_every:
+            self.commit()
+
+    def page(self, keyword):
+        """(slug, hash) of the keyword's page, assigning a free slug to new keywords"""
+        row = self.conn.execute('SELECT slug, hash FROM pages WHERE keyword = ?', (keyword,)).fetchone()
+        if row is not None:
+            self.conn.execute('UPDATE pages SET run = ? WHERE keyword = ?', (self.run, keyword))
+            self._written()
+            return row
+        slug = slugify(keyword)
+        if self.conn.execute('SELECT 1 FROM pages WHERE slug = ?', (slug,)).fetchone():
+            # Another keyword has the same slug ("C++" and "C"); keep both pages apart
+            slug = f"{slug}-{hashlib.sha1(keyword.encode('utf-8')).hexdigest()[:8]}"
+        self.conn.execute('INSERT INTO pages (slug, keyword, run) VALUES (?, ?, ?)', (slug, keyword, self.run))
+        self._written()
+        return slug, None
+
+    def rendered(self, slug, digest, lastmod):
+        self.conn.execute('UPDATE pages SET hash = ?, lastmod = ? WHERE slug = ?', (digest, lastmod, slug))
+        self._written()
+
+    def stale(self):
+        """Slugs of pages not seen in this run, streamed"""
+        for (slug,) in self.conn.execute('SELECT slug FROM pages WHERE run < ? ORDER BY id', (self.run,)):
+            yield slug
+
+    def forget(self, slug):
+        self.conn.execute('DELETE FROM pages WHERE slug = ?', (slug,))
+        self._written()
+
+    def urls(self):
+        """(slug, lastmod) of every rendered page in first-export order, so new pages land in the last shard"""
+        return self.conn.execute('SELECT slug, lastmod FROM pages WHERE hash IS NOT NULL ORDER BY id')
+
+    def commit(self):
+        self.conn.commit()
+        self._writes = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+def _replace_if_changed(temporary, path):
+    """Move temporary over path unless the content is identical; returns True if path was rewritten"""
+    if os.path.exists(path) and filecmp.cmp(temporary, path, shallow=False):
+        os.remove(temporary)
+        return False
+    os.replace(temporary, path)
+    return True
+
+def write_sitemaps(manifest, output_dir, base_url, urls_per_sitemap=MAX_SITEMAP_URLS):
+    """Stream the manifest into sitemap-NNNNN.xml shards plus a sitemap.xml index; returns (urls, shards, rewritten)"""
+    header = '<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    footer = '</urlset>\n'
+    shards = []
+    rewritten = 0
+    urls = 0
+    shard = None
+
+    def close_shard():
+        nonlocal rewritten
+        shard['file'].write(footer)
+        shard['file'].close()
+        rewritten += _replace_if_changed(shard['temporary'], shard['path'])
+        shards.append((os.path.basename(shard['path']), shard['lastmod']))
+
+    for slug, lastmod in manifest.urls():
+        entry = f'<url><loc>{html.escape(page_url(base_url, slug), quote=False)}</loc><lastmod>{lastmod}</lastmod></url>\n'
+        size = len(entry.encode('utf-8'))
+        if shard is not None and (shard['urls'] >= urls_per_sitemap or shard['bytes'] + size + len(footer) > MAX_SITEMAP_BYTES):
+            close_shard()
+            shard = None
+        if shard is None:
+            path = os.path.join(output_dir, f'sitemap-{len(shards) + 1:05d}.xml')
+            shard = {'path': path, 'temporary': f'{path}.tmp', 'urls': 0, 'bytes': len(header), 'lastmod': lastmod}
+            shard['file'] = open(shard['temporary'], 'w', encoding='utf-8')
+            shard['file'].write(header)
+        shard['file'].write(entry)
+        shard['urls'] += 1
+        shard['bytes'] += size
+        shard['lastmod'] = max(shard['lastmod'], lastmod)
+        urls += 1
+    if shard is not None:
+        close_shard()
+
+    # Shards left over from a larger earlier build
+    number = len(shards) + 1
+    while os.path.exists(os.path.join(output_dir, f'sitemap-{number:05d}.xml')):
+        os.remove(os.path.join(output_dir, f'sitemap-{number:05d}.xml'))
+        number += 1
+
+    index_path = os.path.join(output_dir, 'sitemap.xml')
+    with open(f'{index_path}.tmp', 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+        for name, lastmod in shards:
+            f.write(f'<sitemap><loc>{html.escape(base_url.rstrip("/") + "/" + name, quote=False)}</loc><lastmod>{lastmod}</lastmod></sitemap>\n')
+        f.write('</sitemapindex>\n')
+    rewritten += _replace_if_changed(f'{index_path}.tmp', index_path)
+    return urls, len(shards), rewritten
+
+def export(inputs, output_dir, base_url, page_format='html', template=DEFAULT_TEMPLATE, product=None,
+           workers=None, batch_size=64, prune=False, urls_per_sitemap=MAX_SITEMAP_URLS):
+    """Render changed pages and rewrite the sitemaps; returns the build counters"""
+    os.makedirs(output_dir, exist_ok=True)
+    file_names = FORMATS[page_format]
+    options = {'base_url': base_url, 'format': page_format, 'template': template}
+    workers = max(1, workers or os.cpu_count() or 1)
+    stats = {'rendered': 0, 'unchanged': 0, 'skipped': 0, 'stale': 0, 'pruned': 0}
+    lastmod = time.strftime('%Y-%m-%d', time.gmtime())
+    manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME))
+    pool = concurrent.futures.ProcessPoolExecutor(workers) if workers > 1 else None
+    # Slug -> future of the batch rendering it (None while still in `batch`);
+    # a page is never written by two batches at once
+    in_flight = {}
+    batch = []
+
+    def finish(future):
+        for slug, digest in future.result():
+            manifest.rendered(slug, digest, lastmod)
+            if in_flight.get(slug) is future:
+                del in_flight[slug]
+            stats['rendered'] += 1
+
+    def submit():
+        if not batch:
+            return
+        pages = list(batch)
+        batch.clear()
+        if pool is None:
+            future = concurrent.futures.Future()
+            future.set_result(render_batch(output_dir, base_url, file_names, template, pages))
+        else:
+            # Bounded: at most two batches per worker are queued
+            pending = {future for future in in_flight.values() if future is not None}
+            while len(pending) >= workers * 2:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for completed in done:
+                    finish(completed)
+            future = pool.submit(render_batch, output_dir, base_url, file_names, template, pages)
+        for slug, _, _ in pages:
+            in_flight[slug] = future
+        if pool is None:
+            finish(future)
+
+    try:
+        for entry in read_entries(inputs):
+            fields = page_fields(entry)
+            if fields is None or (product and fields['product'] != product):
+                stats['skipped'] += 1
+                continue
+            slug, previous = manifest.page(fields['keyword'])
+            digest = page_hash(fields, options)
+            if digest == previous and slug not in in_flight and all(os.path.exists(os.path.join(output_dir, slug, name)) for name in file_names):
+                stats['unchanged'] += 1
+                continue
+            if slug in in_flight:
+                # The same keyword again (a resumed batch writes in-flight rows twice): the later row wins
+                submit()
+                finish(in_flight[slug])
+            batch.append((slug, digest, fields))
+            in_flight[slug] = None
+            if len(batch) >= batch_size:
+                submit()
+        submit()
+        for future in set(in_flight.values()):
+            finish(future)
+
+        for slug in list(manifest.stale()):
+            stats['stale'] += 1
+            if prune:
+                shutil.rmtree(os.path.join(output_dir, slug), ignore_errors=True)
+                manifest.forget(slug)
+                stats['pruned'] += 1
+        manifest.commit()
+        stats['urls'], stats['sitemaps'], stats['sitemaps_rewritten'] = write_sitemaps(manifest, output_dir, base_url, urls_per_sitemap)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        manifest.close()
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render batch results as static pages with a sharded sitemap')
+    parser.add_argument('inputs', nargs='+', help='batch_cli.py output files (.jsonl, or .parquet parts with pyarrow installed)')
+    parser.add_argument('-o', '--output-dir', required=True, help='site directory; pages go to SLUG/index.html')
+    parser.add_argument('--base-url', required=True, help='public URL of the output directory, for canonical links and the sitemap')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='html', help='page files to write')
+    parser.add_argument('--template', help='HTML template with $meta_title, $meta_description, $title, $keyword, $product, $url and $body')
+    parser.add_argument('--product', help='only export rows of this product')
+    parser.add_argument('--workers', type=int, default=None, help='render processes (defaults to the CPU count)')
+    parser.add_argument('--prune', action='store_true', help='delete pages whose keyword is no longer in the input')
+    parser.add_argument('--urls-per-sitemap', type=int, default=MAX_SITEMAP_URLS, help=f'URLs per sitemap shard (max {MAX_SITEMAP_URLS})')
+    args = parser.parse_args(argv)
+    if not 1 <= args.urls_per_sitemap <= MAX_SITEMAP_URLS:
+        parser.error(f'--urls-per-sitemap must be between 1 and {MAX_SITEMAP_URLS}')
+    template = DEFAULT_TEMPLATE
+    if args.template:
+        with open(args.template, encoding='utf-8') as f:
+            template = f.read()
+
+    started = time.monotonic()
+    stats = export(args.inputs, args.output_dir, args.base_url, args.format, template, args.product,
+                   args.workers, prune=args.prune, urls_per_sitemap=args.urls_per_sitemap)
+    print(f"🧱 {stats['rendered']} pages rendered, {stats['unchanged']} unchanged, {stats['skipped']} rows skipped in {time.monotonic() - started:.1f}s", file=sys.stderr)
+    if stats['stale']:
+        action = 'deleted' if args.prune else 'kept (use --prune to delete them)'
+        print(f"🧹 {stats['stale']} pages no longer in the input were {action}", file=sys.stderr)
+    print(f"🗺️  {stats['urls']} URLs in {stats['sitemaps']} sitemaps ({stats['sitemaps_rewritten']} files rewritten) -> {os.path.join(args.output_dir, 'sitemap.xml')}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
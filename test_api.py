@@ -15,49 +15,652 @@ def test_content_functions():
     """Test the content generation functions directly"""
     print("🧪 Testing content generation functions...")
     
+    from content_with_ai import generate_article_title, generate_full_article, generate_meta_title, generate_meta_description, generate_all_content
+    
+    # Test with sample data
+    keyword = "test keyword"
+    product = "Files.com"
+    
+    print(f"  Testing with keyword: '{keyword}' for product: '{product}'")
+    
+    # Test each function
+    title = generate_article_title(keyword, product)
+    print(f"  ✅ Article title: {title[:50]}...")
+    
+    article = generate_full_article(keyword, title, product, "medium")
+    print(f"  ✅ Full article: {len(article)} characters")
+    
+    meta_title = generate_meta_title(keyword, product)
+    print(f"  ✅ Meta title: {meta_title}")
+    
+    meta_desc = generate_meta_description(keyword, product)
+    print(f"  ✅ Meta description: {meta_desc[:50]}...")
+    
+    content = generate_all_content(keyword, product, "medium")
+    assert set(content) == {'article_title', 'full_article', 'meta_title', 'meta_description', 'prompt_versions'}
+    assert content['prompt_versions']['full_article'] == 'full_article/medium@2'
+    print(f"  ✅ All content (concurrent): {len(content['full_article'])} characters")
+
+def test_result_cache():
+    """Test the two-tier result cache (LRU eviction, TTL, bypass/refresh modes)"""
+    print("\n🧪 Testing result cache...")
+    
+    import tempfile
+    from result_cache import ResultCache, make_key, cache_mode, CACHE_BYPASS, CACHE_REFRESH
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ResultCache(path=os.path.join(tmp, 'cache.sqlite3'), memory_size=2, ttl=60)
+        key = make_key('meta_title', 'SFTP  Server', 'Files.com')
+        assert key == make_key('meta_title', 'sftp server', 'Files.com')
+        
+        cache.set(key, 'SFTP Server Guide')
+        cache.set('b', 'b')
+        cache.set('c', 'c')
+        assert key not in cache._memory
+        assert cache.get(key) == 'SFTP Server Guide'
+        print("  ✅ LRU eviction falls through to SQLite")
+        
+        with cache_mode(CACHE_REFRESH):
+            assert cache.get(key) is None
+            cache.set(key, 'Refreshed')
+        with cache_mode(CACHE_BYPASS):
+            cache.set(key, 'Ignored')
+        assert cache.get(key) == 'Refreshed'
+        print("  ✅ Bypass and refresh modes")
+        
+        expired = ResultCache(path=os.path.join(tmp, 'cache.sqlite3'), ttl=-1)
+        expired.set('old', 'value')
+        assert expired.get('old') is None
+        print("  ✅ Expired entries are not served")
+        
+        from result_cache import CACHE_USE, ACCESS_FLUSH_SIZE, cache_mode_from_request
+        assert cache_mode_from_request({'bypassCache': 'false', 'refreshCache': '0'}) == CACHE_USE
+        assert cache_mode_from_request({'bypassCache': 'true'}) == CACHE_BYPASS and cache_mode_from_request({'refreshCache': 1}) == CACHE_REFRESH
+        print("  ✅ \"false\" cache flags leave the cache on")
+        
+        reader = ResultCache(path=os.path.join(tmp, 'cache.sqlite3'), memory_size=0, ttl=60)
+        last_access = lambda: reader._connection().execute('SELECT last_access FROM results WHERE key = ?', (key,)).fetchone()[0]
+        stored = last_access()
+        for _ in range(ACCESS_FLUSH_SIZE - 1):
+            assert reader.get(key) == 'Refreshed'
+        assert last_access() == stored
+        reader.get(key)
+        assert last_access() > stored and not reader._accessed
+        print("  ✅ SQLite hits update their access times in batches")
+
+def test_article_sanitizer():
+    """Test that word-count artifacts are removed and ordinary text is kept"""
+    print("\n🧪 Testing article sanitizer...")
+    
+    from article_sanitizer import sanitize_article, StreamingSanitizer
+    
+    article = (
+        "# SFTP Guide (EXACTLY 800-1200 words)\n\n"
+        "## Why SFTP (250 words)\n\nSFTP (SSH File Transfer Protocol) is secure. Target: 500 words\n"
+        "📊 Generated article word count: 812 words (target: EXACTLY 800-1200 words)\n"
+    )
+    expected = "# SFTP Guide\n\n## Why SFTP\n\nSFTP (SSH File Transfer Protocol) is secure.\n"
+    assert sanitize_article(article) == expected
+    print("  ✅ Artifacts removed, ordinary parentheses kept")
+    
+    sanitizer = StreamingSanitizer()
+    streamed = ''.join(sanitizer.feed(article[i:i + 7]) for i in range(0, len(article), 7)) + sanitizer.flush()
+    assert streamed == expected
+    print("  ✅ Streaming output matches the single pass")
+
+def test_job_queue():
+    """Test job leases, expiry re-claims, checkpoints and retries"""
+    print("\n🧪 Testing job queue...")
+    
+    import tempfile
+    import time
+    from job_queue import JobQueue, LeaseLost, JOB_QUEUED, JOB_FAILED
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs = JobQueue(os.path.join(tmp, 'jobs.sqlite3'), lease_seconds=0.2, max_attempts=2)
+        job_id = jobs.enqueue({'keyword': 'sftp server'})
+        job = jobs.claim('worker-1')
+        assert job['id'] == job_id and jobs.claim('worker-2') is None
+        jobs.checkpoint(job_id, 'worker-1', {'article_title': 'SFTP Guide'})
+        print("  ✅ Leased jobs are not handed out twice")
+        
+        time.sleep(0.3)
+        job = jobs.claim('worker-2')
+        assert job['attempts'] == 2 and job['results'] == {'article_title': 'SFTP Guide'}
+        try:
+            jobs.checkpoint(job_id, 'worker-1', {'meta_title': 'Stale'})
+            assert False, 'stale worker wrote to the job'
+        except LeaseLost:
+            pass
+        print("  ✅ Expired leases are re-claimed with their checkpoints")
+        
+        assert jobs.fail(job_id, 'worker-2', 'boom') == JOB_FAILED
+        retry_id = jobs.enqueue({'keyword': 'ftp'})
+        jobs.claim('worker-1')
+        assert jobs.fail(retry_id, 'worker-1', 'boom') == JOB_QUEUED
+        print("  ✅ Failed attempts are retried until max_attempts")
+
+def test_keyword_clustering():
+    """Test that near-duplicate keywords share a cluster and distinct ones do not"""
+    print("\n🧪 Testing keyword clustering...")
+    
+    from keyword_clustering import keyword_tokens, cluster_keywords, cluster_rows
+    
+    assert keyword_tokens('SFTP Servers') == keyword_tokens('server for sftp') == ('server', 'sftp')
+    print("  ✅ Case, plurals, stopwords and word order are normalized")
+    
+    clusters = cluster_keywords(['sftp server', 'SFTP servers', 'sftp server setup', 'ftp server', 'sftp'])
+    assert clusters[0] == {'keyword': 'sftp server', 'variants': ['SFTP servers', 'sftp server setup'], 'size': 3}
+    assert [cluster['keyword'] for cluster in clusters[1:]] == ['ftp server', 'sftp']
+    print("  ✅ Near-duplicates merge under one canonical keyword")
+    
+    rows = cluster_rows([{'keyword': 'sftp server', 'contentLength': 'long'}, {'keyword': 'SFTP servers'}, {'keyword': 'sftp server', 'product': 'ExaVault'}])
+    assert rows == [{'keyword': 'sftp server', 'contentLength': 'long', 'variants': ['SFTP servers']}, {'keyword': 'sftp server', 'product': 'ExaVault', 'variants': []}]
+    print("  ✅ Rows are clustered per product")
+    
+    from keyword_clustering import parse_threshold, DEFAULT_THRESHOLD
+    from vercel_app import app
+    assert parse_threshold(None) == DEFAULT_THRESHOLD and parse_threshold('0.8') == 0.8
+    for threshold in ('abc', 0, 1.5, float('nan'), True):
+        try:
+            parse_threshold(threshold)
+            raise AssertionError(f'threshold {threshold!r} was accepted')
+        except ValueError:
+            pass
+    response = app.test_client().post('/api/cluster_keywords', json={'rows': [{'keyword': 'sftp'}], 'threshold': 'abc'})
+    assert response.status_code == 400, response.status_code
+    print("  ✅ Invalid thresholds are a 400")
+    
+    rows = [{'keyword': 'sftp server'}, {'keyword': 'SFTP servers'}]
+    for flag, expected in (('false', 2), ('true', 1)):
+        response = app.test_client().post('/api/generate_batch', json={'rows': rows, 'clusterKeywords': flag, 'dryRun': True})
+        assert response.get_json()['rows'] == expected, response.get_json()
+    print("  ✅ clusterKeywords \"false\" leaves rows unclustered")
+
+def test_usage_budget():
+    """Test local token counting and budget downgrades/rejections"""
+    print("\n🧪 Testing usage budget...")
+    
+    from token_counter import count_tokens, count_message_tokens
+    from usage_ledger import Budget, BudgetExceeded
+    
+    assert 6 <= count_tokens('How to set up an SFTP server') <= 9
+    assert count_message_tokens([{'role': 'user', 'content': 'hello world'}]) == 8
+    print("  ✅ Tokens are counted locally")
+    
+    costs = {'comprehensive': 0.04, 'long': 0.03, 'medium': 0.02, 'short': 0.01}
+    estimate = lambda length: (int(costs[length] * 100000), costs[length])
+    budget = Budget(max_cost=0.05, on_exceed='downgrade')
+    assert budget.admit('Files.com', 'long', estimate)[0] == 'long'
+    assert budget.admit('Files.com', 'long', estimate)[0] == 'medium'
+    try:
+        budget.admit('Files.com', 'short', estimate)
+        assert False, 'row admitted past the budget'
+    except BudgetExceeded:
+        pass
+    print("  ✅ Rows are downgraded, then rejected, when the budget runs out")
+    
+    budget = Budget(product_costs={'ExaVault': 0.01})
+    assert budget.admit('ExaVault', 'short', estimate)[0] == 'short'
+    assert budget.admit('Files.com', 'long', estimate)[0] == 'long'
+    print("  ✅ Product budgets only limit their product")
+    
+    import asyncio
+    import tempfile
+    from batch_generation import admission_history
+    from usage_ledger import UsageLedger, PRUNE_EVERY, budget_scope
+    
+    assert not Budget().limited and Budget(max_tokens=10).limited
+    with budget_scope(Budget()):
+        assert asyncio.run(admission_history()) is None
+    with tempfile.TemporaryDirectory() as tmp:
+        ledger = UsageLedger(os.path.join(tmp, 'usage.sqlite3'), max_rows=10)
+        for _ in range(PRUNE_EVERY):
+            ledger.record('meta_title', 'Files.com', None, 'gpt-3.5-turbo', 50, 10)
+        assert ledger._connection().execute('SELECT COUNT(*) FROM usage').fetchone()[0] == 10
+        assert ledger.averages()[('meta_title', None)]['calls'] == 10
+        assert ledger.snapshot()['calls'] == PRUNE_EVERY
+    print("  ✅ Unlimited budgets skip admission and the ledger keeps only its newest calls")
+    
+    from vercel_app import app
+    client = app.test_client()
+    preview = client.post('/api/generate_batch', json={'rows': [{'keyword': 'sftp'}], 'dryRun': 'true'}).get_json()
+    generated = client.post('/api/generate_batch', json={'rows': [{'keyword': 'sftp'}], 'dryRun': 'false', 'bypassCache': True}).get_json()
+    assert 'cost' in preview and 'succeeded' not in preview
+    assert generated['succeeded'] == 1 and 'result' in generated['results'][0]
+    print("  ✅ dryRun \"false\" generates instead of previewing")
+
+def test_metrics():
+    """Test Prometheus rendering of counters and histograms"""
+    print("\n🧪 Testing metrics...")
+    
+    from metrics import Registry, Counter, Histogram
+    
+    registry = Registry()
+    fallbacks = Counter('test_fallbacks_total', 'Fallbacks', ('function', 'cause'), registry=registry)
+    latency = Histogram('test_latency_seconds', 'Latency', ('function',), buckets=(1, 5), registry=registry)
+    fallbacks.labels('full_article', 'no_api_key').inc()
+    fallbacks.labels('full_article', 'no_api_key').inc(2)
+    latency.labels('full_article').observe(0.5)
+    latency.labels('full_article').observe(3)
+    
+    text = registry.render()
+    assert '# TYPE test_fallbacks_total counter' in text
+    assert 'test_fallbacks_total{function="full_article",cause="no_api_key"} 3' in text
+    assert 'test_latency_seconds_bucket{function="full_article",le="1"} 1' in text
+    assert 'test_latency_seconds_bucket{function="full_article",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_sum{function="full_article"} 3.5' in text
+    print("  ✅ Counters and cumulative histogram buckets are rendered")
+
+def test_admission():
+    """Test that saturation queues briefly, then sheds with a Retry-After hint"""
+    print("\n🧪 Testing admission control...")
+    
+    import asyncio
+    from admission import AdmissionController, Overloaded
+    
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+        await controller.acquire()
+        try:
+            await controller.acquire()
+            assert False, 'a queued request should time out'
+        except Overloaded as e:
+            assert e.reason == 'queue_timeout' and e.retry_after >= 1
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        try:
+            await controller.acquire()
+            assert False, 'a full queue should reject at once'
+        except Overloaded as e:
+            assert e.reason == 'queue_full'
+        controller.release()
+        await waiter
+        assert controller.in_flight == 1 and controller.queue_depth == 0
+        controller.release()
+        return controller.snapshot()
+    
+    snapshot = asyncio.run(scenario())
+    assert snapshot['in_flight'] == 0 and snapshot['rejected_by_reason'] == {'queue_timeout': 1, 'queue_full': 1}
+    print("  ✅ Queued requests time out, a full queue rejects at once, released slots pass to waiters")
+
+def test_single_flight():
+    """Test that identical concurrent calls share one call, its errors and its cancellation"""
+    print("\n🧪 Testing request coalescing...")
+    
+    import asyncio
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from single_flight import SingleFlight
+    
+    flights = SingleFlight()
+    calls = []
+    
+    def slow(value):
+        calls.append(value)
+        time.sleep(0.1)
+        if value == 'bad':
+            raise ValueError('upstream failed')
+        return value.upper()
+    
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda _: flights.do('key', 'test', slow, 'ok'), range(4)))
+    assert results == ['OK'] * 4 and calls == ['ok']
+    print("  ✅ Four concurrent identical calls ran once and shared the result")
+    
+    errors = []
+    
+    def failing():
+        try:
+            flights.do('bad', 'test', slow, 'bad')
+        except ValueError as e:
+            errors.append(str(e))
+    
+    threads = [threading.Thread(target=failing) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == ['upstream failed'] * 3 and calls.count('bad') == 1
+    print("  ✅ The error reached every waiter")
+    
+    async def cancelled_by_all():
+        started = asyncio.Event()
+        
+        async def generate():
+            started.set()
+            await asyncio.sleep(10)
+        
+        waiters = [asyncio.ensure_future(flights.do_async('async', 'test', generate)) for _ in range(2)]
+        await started.wait()
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        assert flights.snapshot()['in_flight'] == 1
+        waiters[1].cancel()
+        await asyncio.sleep(0)
+        return flights.snapshot()
+    
+    snapshot = asyncio.run(cancelled_by_all())
+    assert snapshot['cancelled'] == 1 and snapshot['in_flight'] == 0
+    print("  ✅ The call was cancelled only after every waiter left")
+
+def test_sectioned_article():
+    """Test outline parsing and the assembly of a sectioned article"""
+    print("\n🧪 Testing sectioned articles...")
+    
+    from content_with_ai import _assemble_article, _outline_size, _parse_outline
+    
+    assert _outline_size('Introduction, 4-5 main sections, Conclusion') == (4, 5)
+    assert _outline_size('Introduction, 5+ main sections, Conclusion') == (5, 6)
+    
+    outline = _parse_outline(json.dumps({'sections': [
+        {'heading': '1. Why Automate', 'points': ['time saved']},
+        {'heading': 'Introduction'},
+        {'heading': '## Choosing a Tool', 'points': 'not a list'},
+        {'heading': 'why automate!'},
+        {'heading': 'Rolling Out'}
+    ]}), 2, 3)
+    assert outline == [('Why Automate', ['time saved']), ('Choosing a Tool', []), ('Rolling Out', [])]
+    print("  ✅ Outline headings are cleaned and deduplicated")
+    
+    try:
+        _parse_outline(json.dumps({'sections': [{'heading': 'Only One'}]}), 2, 3)
+        raise AssertionError('a too-short outline was accepted')
+    except ValueError:
+        pass
+    
+    article = _assemble_article('Guide', [
+        ('Introduction', '# Guide\n\nOpening text.'),
+        ('Why Automate', '## Why Automate\n\nBody.\n\n## Stray Heading\n\n### Detail\n\nMore.'),
+        ('Conclusion', '')
+    ])
+    assert article == '# Guide\n\n## Introduction\n\nOpening text.\n\n## Why Automate\n\nBody.\n\n### Stray Heading\n\n### Detail\n\nMore.'
+    print("  ✅ Sections are assembled under consistent headings")
+
+def test_prompt_registry():
+    """Test that prompts keep a shared static prefix and report their versions"""
+    print("\n🧪 Testing prompt registry...")
+    
+    import prompts
+    
+    first = prompts.render('article_title', 'Files.com', keyword='sftp server')
+    second = prompts.render('article_title', 'Files.com', keyword='ftp client')
+    assert first[0] == second[0]
+    assert first[1]['content'].replace('sftp server', 'ftp client') == second[1]['content']
+    assert first[1]['content'].endswith('Keyword: sftp server')
+    print("  ✅ Rows for one product share everything up to the keyword")
+    
+    article = prompts.render('full_article', 'ExaVault', 'long', 'draft', keyword='sftp', title='SFTP Guide', variants='')
+    assert 'comprehensive and detailed' in article[0]['content'] and article[1]['content'].endswith('Title: SFTP Guide')
+    assert prompts.version_id('full_article', 'long') == 'full_article/long@2' and prompts.version_id('all_content') is None
+    print("  ✅ Length wording is compiled in and versions are reported")
+    
     try:
-        from content_with_ai import generate_article_title, generate_full_article, generate_meta_title, generate_meta_description
+        prompts._check('test', 'bad', prompts.Prompt('{keyword}', '', ''))
+        raise AssertionError('a row value in the static prefix was accepted')
+    except ValueError:
+        pass
+    print("  ✅ Row values are kept out of the static prefix")
+
+def test_hedging():
+    """Test that a slow short call is hedged, the first answer wins and the hedge rate is capped"""
+    print("\n🧪 Testing hedged requests...")
+    
+    import asyncio
+    from hedging import Hedger
+    
+    async def hedged(hedger, slow):
+        calls, cancelled = [], []
         
-        # Test with sample data
-        keyword = "test keyword"
-        product = "Files.com"
+        async def call():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(slow)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+                return 'first'
+            return 'duplicate'
         
-        print(f"  Testing with keyword: '{keyword}' for product: '{product}'")
+        result = await hedger.run('meta_title', call)
+        await asyncio.sleep(0)
+        return result, len(calls), bool(cancelled)
+    
+    hedger = Hedger(enabled=True, functions=('meta_title',), min_samples=3, max_rate=0.5)
+    assert asyncio.run(hedged(hedger, 0.01)) == ('first', 1, False)
+    for _ in range(3):
+        hedger.observe('meta_title', 0.01)
+    assert asyncio.run(hedged(hedger, 5)) == ('duplicate', 2, True)
+    assert hedger.snapshot()['hedged'] == 1 and hedger.snapshot()['hedge_wins'] == 1
+    print("  ✅ A call slower than its p95 was hedged and the slow leg cancelled")
+    
+    capped = Hedger(enabled=True, functions=('meta_title',), min_samples=3, max_rate=0)
+    for _ in range(3):
+        capped.observe('meta_title', 0.01)
+    assert asyncio.run(hedged(capped, 0.1)) == ('first', 1, False)
+    assert capped.snapshot()['capped'] == 1
+    print("  ✅ The hedge rate cap holds")
+
+def test_static_export():
+    """Test that the static export renders pages once, shards the sitemap and skips unchanged pages"""
+    print("\n🧪 Testing static export...")
+    
+    import tempfile
+    from static_export import export
+    
+    def write_rows(path, count, extra=''):
+        with open(path, 'w') as f:
+            for i in range(count):
+                result = {'article_title': f'Guide {i}', 'meta_title': f'Meta & {i}', 'meta_description': f'About {i}', 'full_article': f'# Guide {i}\n\n## Part\n\n- one\n- two{extra}'}
+                f.write(json.dumps({'index': i, 'keyword': f'sftp tip {i}', 'product': 'Files.com', 'result': result}) + '\n')
+            f.write(json.dumps({'index': count, 'keyword': 'broken', 'error': 'Generation failed'}) + '\n')
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        rows, site = os.path.join(tmp, 'results.jsonl'), os.path.join(tmp, 'site')
+        write_rows(rows, 3)
+        stats = export([rows], site, 'https://example.com/guides', workers=1, urls_per_sitemap=2)
+        assert stats['rendered'] == 3 and stats['skipped'] == 1 and stats['sitemaps'] == 2
+        with open(os.path.join(site, 'sftp-tip-0', 'index.html')) as f:
+            page = f.read()
+        assert '<title>Meta &amp; 0</title>' in page and '<meta name="description" content="About 0">' in page and '<li>one</li>' in page
+        with open(os.path.join(site, 'sitemap.xml')) as f:
+            assert 'https://example.com/guides/sitemap-00002.xml' in f.read()
+        print("  ✅ Pages have their metas in the head and the sitemap is sharded")
         
-        # Test each function
-        title = generate_article_title(keyword, product)
-        print(f"  ✅ Article title: {title[:50]}...")
+        assert export([rows], site, 'https://example.com/guides', workers=1, urls_per_sitemap=2)['rendered'] == 0
+        write_rows(rows, 2, extra='\n- three')
+        stats = export([rows], site, 'https://example.com/guides', workers=1, urls_per_sitemap=2, prune=True)
+        assert stats['rendered'] == 2 and stats['pruned'] == 1 and stats['urls'] == 2
+        assert not os.path.exists(os.path.join(site, 'sftp-tip-2')) and not os.path.exists(os.path.join(site, 'sitemap-00002.xml'))
+        print("  ✅ Re-runs only render changed pages and prune removed ones")
+
+def test_seo_scoring():
+    """Test that SEO scores separate good and bad articles and both backends agree"""
+    print("\n🧪 Testing SEO scoring...")
+    
+    import seo_scoring
+    
+    filler = "Teams share files with partners every day, and each transfer needs care. " * 8
+    sections = "\n\n".join(f"## Setup step {i}\n\nAn SFTP server keeps file transfers safe.\n\n{filler}\n\n- Encrypted transfers\n- Key based logins" for i in range(4))
+    good = {
+        'keyword': 'sftp server',
+        'full_article': f"# SFTP Server Guide\n\nPick a host and create users. Test the connection.\n\n{sections}",
+        'meta_title': 'SFTP Server Guide: Setup, Security and Tips',
+        'meta_description': 'Learn how to set up an SFTP server, secure file transfers with keys and audit logs, and keep your team sharing files safely every day.'
+    }
+    bad = {'keyword': 'sftp server', 'full_article': 'Files. ' * 300, 'meta_title': 'SFTP', 'meta_description': ''}
+    good_score, bad_score = seo_scoring.score_articles([good, bad], use_numpy=False)
+    assert good_score['passed'] and not good_score['issues'] and good_score['metrics']['h2'] == 4
+    assert not bad_score['passed'] and {'keyword_density', 'headings', 'meta_title', 'meta_description'} <= set(bad_score['issues'])
+    print(f"  ✅ A structured article scores {good_score['score']}, an unstructured one {bad_score['score']}")
+    
+    if seo_scoring.backend() == 'numpy':
+        assert seo_scoring.score_articles([good, bad] * 50, use_numpy=True) == [good_score, bad_score] * 50
+        print("  ✅ NumPy and pure Python scores match")
+    
+    from vercel_app import app
+    assert seo_scoring.parse_min_score(None) == seo_scoring.MIN_SCORE and seo_scoring.parse_min_score('75') == 75
+    for min_score in ('abc', -1, 101, float('nan'), True):
+        try:
+            seo_scoring.parse_min_score(min_score)
+            raise AssertionError(f'minScore {min_score!r} was accepted')
+        except ValueError:
+            pass
+    response = app.test_client().post('/api/score_content', json={'items': [good], 'minScore': 'abc'})
+    assert response.status_code == 400, response.status_code
+    print("  ✅ Invalid minScore values are a 400")
+
+def test_content_index():
+    """Test that the content index flags template output and near-duplicates across reopened indexes"""
+    print("\n🧪 Testing content index...")
+    
+    import tempfile
+    import fallback_templates
+    from content_index import ContentIndex
+    
+    words = ' '.join(f'word{i % 97} topic{i % 13} detail{i}' for i in range(300))
+    other = ' '.join(f'item{i % 89} point{i % 7} note{i}' for i in range(300))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'corpus.sqlite3')
+        index = ContentIndex(path)
+        fallback = fallback_templates.full_article('ftp client', None, 'Files.com', 'long')
+        assert index.check('ftp client', 'Files.com', fallback)['flags'] == ['template_fallback']
+        assert index.check('sftp server', 'Files.com', f'SFTP server guide. {words}')['flags'] == []
+        print("  ✅ Template fallback output is flagged")
+        index.close()
         
-        article = generate_full_article(keyword, title, product, "medium")
-        print(f"  ✅ Full article: {len(article)} characters")
+        reopened = ContentIndex(path)
+        near = reopened.check('ftp server', 'Files.com', f'FTP server guide. {words} extra')
+        assert near['flags'] == ['near_duplicate'] and near['duplicate_of'][0]['keyword'] == 'sftp server'
+        assert reopened.check('mft', 'Files.com', other)['flags'] == []
+        assert reopened.snapshot()['articles'] == 4
+        reopened.close()
+        print("  ✅ Near-duplicates are found in the persisted index")
+
+def test_request_options():
+    """Test that boolean request options accept JSON and string forms"""
+    print("\n🧪 Testing request options...")
+    
+    from request_options import parse_flag
+    
+    assert [parse_flag(value) for value in (True, 1, '1', 'true', ' TRUE ', 'yes')] == [True] * 6
+    assert [parse_flag(value, True) for value in (False, 0, '0', 'false', 'False', 'no')] == [False] * 6
+    assert parse_flag(None, True) is True and parse_flag('maybe') is False and parse_flag(2, True) is True
+    print("  ✅ \"false\" is false, and missing or unrecognized values use the default")
+
+def test_shared_rate_limiter():
+    """Test that waiting on the shared limiter file never blocks the event loop"""
+    print("\n🧪 Testing shared rate limiter...")
+    
+    import asyncio
+    import sqlite3
+    import tempfile
+    import threading
+    import time
+    from rate_limiter import RateLimiter
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'limiter.sqlite3')
+        limiter = RateLimiter(shared_path=path)
+        limiter.snapshot()
+        locked = threading.Event()
         
-        meta_title = generate_meta_title(keyword, product)
-        print(f"  ✅ Meta title: {meta_title}")
+        def hold_write_lock():
+            # Another worker process mid-transaction on the shared file
+            conn = sqlite3.connect(path, isolation_level=None)
+            conn.execute('CREATE TABLE IF NOT EXISTS limiter_state (name TEXT PRIMARY KEY, value REAL NOT NULL, updated REAL NOT NULL)')
+            conn.execute('BEGIN IMMEDIATE')
+            locked.set()
+            time.sleep(0.5)
+            conn.execute('COMMIT')
+            conn.close()
         
-        meta_desc = generate_meta_description(keyword, product)
-        print(f"  ✅ Meta description: {meta_desc[:50]}...")
+        holder = threading.Thread(target=hold_write_lock)
+        holder.start()
+        locked.wait()
         
-        return True
+        async def scenario():
+            gaps = []
+            
+            async def call():
+                async with limiter.limit_async(10):
+                    pass
+            
+            async def ticker(done):
+                last = time.monotonic()
+                while not done.is_set():
+                    await asyncio.sleep(0.01)
+                    now = time.monotonic()
+                    gaps.append(now - last)
+                    last = now
+            
+            done = asyncio.Event()
+            ticking = asyncio.ensure_future(ticker(done))
+            await asyncio.gather(call(), call())
+            done.set()
+            await ticking
+            return max(gaps)
         
-    except Exception as e:
-        print(f"  ❌ Error testing content functions: {e}")
-        return False
+        longest_gap = asyncio.run(scenario())
+        holder.join()
+        assert longest_gap < 0.2, longest_gap
+        assert limiter.snapshot()['requests'] == 2 and limiter.in_flight == 0
+        print(f"  ✅ The loop kept ticking (longest gap {longest_gap:.3f}s) while another process held the file")
+
+def test_connection_reuse():
+    """Test that sequential blocking requests share one OpenAI client and its connections"""
+    print("\n🧪 Testing connection reuse...")
+    
+    import content_with_ai
+    from content_with_ai import close_async_client, run_sync
+    server = None
+    try:
+        import threading
+        sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'benchmarks'))
+        from fake_openai import FakeOpenAI, make_server
+        from openai_transport import pool_stats
+        from vercel_app import app
+        
+        server = make_server(FakeOpenAI(latency=0.01, tokens_per_second=100000))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{server.server_address[1]}/v1'
+        content_with_ai.api_key = 'test-key'
+        
+        client = app.test_client()
+        for number in range(5):
+            response = client.post('/api/generate_content', json={'keyword': f'reuse test {number}', 'contentLength': 'short', 'bypassCache': True})
+            assert response.status_code == 200, response.status_code
+        stats = pool_stats()
+        assert stats['clients'] == 1, stats
+        assert 0 < stats['connections'] <= 4, stats
+        print(f"  ✅ 5 requests used 1 client and {stats['connections']} pooled connections")
+        
+    finally:
+        run_sync(close_async_client())
+        content_with_ai.api_key = None
+        os.environ.pop('OPENAI_BASE_URL', None)
+        if server is not None:
+            server.shutdown()
 
 def test_api_endpoint():
     """Test the API endpoint structure"""
     print("\n🧪 Testing API endpoint structure...")
     
+    # Test the generate_content module
+    from api.generate_content import handler
+    
+    print("  ✅ API endpoint module imports successfully")
+    print("  ✅ Handler class exists")
+
+def run_test(test):
+    """Run one test for the summary below; pytest runs the same functions directly"""
     try:
-        # Test the generate_content module
-        from api.generate_content import handler
-        
-        print("  ✅ API endpoint module imports successfully")
-        print("  ✅ Handler class exists")
-        
+        test()
         return True
-        
     except Exception as e:
-        print(f"  ❌ Error testing API endpoint: {e}")
+        print(f"  ❌ {test.__name__} failed: {e!r}")
         return False
 
 def main():
@@ -65,16 +668,84 @@ def main():
     print("🚀 Starting API tests...\n")
     
     # Test content functions
-    content_ok = test_content_functions()
+    content_ok = run_test(test_content_functions)
+    
+    # Test result cache
+    cache_ok = run_test(test_result_cache)
+    
+    # Test article sanitizer
+    sanitizer_ok = run_test(test_article_sanitizer)
+    
+    # Test job queue
+    jobs_ok = run_test(test_job_queue)
+    
+    # Test keyword clustering
+    clustering_ok = run_test(test_keyword_clustering)
+    
+    # Test usage budget
+    budget_ok = run_test(test_usage_budget)
+    
+    # Test metrics
+    metrics_ok = run_test(test_metrics)
+    
+    # Test admission control
+    admission_ok = run_test(test_admission)
+    
+    # Test request coalescing
+    coalescing_ok = run_test(test_single_flight)
+    
+    # Test sectioned articles
+    sectioned_ok = run_test(test_sectioned_article)
+    
+    # Test prompt registry
+    prompts_ok = run_test(test_prompt_registry)
+    
+    # Test hedged requests
+    hedging_ok = run_test(test_hedging)
+    
+    # Test static export
+    export_ok = run_test(test_static_export)
+    
+    # Test SEO scoring
+    scoring_ok = run_test(test_seo_scoring)
+    
+    # Test content index
+    content_index_ok = run_test(test_content_index)
+    
+    # Test request options
+    options_ok = run_test(test_request_options)
+    
+    # Test shared rate limiter
+    limiter_ok = run_test(test_shared_rate_limiter)
+    
+    # Test connection reuse
+    reuse_ok = run_test(test_connection_reuse)
     
     # Test API structure
-    api_ok = test_api_endpoint()
+    api_ok = run_test(test_api_endpoint)
     
     print(f"\n📊 Test Results:")
     print(f"  Content Functions: {'✅ PASS' if content_ok else '❌ FAIL'}")
+    print(f"  Result Cache: {'✅ PASS' if cache_ok else '❌ FAIL'}")
+    print(f"  Article Sanitizer: {'✅ PASS' if sanitizer_ok else '❌ FAIL'}")
+    print(f"  Job Queue: {'✅ PASS' if jobs_ok else '❌ FAIL'}")
+    print(f"  Keyword Clustering: {'✅ PASS' if clustering_ok else '❌ FAIL'}")
+    print(f"  Usage Budget: {'✅ PASS' if budget_ok else '❌ FAIL'}")
+    print(f"  Metrics: {'✅ PASS' if metrics_ok else '❌ FAIL'}")
+    print(f"  Admission Control: {'✅ PASS' if admission_ok else '❌ FAIL'}")
+    print(f"  Request Coalescing: {'✅ PASS' if coalescing_ok else '❌ FAIL'}")
+    print(f"  Sectioned Articles: {'✅ PASS' if sectioned_ok else '❌ FAIL'}")
+    print(f"  Prompt Registry: {'✅ PASS' if prompts_ok else '❌ FAIL'}")
+    print(f"  Hedged Requests: {'✅ PASS' if hedging_ok else '❌ FAIL'}")
+    print(f"  Static Export: {'✅ PASS' if export_ok else '❌ FAIL'}")
+    print(f"  SEO Scoring: {'✅ PASS' if scoring_ok else '❌ FAIL'}")
+    print(f"  Content Index: {'✅ PASS' if content_index_ok else '❌ FAIL'}")
+    print(f"  Request Options: {'✅ PASS' if options_ok else '❌ FAIL'}")
+    print(f"  Shared Rate Limiter: {'✅ PASS' if limiter_ok else '❌ FAIL'}")
+    print(f"  Connection Reuse: {'✅ PASS' if reuse_ok else '❌ FAIL'}")
     print(f"  API Structure: {'✅ PASS' if api_ok else '❌ FAIL'}")
     
-    if content_ok and api_ok:
+    if content_ok and cache_ok and sanitizer_ok and jobs_ok and clustering_ok and budget_ok and metrics_ok and admission_ok and coalescing_ok and sectioned_ok and prompts_ok and hedging_ok and export_ok and scoring_ok and content_index_ok and options_ok and limiter_ok and reuse_ok and api_ok:
         print("\n🎉 All tests passed! The API should work on Vercel.")
         return True
     else:
@@ -0,0 +1,86 @@
+import math
+import os
+import re
+
+# Offline token counting and pricing for the prompts content_with_ai.py builds.
+#
+# Uses tiktoken's cl100k_base encoding (the gpt-3.5-turbo / gpt-4 tokenizer)
+# when it is installed and its encoding file is available locally; otherwise a
+# regex approximation of the same pre-tokenizer, which stays within a few
+# percent on English prose and never needs the network.
+
+# Chat format overhead per message and per reply (OpenAI cookbook values for gpt-3.5-turbo)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Average tokens per English word in generated articles, used to turn word
+# targets into max_tokens and expected completion sizes
+TOKENS_PER_WORD = 1.3
+
+# USD per million (prompt, completion) tokens
+MODEL_PRICES = {
+    'gpt-3.5-turbo': (0.50, 1.50),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00)
+}
+
+# Same split as cl100k_base: contractions, letter runs, up to 3 digits,
+# punctuation runs, whitespace
+_PIECES = re.compile(r"'(?:s|t|re|ve|m|ll|d)| ?[^\W\d_]+|\d{1,3}| ?[^\s\w]+|\s+(?!\S)|\s+", re.IGNORECASE)
+
+_encoding = None
+_encoding_loaded = False
+
+def _tiktoken_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            # Not installed, or the encoding file is not cached and cannot be downloaded
+            _encoding = None
+    return _encoding
+
+def _piece_tokens(piece):
+    if piece.isspace():
+        return 1
+    word = piece.lstrip(' ')
+    if word.isascii():
+        if word.isalpha():
+            # Common words up to ~10 letters are single tokens; longer ones split into a few pieces
+            return 1 if len(word) <= 10 else math.ceil(len(word) / 7)
+        # Digit groups and runs of up to 3 punctuation marks are single tokens
+        return 1 if word.isdigit() else math.ceil(len(word) / 3)
+    # Non-ASCII text: roughly one token per 3 UTF-8 bytes
+    return max(1, math.ceil(len(word.encode('utf-8')) / 3))
+
+def count_tokens(text):
+    """Number of tokens in text"""
+    if not text:
+        return 0
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(_piece_tokens(piece) for piece in _PIECES.findall(text))
+
+def count_message_tokens(messages):
+    """Prompt tokens of a chat completion request"""
+    return sum(count_tokens(message.get('content') or '') + TOKENS_PER_MESSAGE for message in messages) + TOKENS_PER_REPLY
+
+def words_to_tokens(words):
+    return int(words * TOKENS_PER_WORD)
+
+def model_prices(model):
+    """(prompt, completion) USD per million tokens; OPENAI_*_PRICE_PER_MTOK override the table"""
+    prompt_price, completion_price = MODEL_PRICES.get(model, MODEL_PRICES['gpt-3.5-turbo'])
+    return (
+        float(os.getenv('OPENAI_PROMPT_PRICE_PER_MTOK', prompt_price)),
+        float(os.getenv('OPENAI_COMPLETION_PRICE_PER_MTOK', completion_price))
+    )
+
+def token_cost(model, prompt_tokens, completion_tokens):
+    """USD cost of one call"""
+    prompt_price, completion_price = model_prices(model)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
@@ -0,0 +1,284 @@
+import contextlib
+import contextvars
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import metrics
+from log_config import get_logger
+from token_counter import count_message_tokens, count_tokens, token_cost
+
+# Records the token usage and cost of every OpenAI call, and enforces
+# per-batch token/cost budgets. A Budget is scoped with budget_scope() the
+# same way result_cache.cache_mode() scopes the cache mode, so generator
+# functions charge whichever batch they are running for.
+
+logger = get_logger('usage_ledger')
+
+ON_EXCEED_STOP = 'stop'            # reject rows that do not fit the budget
+ON_EXCEED_DOWNGRADE = 'downgrade'  # try shorter content lengths first, then reject
+
+# Shorter lengths tried, in order, when a row does not fit a downgrading budget
+DOWNGRADES = {
+    'comprehensive': ('long', 'medium', 'short'),
+    'long': ('medium', 'short'),
+    'medium': ('short',),
+    'short': ()
+}
+
+# The ledger table is trimmed to its newest max_rows calls every PRUNE_EVERY inserts
+PRUNE_EVERY = 1000
+
+_budget = contextvars.ContextVar('usage_budget', default=None)
+
+class BudgetExceeded(Exception):
+    pass
+
+class Budget:
+    """Token and USD limits for one batch run, overall and per product.
+
+    Rows reserve their estimated usage before they start, so concurrent rows
+    cannot overshoot the budget together; calls then charge their actual
+    usage and the row releases its reservation when it finishes.
+    """
+
+    def __init__(self, max_tokens=None, max_cost=None, product_costs=None, on_exceed=ON_EXCEED_STOP):
+        if on_exceed not in (ON_EXCEED_STOP, ON_EXCEED_DOWNGRADE):
+            raise ValueError(f"onExceed must be '{ON_EXCEED_STOP}' or '{ON_EXCEED_DOWNGRADE}'")
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.product_costs = dict(product_costs or {})
+        self.on_exceed = on_exceed
+        self.spent = {'tokens': 0, 'cost': 0.0}
+        self.reserved = {'tokens': 0, 'cost': 0.0}
+        self.product_spent = {}
+        self.product_reserved = {}
+        self.downgraded = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_request(cls, data):
+        """Budget from a request's `budget` object ({maxTokens, maxCost, productBudgets, onExceed}), or None"""
+        if not data:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError('budget must be an object')
+        try:
+            max_tokens = int(data['maxTokens']) if data.get('maxTokens') is not None else None
+            max_cost = float(data['maxCost']) if data.get('maxCost') is not None else None
+            product_costs = {product: float(cost) for product, cost in (data.get('productBudgets') or {}).items()}
+        except (TypeError, ValueError, AttributeError):
+            raise ValueError('maxTokens, maxCost and productBudgets values must be numbers')
+        return cls(max_tokens, max_cost, product_costs, data.get('onExceed', ON_EXCEED_STOP))
+
+    @property
+    def limited(self):
+        """Whether any token or cost limit is set"""
+        return self.max_tokens is not None or self.max_cost is not None or bool(self.product_costs)
+
+    def _fits(self, product, tokens, cost):
+        if self.max_tokens is not None and self.spent['tokens'] + self.reserved['tokens'] + tokens > self.max_tokens:
+            return False
+        if self.max_cost is not None and self.spent['cost'] + self.reserved['cost'] + cost > self.max_cost:
+            return False
+        limit = self.product_costs.get(product)
+        if limit is not None and self.product_spent.get(product, 0.0) + self.product_reserved.get(product, 0.0) + cost > limit:
+            return False
+        return True
+
+    def reserve(self, product, tokens, cost):
+        """Reserve an estimate if it fits; returns False otherwise"""
+        with self._lock:
+            if not self._fits(product, tokens, cost):
+                return False
+            self.reserved['tokens'] += tokens
+            self.reserved['cost'] += cost
+            self.product_reserved[product] = self.product_reserved.get(product, 0.0) + cost
+            return True
+
+    def release(self, product, tokens, cost):
+        with self._lock:
+            self.reserved['tokens'] -= tokens
+            self.reserved['cost'] -= cost
+            self.product_reserved[product] = self.product_reserved.get(product, 0.0) - cost
+
+    def charge(self, product, tokens, cost):
+        with self._lock:
+            self.spent['tokens'] += tokens
+            self.spent['cost'] += cost
+            self.product_spent[product] = self.product_spent.get(product, 0.0) + cost
+
+    def admit(self, product, content_length, estimate):
+        """Reserve a row's estimated usage, downgrading its length if allowed.
+
+        estimate(content_length) returns (tokens, cost). Returns
+        (content_length, tokens, cost) for the reservation; raises
+        BudgetExceeded if no allowed length fits.
+        """
+        lengths = (content_length,)
+        if self.on_exceed == ON_EXCEED_DOWNGRADE:
+            lengths += DOWNGRADES.get(content_length, ())
+        for length in lengths:
+            tokens, cost = estimate(length)
+            if self.reserve(product, tokens, cost):
+                if length != content_length:
+                    with self._lock:
+                        self.downgraded += 1
+                return length, tokens, cost
+        with self._lock:
+            self.rejected += 1
+        raise BudgetExceeded(f"Budget exceeded for {product}: the row's estimated usage does not fit the remaining budget")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'max_tokens': self.max_tokens,
+                'max_cost': self.max_cost,
+                'product_budgets': self.product_costs,
+                'on_exceed': self.on_exceed,
+                'spent_tokens': self.spent['tokens'],
+                'spent_cost': round(self.spent['cost'], 6),
+                'product_spent': {product: round(cost, 6) for product, cost in self.product_spent.items()},
+                'downgraded_rows': self.downgraded,
+                'rejected_rows': self.rejected
+            }
+
+@contextlib.contextmanager
+def budget_scope(budget):
+    """Charge calls made inside the block (and tasks it starts) to budget"""
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+def current_budget():
+    return _budget.get()
+
+class UsageLedger:
+    """Per-call usage log: in-process totals plus an optional SQLite history"""
+
+    def __init__(self, path=None, enabled=True, max_rows=50000):
+        self.path = path
+        self.enabled = enabled
+        self.max_rows = max_rows
+        self._inserts = 0
+        self.totals = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cost': 0.0}
+        self.by_product = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @classmethod
+    def from_env(cls):
+        """Build the ledger from USAGE_LEDGER_PATH / USAGE_LEDGER_ENABLED / USAGE_LEDGER_MAX_ROWS"""
+        return cls(
+            path=os.getenv('USAGE_LEDGER_PATH', os.path.join(tempfile.gettempdir(), 'seo_usage.sqlite3')),
+            enabled=os.getenv('USAGE_LEDGER_ENABLED', 'true').lower() not in ('0', 'false', 'no'),
+            max_rows=int(os.getenv('USAGE_LEDGER_MAX_ROWS', '50000'))
+        )
+
+    def _connection(self):
+        # Opened lazily; usage is still tracked in memory if the file cannot be opened
+        if self._conn is None and self.path:
+            try:
+                conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS usage (created_at REAL NOT NULL, label TEXT NOT NULL, product TEXT, content_length TEXT, '
+                    'model TEXT, prompt_tokens INTEGER NOT NULL, completion_tokens INTEGER NOT NULL, cost REAL NOT NULL, '
+                    'latency REAL, estimated INTEGER NOT NULL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS usage_label ON usage (label, content_length, created_at)')
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.warning(f"Usage ledger database unavailable ({e}), tracking in memory only")
+                self.path = None
+        return self._conn
+
+    def record(self, label, product, content_length, model, prompt_tokens, completion_tokens, latency=None, estimated=False):
+        """Record one call and charge it to the active budget; returns its cost"""
+        cost = token_cost(model, prompt_tokens, completion_tokens)
+        budget = _budget.get()
+        if budget is not None:
+            budget.charge(product, prompt_tokens + completion_tokens, cost)
+        metrics.OPENAI_TOKENS.labels(label, 'prompt').inc(prompt_tokens)
+        metrics.OPENAI_TOKENS.labels(label, 'completion').inc(completion_tokens)
+        metrics.OPENAI_COST.labels(label).inc(cost)
+        if latency is not None:
+            metrics.OPENAI_CALL_SECONDS.labels(label).observe(latency)
+        if not self.enabled:
+            return cost
+        with self._lock:
+            self.totals['calls'] += 1
+            self.totals['prompt_tokens'] += prompt_tokens
+            self.totals['completion_tokens'] += completion_tokens
+            self.totals['cost'] += cost
+            product_totals = self.by_product.setdefault(product, {'calls': 0, 'tokens': 0, 'cost': 0.0})
+            product_totals['calls'] += 1
+            product_totals['tokens'] += prompt_tokens + completion_tokens
+            product_totals['cost'] += cost
+            conn = self._connection()
+            if conn is not None:
+                try:
+                    conn.execute(
+                        'INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (time.time(), label, product, content_length, model, prompt_tokens, completion_tokens, cost, latency, int(estimated))
+                    )
+                    self._inserts += 1
+                    if self.max_rows and self._inserts % PRUNE_EVERY == 0:
+                        self._prune(conn)
+                    conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Usage ledger write failed: {e}")
+        return cost
+
+    def _prune(self, conn):
+        # Keep the newest max_rows calls; averages() only looks at recent ones,
+        # and its window query would otherwise grow with every call ever made
+        conn.execute('DELETE FROM usage WHERE rowid <= (SELECT MAX(rowid) FROM usage) - ?', (self.max_rows,))
+
+    def record_response(self, label, product, content_length, model, response, messages, latency=None):
+        """Record a completion's reported usage, counting tokens locally if the response has none"""
+        usage = getattr(response, 'usage', None)
+        if usage is not None and getattr(usage, 'prompt_tokens', None) is not None:
+            return self.record(label, product, content_length, model, usage.prompt_tokens, usage.completion_tokens, latency)
+        text = (response.choices[0].message.content or '') if getattr(response, 'choices', None) else ''
+        return self.record(label, product, content_length, model, count_message_tokens(messages), count_tokens(text), latency, estimated=True)
+
+    def averages(self, window=200):
+        """Mean completion tokens and latency of the last `window` reported calls per (label, content_length)"""
+        conn = self._connection() if self.enabled else None
+        if conn is None:
+            return {}
+        with self._lock:
+            try:
+                rows = conn.execute(
+                    'SELECT label, content_length, AVG(completion_tokens), AVG(latency), COUNT(*) FROM ('
+                    '  SELECT label, content_length, completion_tokens, latency, ROW_NUMBER() OVER ('
+                    '    PARTITION BY label, content_length ORDER BY created_at DESC) AS position'
+                    '  FROM usage WHERE estimated = 0'
+                    ') WHERE position <= ? GROUP BY label, content_length',
+                    (window,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"Usage ledger read failed: {e}")
+                return {}
+        return {
+            (label, content_length): {'completion_tokens': completion_tokens, 'latency': latency, 'calls': calls}
+            for label, content_length, completion_tokens, latency, calls in rows
+        }
+
+    def snapshot(self):
+        """In-process usage totals, for monitoring"""
+        with self._lock:
+            return dict(
+                self.totals,
+                cost=round(self.totals['cost'], 6),
+                by_product={product: dict(totals, cost=round(totals['cost'], 6)) for product, totals in self.by_product.items()}
+            )
+
+ledger = UsageLedger.from_env()
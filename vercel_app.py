@@ -1,11 +1,22 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import json
 import os
 import sys
+import time
 
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(__file__))
 
+import metrics
+from keyword_clustering import cluster_rows, parse_threshold, parse_variants
+from log_config import get_logger
+from request_options import parse_flag
+from result_cache import cache_mode, cache_mode_from_request
+from seo_scoring import score_articles, summarize, parse_min_score, MAX_SCORE_ITEMS
+
+logger = get_logger('api')
+
 # Import content generation functions
 try:
     from content_with_ai import (
@@ -13,29 +24,75 @@ try:
         generate_article_title, 
         generate_full_article, 
         generate_meta_title, 
-        generate_meta_description
+        generate_meta_description,
+        generate_metadata,
+        generate_all_content,
+        stream_all_content,
+        prompt_versions,
+        COMBINED_METADATA
     )
 except ImportError as e:
-    print(f"Error importing content functions: {e}")
-    # Fallback functions if import fails
-    def generate_content_brief(keyword, product="Files.com"):
-        return f"Content brief for '{keyword}' for {product}: Create a comprehensive guide covering fundamentals, best practices, and actionable tips."
-    
-    def generate_article_title(keyword, product="Files.com"):
-        return f"The Complete Guide to {keyword}: Everything You Need to Know"
-    
-    def generate_full_article(keyword, title, product="Files.com", content_length="medium"):
-        return f"# {title}\n\n## Introduction\n\n{keyword} is an essential topic that every professional should understand."
-    
-    def generate_meta_title(keyword, product="Files.com"):
-        return f"{keyword} - Complete Guide, Tips & Best Practices"
+    logger.error(f"Error importing content functions: {e}")
+    # Fall back to the template engine if import fails
+    from fallback_templates import (
+        content_brief as generate_content_brief,
+        article_title as generate_article_title,
+        full_article as generate_full_article,
+        meta_title as generate_meta_title,
+        meta_description as generate_meta_description,
+        metadata as generate_metadata,
+        all_content as generate_all_content,
+        stream_all_content,
+        prompt_versions
+    )
     
-    def generate_meta_description(keyword, product="Files.com"):
-        return f"Learn everything about {keyword} with our comprehensive guide. Discover best practices and expert tips."
+    COMBINED_METADATA = False
+
+try:
+    from batch_generation import generate_batch, preview_batch
+    from usage_ledger import ledger as usage_ledger, Budget
+except ImportError as e:
+    logger.error(f"Error importing batch generation: {e}")
+    generate_batch = None
+
+try:
+    from job_queue import jobs as job_queue
+    from job_worker import submit_job, job_status, start_worker_threads
+except ImportError as e:
+    logger.error(f"Error importing job queue: {e}")
+    job_queue = None
+
+try:
+    from hedging import hedger
+    from openai_transport import pool_stats
+    from rate_limiter import limiter as rate_limiter
+    from single_flight import single_flight
+except ImportError as e:
+    logger.error(f"Error importing transport stats: {e}")
+    pool_stats = None
 
 app = Flask(__name__)
 CORS(app)
 
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    # Route templates, not raw paths, keep the label set bounded
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.HTTP_REQUESTS.labels(endpoint, response.status_code).inc()
+    # Streaming responses are timed until their headers are sent
+    metrics.HTTP_SECONDS.labels(endpoint).observe(time.perf_counter() - g.request_started)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if 'request_started' in g:
+        metrics.HTTP_IN_FLIGHT.dec()
+
 @app.route('/api/health', methods=['GET', 'OPTIONS'])
 def health():
     """Health check endpoint"""
@@ -51,6 +108,25 @@ def health():
         'message': 'Server is running'
     })
 
+@app.route('/api/transport_stats', methods=['GET'])
+def transport_stats():
+    """OpenAI connection pool, retry, rate limiter, coalescing and hedging statistics"""
+    if pool_stats is None:
+        return jsonify({'error': 'Transport statistics are unavailable'}), 503
+    
+    return jsonify({
+        'pool': pool_stats(),
+        'rate_limiter': rate_limiter.snapshot(),
+        'coalescing': single_flight.snapshot(),
+        'hedging': hedger.snapshot(),
+        'usage': usage_ledger.snapshot() if generate_batch is not None else None
+    })
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Generation latency, token, fallback and request metrics of this process in the Prometheus text format"""
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/generate_content', methods=['POST', 'OPTIONS'])
 def generate_content():
     """Generate all content in one step"""
@@ -70,31 +146,227 @@ def generate_content():
         keyword = data['keyword'].strip()
         product = data.get('product', 'Files.com').strip()
         content_length = data.get('contentLength', 'medium').strip()
+        combined_metadata = parse_flag(data.get('combinedMetadata'), COMBINED_METADATA)
         
         if not keyword:
             return jsonify({'error': 'Keyword cannot be empty'}), 400
         
-        print(f"🚀 API Call: /generate_content for keyword: '{keyword}' for product: '{product}' with length: '{content_length}'")
+        try:
+            variants = parse_variants(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Generate all content in one step
-        article_title = generate_article_title(keyword, product)
-        full_article = generate_full_article(keyword, article_title, product, content_length)
-        meta_title = generate_meta_title(keyword, product)
-        meta_description = generate_meta_description(keyword, product)
+        logger.info('API call', extra={'fields': {'endpoint': '/generate_content', 'keyword': keyword, 'product': product, 'content_length': content_length}})
         
-        print(f"✅ API Response: Successfully generated all content for '{keyword}' for {product}")
+        # Generate all content in one step (meta calls run alongside title -> article)
+        with cache_mode(cache_mode_from_request(data)):
+            content = generate_all_content(keyword, product, content_length, combined_metadata, variants)
         
-        return jsonify({
-            'article_title': article_title,
-            'full_article': full_article,
-            'meta_title': meta_title,
-            'meta_description': meta_description
-        })
+        logger.info('API response', extra={'fields': {'endpoint': '/generate_content', 'keyword': keyword, 'product': product}})
+        
+        return jsonify(content)
         
     except Exception as e:
-        print(f"❌ Error in generate_content: {e}")
+        logger.exception(f"Error in generate_content: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+@app.route('/api/generate_content/stream', methods=['GET', 'POST', 'OPTIONS'])
+def generate_content_stream():
+    """Generate all content, streaming the article and metas as Server-Sent Events"""
+    if request.method == 'OPTIONS':
+        return '', 200, {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    
+    # EventSource can only send GET requests, so accept query parameters too
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+    
+    if not data or 'keyword' not in data:
+        return jsonify({'error': 'Keyword is required'}), 400
+    
+    keyword = data['keyword'].strip()
+    product = data.get('product', 'Files.com').strip()
+    content_length = data.get('contentLength', 'medium').strip()
+    mode = cache_mode_from_request(data)
+    
+    if not keyword:
+        return jsonify({'error': 'Keyword cannot be empty'}), 400
+    
+    try:
+        variants = parse_variants(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    logger.info('API call', extra={'fields': {'endpoint': '/generate_content/stream', 'keyword': keyword, 'product': product, 'content_length': content_length}})
+    
+    def events():
+        # The cache mode is set here because the generator runs after the view returns
+        with cache_mode(mode):
+            try:
+                for event, payload in stream_all_content(keyword, product, content_length, variants):
+                    yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            except Exception as e:
+                logger.exception(f"Error in generate_content_stream: {e}")
+                yield f"event: error\ndata: {json.dumps({'error': f'Internal server error: {str(e)}'})}\n\n"
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/generate_batch', methods=['POST', 'OPTIONS'])
+def generate_batch_content():
+    """Generate content for many keywords with a bounded worker pool"""
+    if request.method == 'OPTIONS':
+        return '', 200, {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    
+    if generate_batch is None:
+        return jsonify({'error': 'Batch generation is unavailable'}), 503
+    
+    try:
+        data = request.get_json()
+        
+        if not data or 'rows' not in data:
+            return jsonify({'error': 'Rows are required'}), 400
+        
+        combined_metadata = parse_flag(data.get('combinedMetadata'), COMBINED_METADATA)
+        cluster = parse_flag(data.get('clusterKeywords'))
+        
+        try:
+            if parse_flag(data.get('dryRun')):
+                # Estimate tokens, cost and duration without calling OpenAI
+                return jsonify(preview_batch(data['rows'], data.get('concurrency'), combined_metadata, cluster))
+            
+            with cache_mode(cache_mode_from_request(data)):
+                batch = generate_batch(
+                    data['rows'],
+                    data.get('concurrency'),
+                    combined_metadata,
+                    cluster=cluster,
+                    budget=Budget.from_request(data.get('budget'))
+                )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(batch)
+        
+    except Exception as e:
+        logger.exception(f"Error in generate_batch: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/cluster_keywords', methods=['POST', 'OPTIONS'])
+def cluster_keywords():
+    """Merge near-duplicate keyword rows into one row per cluster, with the rest as variants"""
+    if request.method == 'OPTIONS':
+        return '', 200, {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('rows'), list):
+            return jsonify({'error': 'Rows are required'}), 400
+        
+        try:
+            threshold = parse_threshold(data.get('threshold'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        rows = cluster_rows(data['rows'], threshold)
+        logger.info('API call', extra={'fields': {'endpoint': '/cluster_keywords', 'rows': len(data['rows']), 'clusters': len(rows)}})
+        
+        return jsonify({'rows': rows, 'input_rows': len(data['rows']), 'clusters': len(rows)})
+        
+    except Exception as e:
+        logger.exception(f"Error in cluster_keywords: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/score_content', methods=['POST', 'OPTIONS'])
+def score_content():
+    """SEO quality scores for a batch of generated results"""
+    if request.method == 'OPTIONS':
+        return '', 200, {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('items'), list):
+            return jsonify({'error': 'Items are required'}), 400
+        if len(data['items']) > MAX_SCORE_ITEMS:
+            return jsonify({'error': f'At most {MAX_SCORE_ITEMS} items can be scored at once'}), 400
+        
+        try:
+            min_score = parse_min_score(data.get('minScore'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        scores = score_articles(data['items'], min_score)
+        summary = summarize(scores)
+        logger.info('API call', extra={'fields': {'endpoint': '/score_content', 'items': summary['items'], 'failed': summary['failed']}})
+        
+        return jsonify(dict(summary, scores=scores))
+        
+    except Exception as e:
+        logger.exception(f"Error in score_content: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/jobs', methods=['POST', 'OPTIONS'])
+def create_job():
+    """Queue a generate_content job and return its id"""
+    if request.method == 'OPTIONS':
+        return '', 200, {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    
+    if job_queue is None:
+        return jsonify({'error': 'Job queue is unavailable'}), 503
+    
+    try:
+        data = request.get_json()
+        
+        try:
+            job_id = submit_job(data or {})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # This server runs the jobs itself; workers started with job_worker.py
+        # can pull from the same queue file as well
+        start_worker_threads()
+        logger.info('API call', extra={'fields': {'endpoint': '/jobs', 'job_id': job_id, 'keyword': data['keyword'].strip()}})
+        
+        return jsonify(job_status(job_queue.get(job_id))), 202
+        
+    except Exception as e:
+        logger.exception(f"Error in create_job: {e}")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and (partial) results of a queued job"""
+    if job_queue is None:
+        return jsonify({'error': 'Job queue is unavailable'}), 503
+    
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job_status(job))
+
 @app.route('/api/generate_article', methods=['POST', 'OPTIONS'])
 def generate_article():
     """Generate article with custom title and brief"""
@@ -113,29 +385,35 @@ def generate_article():
         
         keyword = data['keyword'].strip()
         title = data.get('title', '').strip()
-        brief = data.get('brief', '').strip()
         product = data.get('product', 'Files.com').strip()
         
         if not keyword:
             return jsonify({'error': 'Keyword cannot be empty'}), 400
         
-        print(f"🚀 API Call: /generate_article for keyword: '{keyword}' for product: '{product}'")
+        logger.info('API call', extra={'fields': {'endpoint': '/generate_article', 'keyword': keyword, 'product': product}})
         
         # Generate all content
-        full_article = generate_full_article(keyword, title, product)
-        meta_title = generate_meta_title(keyword, product)
-        meta_description = generate_meta_description(keyword, product)
+        combined_metadata = parse_flag(data.get('combinedMetadata'), COMBINED_METADATA)
+        with cache_mode(cache_mode_from_request(data)):
+            full_article = generate_full_article(keyword, title, product)
+            if combined_metadata:
+                metadata = generate_metadata(keyword, product, fields=('meta_title', 'meta_description'))
+                meta_title, meta_description = metadata['meta_title'], metadata['meta_description']
+            else:
+                meta_title = generate_meta_title(keyword, product)
+                meta_description = generate_meta_description(keyword, product)
         
-        print(f"✅ API Response: Successfully generated article for '{keyword}' for {product}")
+        logger.info('API response', extra={'fields': {'endpoint': '/generate_article', 'keyword': keyword, 'product': product}})
         
         return jsonify({
             'full_article': full_article,
             'meta_title': meta_title,
-            'meta_description': meta_description
+            'meta_description': meta_description,
+            'prompt_versions': prompt_versions(combined_metadata=combined_metadata, fields=('full_article', 'meta_title', 'meta_description'))
         })
         
     except Exception as e:
-        print(f"❌ Error in generate_article: {e}")
+        logger.exception(f"Error in generate_article: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 @app.route('/api/generate_brief_title', methods=['POST', 'OPTIONS'])
@@ -160,21 +438,24 @@ def generate_brief_title():
         if not keyword:
             return jsonify({'error': 'Keyword cannot be empty'}), 400
         
-        print(f"🚀 API Call: /generate_brief_title for keyword: '{keyword}' for product: '{product}'")
+        logger.info('API call', extra={'fields': {'endpoint': '/generate_brief_title', 'keyword': keyword, 'product': product}})
         
         # Generate brief and title
-        content_brief = generate_content_brief(keyword, product)
-        article_title = generate_article_title(keyword, product)
+        with cache_mode(cache_mode_from_request(data)):
+            content_brief = generate_content_brief(keyword, product)
+            if parse_flag(data.get('combinedMetadata'), COMBINED_METADATA):
+                # One structured call also yields the meta fields for this row
+                response = generate_metadata(keyword, product)
+            else:
+                response = {'article_title': generate_article_title(keyword, product)}
         
-        print(f"✅ API Response: Successfully generated brief and title for '{keyword}' for {product}")
+        logger.info('API response', extra={'fields': {'endpoint': '/generate_brief_title', 'keyword': keyword, 'product': product}})
         
-        return jsonify({
-            'content_brief': content_brief,
-            'article_title': article_title
-        })
+        response['content_brief'] = content_brief
+        return jsonify(response)
         
     except Exception as e:
-        print(f"❌ Error in generate_brief_title: {e}")
+        logger.exception(f"Error in generate_brief_title: {e}")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 if __name__ == '__main__':